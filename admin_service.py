@@ -8,10 +8,11 @@ import json
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
 import os
+from catalog_store import catalog_store
 
 class AdminService:
     def __init__(self):
-        self.catalog_file = 'PLANTILLA CATALOGO CON INGREDIENTES.xlsx'
+        self.catalog_file = catalog_store.path
         self.movements_file = 'product_movements.json'
         self.unresolved_file = 'unresolved_cases.json'
         self.stats_file = 'system_stats.json'
@@ -19,7 +20,7 @@ class AdminService:
     def load_catalog(self):
         """Cargar catálogo completo de productos"""
         try:
-            df = pd.read_excel(self.catalog_file)
+            df = catalog_store.get().df
             return df.to_dict('records')
         except Exception as e:
             print(f"Error cargando catálogo: {e}")
@@ -28,7 +29,7 @@ class AdminService:
     def get_catalog_summary(self):
         """Obtener resumen del catálogo"""
         try:
-            df = pd.read_excel(self.catalog_file)
+            df = catalog_store.get().df
             
             summary = {
                 'total_productos': len(df),
@@ -78,7 +79,7 @@ class AdminService:
     def search_products(self, query, filters=None):
         """Buscar productos en el catálogo"""
         try:
-            df = pd.read_excel(self.catalog_file)
+            df = catalog_store.get().df
             
             if query:
                 mask = df['PRODUCTO'].str.contains(query, case=False, na=False)
@@ -107,7 +108,7 @@ class AdminService:
     def add_product(self, product_data):
         """Agregar nuevo producto al catálogo"""
         try:
-            df = pd.read_excel(self.catalog_file)
+            df = catalog_store.get().df
             
             # Crear nueva fila
             new_row = pd.DataFrame([product_data])
@@ -115,6 +116,7 @@ class AdminService:
             
             # Guardar catálogo actualizado
             df.to_excel(self.catalog_file, index=False)
+            catalog_store.reload()
             
             # Registrar movimiento
             self._log_product_movement(
@@ -130,7 +132,7 @@ class AdminService:
     def update_product(self, product_index, product_data):
         """Actualizar producto existente"""
         try:
-            df = pd.read_excel(self.catalog_file)
+            df = catalog_store.get().df.copy()
             
             if 0 <= product_index < len(df):
                 old_data = df.iloc[product_index].to_dict()
@@ -142,6 +144,7 @@ class AdminService:
                 
                 # Guardar catálogo actualizado
                 df.to_excel(self.catalog_file, index=False)
+                catalog_store.reload()
                 
                 # Registrar movimiento
                 self._log_product_movement(
@@ -159,7 +162,7 @@ class AdminService:
     def delete_product(self, product_index):
         """Eliminar producto del catálogo"""
         try:
-            df = pd.read_excel(self.catalog_file)
+            df = catalog_store.get().df
             
             if 0 <= product_index < len(df):
                 product_data = df.iloc[product_index].to_dict()
@@ -169,6 +172,7 @@ class AdminService:
                 
                 # Guardar catálogo actualizado
                 df.to_excel(self.catalog_file, index=False)
+                catalog_store.reload()
                 
                 # Registrar movimiento
                 self._log_product_movement(
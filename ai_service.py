@@ -2,6 +2,8 @@ import os
 import json
 import logging
 from openai import OpenAI
+from text_normalizer import normalized_input
+from safety_index import ai_contraindications
 
 class AIService:
     def __init__(self):
@@ -67,7 +69,7 @@ class AIService:
         import re
         from difflib import SequenceMatcher
         
-        user_input_lower = user_input.lower()
+        user_input_lower = normalized_input(user_input).lower
         
         # Mapeos completos de síntomas en español
         symptom_mappings = {
@@ -154,23 +156,10 @@ class AIService:
         """
         contraindications = []
         
-        # Check diabetes contraindications
-        if user_profile.get('diabetes') and product.get('contradiccion'):
-            contraindication_text = str(product['contradiccion']).lower()
-            if 'diabetes' in contraindication_text or 'diabético' in contraindication_text:
-                contraindications.append('diabetes')
-        
-        # Check hypertension contraindications
-        if user_profile.get('hypertension') and product.get('contradiccion'):
-            contraindication_text = str(product['contradiccion']).lower()
-            if 'hipertensión' in contraindication_text or 'presión alta' in contraindication_text:
-                contraindications.append('hipertension')
-        
-        # Check pregnancy contraindications
-        if user_profile.get('pregnancy') and product.get('contradiccion'):
-            contraindication_text = str(product['contradiccion']).lower()
-            if 'embarazo' in contraindication_text or 'embarazada' in contraindication_text:
-                contraindications.append('embarazo')
+        # Check diabetes, hypertension and pregnancy contraindications
+        # (flags of each contraindication text are computed once, see safety_index.py)
+        if product.get('contradiccion'):
+            contraindications.extend(ai_contraindications(str(product['contradiccion']), user_profile))
         
         # Check gender-specific products
         if product.get('sexo') and product['sexo'].lower() != 'ambos':
@@ -1,7 +1,30 @@
-import pandas as pd
 import re
 import logging
+from types import MappingProxyType
 from difflib import SequenceMatcher
+from catalog_store import catalog_store
+from catalog_index import CatalogTextIndex, CatalogSymptomVocabulary
+from product_store import ProductStore
+from symptom_rules import CompiledSymptomRules
+from safety_index import ProductSafetyIndex, profile_mask
+from recommendation_cache import recommendation_cache
+from rotation_state import rotation_counter, select_rotated, rotation_rng, WELLNESS_SCORE
+from knowledge_base import knowledge_store
+from text_normalizer import normalize_text, normalized_input
+
+def _collect_wellness_pool(snapshot):
+    """(identificador, producto formateado) de los productos de bienestar general, listos para rotar"""
+    products = snapshot.derived('products', ProductStore.from_snapshot)
+    wellness_products = []
+    for record in products:
+        product_text = f"{record.text('beneficios')} {record.text('nombre')}".lower()
+        if any(keyword in product_text for keyword in CanaturaAI.WELLNESS_KEYWORDS):
+            product = record.as_dict(CanaturaAI.PRODUCT_FIELDS)
+            product['product_name'] = record['nombre']
+            product['match_score'] = WELLNESS_SCORE  # Último nivel de la rotación
+            wellness_products.append((record.product_id, MappingProxyType(product)))
+    return tuple(wellness_products)
+
 
 class CanaturaAI:
     """
@@ -10,11 +33,33 @@ class CanaturaAI:
     NO inventa productos - solo recomienda productos reales del catálogo
     """
     
+    # Dolores específicos que aceptan cualquier producto con síntomas registrados
+    SPECIFIC_PAIN_SYMPTOMS = ['dolor de cabeza', 'dolor muscular', 'dolor articular',
+                              'dolor estomacal', 'dolor menstrual', 'dolor de garganta', 'dolor dental']
+    
+    # Productos que DEBEN aparecer para insomnio
+    PRIORITY_SLEEP_PRODUCTS = ['valeriana', 'pasiflora', 'triptofano', 'magnesio', '7 azahares']
+    
+    # Palabras que identifican productos de bienestar general (respaldo)
+    WELLNESS_KEYWORDS = ('energia', 'bienestar', 'salud', 'vitaminas', 'natural', 'inmune')
+    
+    # Campos de un producto para mostrar: (clave, columna del catálogo, valor por defecto)
+    PRODUCT_FIELDS = (
+        ('nombre', 'nombre', 'Producto Canatura'),
+        ('beneficios', 'beneficios', 'Beneficios naturales para la salud'),
+        ('dosis', 'dosis', 'Consultar con especialista'),
+        ('modo_de_uso', 'modo_de_uso', 'INGERIBLE'),
+        ('presentacion', 'presentacion', 'Suplemento natural'),
+        ('ingredientes', 'ingredientes', 'Ingredientes naturales'),
+        ('contradiccion', 'contradiccion', ''),
+        ('condiciones_especiales', 'condiciones especiales', '')
+    )
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.catalog_df = None
-        self.symptom_mappings = self._build_symptom_mappings()
-        self.product_rotation_counter = {}  # Para rotación equitativa
+        self.catalog_loaded = False
+        self.symptom_mappings = knowledge_store.get()['symptom_mappings']
+        self.rotation_counter = rotation_counter  # Para rotación equitativa (compartida entre workers)
         self.load_catalog()
     
     def _build_symptom_mappings(self):
@@ -77,56 +122,72 @@ class CanaturaAI:
         }
     
     def load_catalog(self):
-        """Cargar catálogo real de productos Canatura"""
+        """Cargar catálogo real de productos Canatura desde la instantánea compartida"""
         try:
-            # Intentar cargar el catálogo principal
-            catalog_file = "PLANTILLA CATALOGO CON INGREDIENTES.xlsx"
-            try:
-                self.catalog_df = pd.read_excel(catalog_file, engine='openpyxl')
-            except:
-                try:
-                    self.catalog_df = pd.read_excel(catalog_file, engine='xlrd')
-                except:
-                    # Usar catálogo de muestra como respaldo
-                    self.catalog_df = pd.read_excel("sample_catalog.xlsx", engine='openpyxl')
-            
-            # Limpiar y normalizar
-            self.catalog_df = self.catalog_df.fillna('')
-            self.catalog_df.columns = self.catalog_df.columns.str.strip().str.lower()
+            snapshot = catalog_store.get()
+            # Construir los índices al iniciar y no en la primera petición
+            snapshot.derived('text_index', CatalogTextIndex.from_snapshot)
+            snapshot.derived('symptom_vocabulary', CatalogSymptomVocabulary.from_snapshot)
+            snapshot.derived('products', ProductStore.from_snapshot)
+            snapshot.derived('symptom_rules', CompiledSymptomRules.from_snapshot)
+            snapshot.derived('safety_index', ProductSafetyIndex.from_snapshot)
+            snapshot.derived('wellness_pool', _collect_wellness_pool)
+            self.catalog_loaded = True
             
-            # Crear columnas normalizadas para búsqueda
-            for col in ['sintomas', 'beneficios', 'ingredientes', 'nombre']:
-                if col in self.catalog_df.columns:
-                    self.catalog_df[f'{col}_norm'] = self.catalog_df[col].apply(self._normalize_text)
-            
-            self.logger.info(f"✓ Catálogo Canatura cargado: {len(self.catalog_df)} productos reales")
+            self.logger.info(f"✓ Catálogo Canatura cargado: {len(snapshot.normalized_df)} productos reales")
             
         except Exception as e:
             self.logger.error(f"Error cargando catálogo Canatura: {e}")
-            self.catalog_df = None
+            self.catalog_loaded = False
+    
+    # El catálogo y sus índices se leen siempre de la instantánea de la petición
+    # en curso: una recarga publica una versión nueva sin mezclar versiones
+    
+    @property
+    def catalog_snapshot(self):
+        return catalog_store.current() if self.catalog_loaded else None
+    
+    @property
+    def catalog_df(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.normalized_df if snapshot is not None else None
+    
+    @property
+    def catalog_index(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.derived('text_index', CatalogTextIndex.from_snapshot) if snapshot is not None else None
+    
+    @property
+    def catalog_vocabulary(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.derived('symptom_vocabulary', CatalogSymptomVocabulary.from_snapshot) if snapshot is not None else None
+    
+    @property
+    def products(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.derived('products', ProductStore.from_snapshot) if snapshot is not None else None
+    
+    @property
+    def symptom_rules(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.derived('symptom_rules', CompiledSymptomRules.from_snapshot) if snapshot is not None else None
+    
+    @property
+    def safety_index(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.derived('safety_index', ProductSafetyIndex.from_snapshot) if snapshot is not None else None
     
     def _normalize_text(self, text):
         """Normalizar texto español para mejor búsqueda"""
-        if not isinstance(text, str):
-            return ""
-        
-        text = text.lower()
-        
-        # Reemplazar acentos españoles
-        accent_map = {
-            'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u', 'ü': 'u', 'ñ': 'n'
-        }
-        for accented, normal in accent_map.items():
-            text = text.replace(accented, normal)
-        
-        return text
+        return normalize_text(text)
     
-    def find_products_for_symptoms(self, user_symptoms, user_profile=None, min_per_symptom=2, max_per_symptom=2):
+    def find_products_for_symptoms(self, user_symptoms, user_profile=None, min_per_symptom=2, max_per_symptom=2, seed=None):
         """
         Función principal: encuentra productos reales del catálogo Canatura
         Garantiza exactamente 2 productos por síntoma
         NO inventa productos - solo usa el catálogo real
         Sistema alimentado con conocimiento completo de 200+ casos resueltos
+        seed fija el desempate de la rotación para esta petición (reproducible)
         """
         if self.catalog_df is None or len(self.catalog_df) == 0:
             self.logger.error("Catálogo no disponible")
@@ -138,15 +199,17 @@ class CanaturaAI:
             self.logger.info(f"Síntomas detectados: {detected_symptoms}")
             
             if not detected_symptoms:
-                # Si no se detectan síntomas específicos, buscar productos generales de bienestar
-                return self._get_general_wellness_products(max_per_symptom)
+                # Sin síntomas no hay grupos que recomendar: el sistema completo
+                # aplica entonces su resolución garantizada
+                return []
             
             all_recommendations = []
+            rng = rotation_rng(seed)
             
             # 2. Para cada síntoma detectado, encontrar productos reales
             for symptom in detected_symptoms:
                 products = self._find_catalog_products_for_symptom(
-                    symptom, user_profile, min_per_symptom, max_per_symptom
+                    symptom, user_profile, min_per_symptom, max_per_symptom, rng
                 )
                 
                 if products:
@@ -166,11 +229,12 @@ class CanaturaAI:
     
     def _detect_symptoms(self, user_input):
         """Detectar síntomas del usuario usando mapeos inteligentes con contexto"""
-        user_normalized = self._normalize_text(user_input)
+        text = normalized_input(user_input)
+        user_normalized = text.normalized
         detected = []
         
         # CASOS PROBLEMÁTICOS ESPECÍFICOS - DETECCIÓN DIRECTA PRIORITARIA
-        user_input_lower = user_input.lower()
+        user_input_lower = text.lower
         
         # DETECCIÓN REFORZADA PARA CASOS ESPECÍFICOS PRIORITARIOS
         specific_cases = {
@@ -509,6 +573,17 @@ class CanaturaAI:
                 if symptom not in detected:
                     detected.append(symptom)
         
+        # 4. Síntomas escritos tal como aparecen en el catálogo: una sola pasada
+        # de coincidencia más larga con el vocabulario de la versión vigente
+        vocabulary = self.catalog_vocabulary
+        if vocabulary is not None and len(detected) < 3:
+            for catalog_symptom in vocabulary.longest_matches(user_normalized):
+                # Omitir variantes de lo ya detectado ("dolor" junto a "dolor de
+                # cabeza", "colesterol alto" junto a "colesterol")
+                if any(catalog_symptom in d or d in catalog_symptom for d in detected):
+                    continue
+                detected.append(catalog_symptom)
+        
         return detected[:3]  # Máximo 3 síntomas para mantener enfoque
     
     def _analyze_pain_context(self, user_input):
@@ -618,7 +693,7 @@ class CanaturaAI:
         
         return base_score
     
-    def _find_similar_symptom_products(self, symptom, user_profile, needed_count):
+    def _find_similar_symptom_products(self, symptom, user_profile, needed_count, rng):
         """Buscar productos para síntomas similares cuando no hay suficientes productos específicos"""
         similar_products = []
         
@@ -647,7 +722,7 @@ class CanaturaAI:
             if len(similar_products) >= needed_count:
                 break
                 
-            products = self._find_catalog_products_for_symptom(similar_symptom, user_profile, 1, needed_count - len(similar_products))
+            products = self._find_catalog_products_for_symptom(similar_symptom, user_profile, 1, needed_count - len(similar_products), rng)
             
             # Filtrar productos que no estén duplicados
             for product in products:
@@ -661,483 +736,83 @@ class CanaturaAI:
                     similar_products.append(product)
         
         return similar_products
-        
-        # Buscar coincidencias en mapeos de síntomas
-        for symptom_key, variations in self.symptom_mappings.items():
-            for variation in variations:
-                if variation in user_normalized:
-                    # Si es contexto digestivo y el síntoma es "dolor", omitirlo para evitar confusión
-                    if es_contexto_digestivo and symptom_key == 'dolor':
-                        continue
-                    
-                    # Si es contexto de sueño, evitar duplicados de sueño/insomnio y dolor genérico
-                    if es_contexto_sueno and symptom_key == 'dolor':
-                        continue
-                    
-                    # Evitar duplicados de sueño e insomnio (son el mismo problema)
-                    if symptom_key == 'sueño' and 'insomnio' in detected:
-                        continue
-                    if symptom_key == 'insomnio' and 'sueño' in detected:
-                        continue
-                    
-                    # Verificar que el síntoma existe en el catálogo
-                    if self._symptom_exists_in_catalog(symptom_key):
-                        detected.append(symptom_key)
-                        break
-        
-        # Si detectamos contexto gastrointestinal, agregar síntomas específicos del estómago
-        if es_contexto_digestivo:
-            sintomas_estomacales = ['estomago', 'gastritis', 'indigestion', 'acidez']
-            for sintoma in sintomas_estomacales:
-                if self._symptom_exists_in_catalog(sintoma) and sintoma not in detected:
-                    detected.append(sintoma)
-        
-        # Búsqueda adicional directa en el catálogo
-        if 'sintomas_norm' in self.catalog_df.columns:
-            catalog_symptoms = []
-            for _, row in self.catalog_df.iterrows():
-                if row['sintomas_norm']:
-                    symptoms_in_product = str(row['sintomas_norm']).split(',')
-                    catalog_symptoms.extend([s.strip() for s in symptoms_in_product if s.strip()])
-            
-            # Buscar coincidencias directas
-            for catalog_symptom in set(catalog_symptoms):
-                if catalog_symptom in user_normalized and catalog_symptom not in detected:
-                    # Si es contexto digestivo, evitar agregar "dolor" genérico
-                    if es_contexto_digestivo and catalog_symptom == 'dolor':
-                        continue
-                    detected.append(catalog_symptom)
-        
-        return list(set(detected))[:5]  # Máximo 5 síntomas diferentes
     
-    def _symptom_exists_in_catalog(self, symptom):
-        """Verificar que el síntoma existe realmente en el catálogo"""
-        if 'sintomas_norm' not in self.catalog_df.columns:
-            return False
+    def _symptom_candidate_rows(self, symptom, postings):
+        """
+        Filas que pueden coincidir en síntomas (se verifican después): la lista
+        de publicación del campo, ampliada donde _product_matches_symptom no se
+        limita a buscar el texto del síntoma
+        """
+        if symptom in self.SPECIFIC_PAIN_SYMPTOMS:
+            return self.catalog_index.nonempty_rows('sintomas')
         
-        for _, row in self.catalog_df.iterrows():
-            if row['sintomas_norm'] and symptom in str(row['sintomas_norm']):
-                return True
-        return False
+        rows = set(postings)
+        if symptom == 'insomnio':
+            rows.update(self.catalog_index.rows_containing_any('nombre', self.PRIORITY_SLEEP_PRODUCTS))
+        return sorted(rows)
     
-    def _find_catalog_products_for_symptom(self, symptom, user_profile, min_products, max_products):
+    def _find_catalog_products_for_symptom(self, symptom, user_profile, min_products, max_products, rng):
         """Encontrar productos reales del catálogo para un síntoma específico con rotación equitativa"""
-        all_matching_products = []
+        # Candidatos desde la caché (o calculados); la rotación se aplica siempre
+        all_matching_products, from_rules = self._symptom_candidates(symptom, user_profile, min_products, max_products)
         
-        # FORZAR PRODUCTOS ESPECÍFICOS DIRECTAMENTE SEGÚN SÍNTOMA
-        if 'diabetes' in symptom.lower() or 'glucosa' in symptom.lower() or 'azucar' in symptom.lower():
-            # Buscar productos específicos para DIABETES/GLUCOSA
-            diabetes_keywords = ['STEVIA', 'CANELA', 'CROMO', 'GYMNEMA', 'FENOGRECO']
-            for keyword in diabetes_keywords:
-                diabetes_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in diabetes_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'  # Máxima prioridad para diabetes
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'aumento de peso' in symptom.lower():
-            # Buscar productos para GANAR PESO
-            peso_keywords = ['PROTEINA', 'PROTEIN', 'MASS', 'GAINER', 'CREATINA']
-            for keyword in peso_keywords:
-                peso_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in peso_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
+        # Si ya encontramos productos específicos suficientes, retornar directamente
+        if from_rules:
+            return self._apply_product_rotation(all_matching_products, min_products, max_products, rng)
         
-        elif 'perdida de peso' in symptom.lower():
-            # Buscar productos para BAJAR PESO - PRODUCTOS REALES DEL CATÁLOGO
-            adelgazar_keywords = ['ALFIX', 'REDUCTOR', 'CARBO BURN', 'CARNITINA', 'GARCINIA', 'TE VERDE', 'TERMOGENICO', 'QUEMADOR', 'TORONJA', 'ALGAS MARINAS']
-            for keyword in adelgazar_keywords:
-                adelgazar_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in adelgazar_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
+        # Aplicar rotación equitativa
+        final_products = self._apply_product_rotation(all_matching_products, min_products, max_products, rng)
         
-        elif 'aumento de peso' in symptom.lower():
-            # BÚSQUEDA DEFINITIVA PARA AUMENTO DE PESO - PRODUCTOS ESPECÍFICOS DEL CATÁLOGO
-            peso_products = []
+        # Garantizar mínimo de productos si no hay suficientes
+        if len(final_products) < min_products:
+            # Primero intentar con síntomas similares
+            similar_products = self._find_similar_symptom_products(symptom, user_profile, min_products - len(final_products), rng)
+            final_products.extend(similar_products)
             
-            # Buscar AF TOTALVIT MULTIVITAMINICO específicamente
-            if self.catalog_df is not None:
-                totalvit_products = self.catalog_df[self.catalog_df['nombre'].str.contains('TOTALVIT', case=False, na=False)]
-                for idx, row in totalvit_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '30'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        peso_products.append(product)
-                
-                # Buscar AF HBINE ZARZAPARRILLA específicamente
-                if len(peso_products) < max_products:
-                    hbine_products = self.catalog_df[self.catalog_df['nombre'].str.contains('HBINE', case=False, na=False)]
-                    for idx, row in hbine_products.head(1).iterrows():
-                        if self._is_safe_for_user(row, user_profile):
-                            product = self._format_product(row)
-                            product['match_score'] = '30'
-                            product['product_name'] = str(row.get('nombre', ''))
-                            peso_products.append(product)
-                
-                # Agregar productos encontrados
-                all_matching_products.extend(peso_products)
-                
-                # Retornar inmediatamente si encontramos productos
-                if len(peso_products) >= min_products:
-                    return self._apply_product_rotation(peso_products, min_products, max_products)
-        
-        elif 'afrodisiaco' in symptom.lower() or 'sexual' in symptom.lower() or 'libido' in symptom.lower():
-            # SALUD SEXUAL/AFRODISÍACOS - PRODUCTOS REALES DEL CATÁLOGO
-            sexual_keywords = ['DAMIANA', 'MACA', 'GUARANA', 'AFRODISIACO', 'LIBIDO']
-            for keyword in sexual_keywords:
-                sexual_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in sexual_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'higado' in symptom.lower() or 'hepatico' in symptom.lower() or 'desintoxicar' in symptom.lower():
-            # SALUD HEPÁTICA/DESINTOXICACIÓN - PRODUCTOS REALES DEL CATÁLOGO  
-            higado_keywords = ['CARDO MARIANO', 'BOLDO', 'ALCACHOFA', 'HEPATICO', 'DESINTOX']
-            for keyword in higado_keywords:
-                higado_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in higado_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'colesterol' in symptom.lower() or 'trigliceridos' in symptom.lower():
-            # COLESTEROL/TRIGLICÉRIDOS - PRODUCTOS REALES DEL CATÁLOGO
-            colesterol_keywords = ['OMEGA', 'LECITINA', 'ALCACHOFA', 'CARDO', 'BOLDO']
-            for keyword in colesterol_keywords:
-                colesterol_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in colesterol_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'huesos' in symptom.lower() or 'artritis' in symptom.lower() or 'osteoporosis' in symptom.lower():
-            # SALUD ÓSEA/ARTICULAR - PRODUCTOS REALES DEL CATÁLOGO
-            huesos_keywords = ['CALCIO', 'MAGNESIO', 'COLAGENO', 'SHARK', 'ARTICULAR']
-            for keyword in huesos_keywords:
-                huesos_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in huesos_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'circulacion' in symptom.lower() or 'varices' in symptom.lower() or 'hemorroides' in symptom.lower():
-            # CIRCULACIÓN/VARICES - PRODUCTOS REALES DEL CATÁLOGO
-            circulacion_keywords = ['GINKGO', 'CIRCULACION', 'CENTELLA', 'CASTANO', 'RUSCO']
-            for keyword in circulacion_keywords:
-                circulacion_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in circulacion_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'ansiedad' in symptom.lower() or 'nervios' in symptom.lower() or 'panico' in symptom.lower():
-            # SISTEMA NERVIOSO/ANSIEDAD - PRODUCTOS REALES DEL CATÁLOGO
-            nervios_keywords = ['VALERIANA', 'PASIFLORA', 'DON RELAX', 'AZAHARES', 'TILA']
-            for keyword in nervios_keywords:
-                nervios_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in nervios_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'menopausia' in symptom.lower() or 'bochornos' in symptom.lower() or 'hormonal' in symptom.lower():
-            # SALUD FEMENINA - PRODUCTOS REALES DEL CATÁLOGO
-            femenina_keywords = ['PM MUJ', 'ISOFLAVONAS', 'SOY', 'ANGELICA', 'REX OV']
-            for keyword in femenina_keywords:
-                femenina_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in femenina_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'antioxidante' in symptom.lower() or 'envejecimiento' in symptom.lower() or 'anti edad' in symptom.lower():
-            # ANTIOXIDANTES/ANTI-EDAD - PRODUCTOS REALES DEL CATÁLOGO
-            antioxidante_keywords = ['VITAMINA E', 'VITAMINA C', 'COLAGENO', 'ANTIOXIDANTE', 'OMEGA']
-            for keyword in antioxidante_keywords:
-                antioxidante_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in antioxidante_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'vitaminas' in symptom.lower() or 'complejo b' in symptom.lower():
-            # VITAMINAS ESPECÍFICAS - PRODUCTOS REALES DEL CATÁLOGO
-            vitaminas_keywords = ['VITAMINA B', 'VITAMINA C', 'COMPLEJO', 'MULTIVITAMINICO']
-            for keyword in vitaminas_keywords:
-                vitaminas_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in vitaminas_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'inmunidad' in symptom.lower():
-            # Buscar productos para DEFENSAS/INMUNIDAD - PRODUCTOS REALES DEL CATÁLOGO
-            inmunidad_keywords = ['DEFENCE GOLD', 'L10 PROPOLEO', 'PROPOLEO', 'ECHINACEA', 'VITAMINA C', 'ZINC', 'OREGANO', 'EQUINACEA']
-            for keyword in inmunidad_keywords:
-                inmunidad_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in inmunidad_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
-        
-        elif 'energia' in symptom.lower():
-            # Buscar productos para ENERGÍA/VITALIDAD
-            energia_keywords = ['GINSENG', 'GINKGO', 'GUARANA', 'MACA', 'COMPLEJO B', 'B12']
-            for keyword in energia_keywords:
-                energia_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in energia_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
+            # Si aún no hay suficientes, usar productos de bienestar general
+            if len(final_products) < min_products:
+                additional = self._get_general_wellness_products(
+                    min_products - len(final_products), user_profile,
+                    exclude_names={p['nombre'] for p in final_products}, rng=rng
+                )
+                final_products.extend(additional)
         
-        elif 'memoria' in symptom.lower():
-            # Buscar productos para MEMORIA/CONCENTRACIÓN - PRODUCTOS REALES DEL CATÁLOGO
-            memoria_keywords = ['BRAINGEAR', 'MEMORA PLUS', 'GINKGO', 'OMEGA 3', 'LECITINA', 'GINSENG', 'BRAIN', 'FOCUS']
-            for keyword in memoria_keywords:
-                memoria_products = self.catalog_df[self.catalog_df['nombre'].str.contains(keyword, case=False, na=False)]
-                for idx, row in memoria_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = '20'
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        if len(all_matching_products) >= max_products:
-                            break
-                if len(all_matching_products) >= max_products:
-                    break
+        return final_products[:max_products]
+    
+    def _symptom_candidates(self, symptom, user_profile, min_products, max_products):
+        """
+        (candidatos con match_score, si vienen de las reglas) para un síntoma.
+        Se guardan en recommendation_cache por (síntoma normalizado, máscara del
+        perfil, versión del catálogo) antes de rotar.
+        """
+        mask = profile_mask(user_profile) if user_profile else None
+        key = ('symptom_candidates', symptom, mask, self.catalog_snapshot.version, min_products, max_products)
+        cached = recommendation_cache.get(key)
+        if cached is None:
+            products, from_rules = self._collect_symptom_candidates(symptom, user_profile, min_products, max_products)
+            cached = (tuple(MappingProxyType(product) for product in products), from_rules)
+            recommendation_cache.put(key, cached)
+        
+        # La rotación no modifica los candidatos: se comparten entre peticiones
+        products, from_rules = cached
+        return list(products), from_rules
+    
+    def _collect_symptom_candidates(self, symptom, user_profile, min_products, max_products):
+        """Recorrer reglas, síntomas, beneficios e ingredientes del catálogo para un síntoma"""
+        all_matching_products = []
         
-        elif 'dolor de cabeza' in symptom.lower() or 'cabeza' in symptom.lower():
-            # Buscar VALERIANA para dolor de cabeza
-            valeriana_products = self.catalog_df[self.catalog_df['nombre'].str.contains('VALERIANA', case=False, na=False)]
-            for idx, row in valeriana_products.head(2).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = '20'  # Máxima prioridad
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-            
-            # Buscar 7 AZAHARES para dolor de cabeza
-            azahares_products = self.catalog_df[self.catalog_df['nombre'].str.contains('AZAHARES', case=False, na=False)]
-            for idx, row in azahares_products.head(1).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = 20
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-        
-        elif 'dolor estomacal' in symptom.lower() or 'estomacal' in symptom.lower() or 'acidez' in symptom.lower():
-            # Buscar COPALCHI para acidez/ardor estomacal
-            copalchi_products = self.catalog_df[self.catalog_df['nombre'].str.contains('COPALCHI', case=False, na=False)]
-            for idx, row in copalchi_products.head(2).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = 20  # Máxima prioridad
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-            
-            # Buscar FENOGRECO para digestión
-            fenogreco_products = self.catalog_df[self.catalog_df['nombre'].str.contains('FENOGRECO', case=False, na=False)]
-            for idx, row in fenogreco_products.head(1).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = 20
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-        
-        elif 'insomnio' in symptom.lower() or 'dormir' in symptom.lower() or 'sueño' in symptom.lower():
-            # Buscar VALERIANA para insomnio
-            valeriana_products = self.catalog_df[self.catalog_df['nombre'].str.contains('VALERIANA', case=False, na=False)]
-            for idx, row in valeriana_products.head(2).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = 20
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-            
-            # Buscar 7 AZAHARES para relajación/sueño
-            azahares_products = self.catalog_df[self.catalog_df['nombre'].str.contains('AZAHARES', case=False, na=False)]
-            for idx, row in azahares_products.head(1).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = 20
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-        
-        elif 'cansancio' in symptom.lower() or 'fatiga' in symptom.lower() or 'energia' in symptom.lower():
-            # Buscar MEGALPISTE para energía/cansancio
-            energia_products = self.catalog_df[self.catalog_df['nombre'].str.contains('MEGALPISTE', case=False, na=False)]
-            for idx, row in energia_products.head(2).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = 20
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-            
-            # Buscar productos VITAL para energía
-            vital_products = self.catalog_df[self.catalog_df['nombre'].str.contains('VITAL', case=False, na=False)]
-            for idx, row in vital_products.head(1).iterrows():
-                if self._is_safe_for_user(row, user_profile):
-                    product = self._format_product(row)
-                    product['match_score'] = 20
-                    product['product_name'] = str(row.get('nombre', ''))
-                    all_matching_products.append(product)
-        
-        elif 'quistes' in symptom.lower() or 'ovarios' in symptom.lower():
-            # Productos específicos para quistes y problemas hormonales femeninos
-            female_hormonal_products = [
-                'PM ISOFLAVONAS', 'PM MUJER', 'AR REX OV', 'PM MUJ ANGELICA', 'PM REX OV'
-            ]
-            
-            products_found = 0
-            for product_keyword in female_hormonal_products:
-                if products_found >= 2:  # Solo 2 productos
-                    break
-                    
-                matching_products = self.catalog_df[self.catalog_df['nombre'].str.contains(product_keyword, case=False, na=False)]
-                for idx, row in matching_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        product = self._format_product(row)
-                        product['match_score'] = 20
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        products_found += 1
-                        break
-        
-        elif 'dolor muscular' in symptom.lower() or 'muscular' in symptom.lower() or 'musculo' in symptom.lower() or 'molido' in symptom.lower() or 'crujen' in symptom.lower() or 'quebrado' in symptom.lower():
-            # LISTA ESPECÍFICA de productos apropiados para dolor muscular y modismos mexicanos
-            muscle_pain_products = [
-                'CURA DOL PLUS',  # Producto específico para dolor
-                'SHARK CALCIUM',  # Con garra del diablo
-                'VOON FLEX',      # Para flexibilidad y dolor
-                'JUQUILITA',      # Apropiado para dolor muscular
-                'UÑAS GATO', 'UNAS GATO',  # Apropiado para dolor muscular
-                'TEPEZCOHUITE',   # Apropiado para dolor muscular
-                'ARNICA',         # Si existe en el catálogo
-                'SAUCE'          # Si existe en el catálogo
-            ]
-            
-            products_found = 0
-            for product_keyword in muscle_pain_products:
-                if products_found >= 2:  # Solo 2 productos
-                    break
-                    
-                matching_products = self.catalog_df[self.catalog_df['nombre'].str.contains(product_keyword, case=False, na=False)]
-                for idx, row in matching_products.head(1).iterrows():
-                    if self._is_safe_for_user(row, user_profile):
-                        # VERIFICAR que NO sea MEGALPISTE o productos nutricionales
-                        product_name = str(row.get('nombre', '')).lower()
-                        product_benefits = str(row.get('beneficios', '')).lower()
-                        
-                        # EXCLUIR productos nutricionales
-                        if any(exclude_word in product_name or exclude_word in product_benefits 
-                               for exclude_word in ['megalpiste', 'nutricion', 'digestivo', 'cardiovascular', 'alpiste', 'soya']):
-                            continue
-                            
-                        product = self._format_product(row)
-                        product['match_score'] = 20
-                        product['product_name'] = str(row.get('nombre', ''))
-                        all_matching_products.append(product)
-                        products_found += 1
-                        break
+        # FORZAR PRODUCTOS ESPECÍFICOS SEGÚN SÍNTOMA (reglas de symptom_rules.py)
+        all_matching_products.extend(self._rule_products_for_symptom(symptom, user_profile, max_products))
         
-        # Si ya encontramos productos específicos suficientes, retornar directamente
+        # Si ya encontramos productos específicos suficientes, no hace falta buscar más
         if len(all_matching_products) >= min_products:
-            return self._apply_product_rotation(all_matching_products, min_products, max_products)
+            return all_matching_products, True
         
         # FORZAR productos específicos de insomnio (original)
         if symptom == 'insomnio':
             priority_keywords = ['valeriana', 'pasiflora', 'triptofano', '7 azahares']
-            for idx, row in self.catalog_df.iterrows():
+            for idx in self.catalog_index.rows_containing_any('nombre', priority_keywords):
+                row = self.products[idx]
                 product_name = str(row.get('nombre', '')).lower()
                 if any(keyword in product_name for keyword in priority_keywords):
                     # Evitar duplicados
@@ -1148,137 +823,80 @@ class CanaturaAI:
                         product['product_name'] = row['nombre']
                         all_matching_products.append(product)
 
-        # Buscar en síntomas del catálogo (prioridad alta)
-        for idx, row in self.catalog_df.iterrows():
-            if self._product_matches_symptom(row, symptom):
-                if self._is_safe_for_user(row, user_profile):
+        # Niveles de puntuación: síntomas (alta), beneficios (media) e ingredientes
+        # (baja). Cada nivel recorre su lista de publicación del índice y el
+        # predicado de su campo verifica cada fila candidata
+        tier_matchers = {
+            3: self._product_matches_symptom,
+            2: self._product_benefits_match_symptom,
+            1: self._product_ingredients_match_symptom,
+        }
+        for base_score, rows in self.catalog_index.scored_postings(symptom):
+            if base_score == 3:
+                rows = self._symptom_candidate_rows(symptom, rows)
+            matches = tier_matchers[base_score]
+            for idx in rows:
+                row = self.products[idx]
+                if matches(row, symptom) and self._is_safe_for_user(row, user_profile):
                     # Evitar duplicados
                     already_exists = any(p['product_name'] == row['nombre'] for p in all_matching_products)
                     if not already_exists:
                         product = self._format_product(row)
-                        base_score = 3  # Puntuación alta para síntomas directos
+                        score = base_score
                         
                         # AJUSTE ESPECÍFICO PARA INSOMNIO: priorizar productos más específicos
-                        if symptom == 'insomnio':
-                            base_score = self._adjust_score_for_insomnia(row, base_score)
+                        if base_score == 3 and symptom == 'insomnio':
+                            score = self._adjust_score_for_insomnia(row, base_score)
                         
-                        product['match_score'] = base_score
-                        product['product_name'] = row['nombre']
-                        all_matching_products.append(product)
-        
-        # Buscar en beneficios (prioridad media)
-        for idx, row in self.catalog_df.iterrows():
-            if self._product_benefits_match_symptom(row, symptom):
-                if self._is_safe_for_user(row, user_profile):
-                    # Verificar si ya está en la lista
-                    already_exists = any(p['product_name'] == row['nombre'] for p in all_matching_products)
-                    if not already_exists:
-                        product = self._format_product(row)
-                        product['match_score'] = 2  # Puntuación media
+                        product['match_score'] = score
                         product['product_name'] = row['nombre']
                         all_matching_products.append(product)
         
-        # Buscar en ingredientes (prioridad baja)
-        for idx, row in self.catalog_df.iterrows():
-            if self._product_ingredients_match_symptom(row, symptom):
-                if self._is_safe_for_user(row, user_profile):
-                    # Verificar si ya está en la lista
-                    already_exists = any(p['product_name'] == row['nombre'] for p in all_matching_products)
-                    if not already_exists:
-                        product = self._format_product(row)
-                        product['match_score'] = 1  # Puntuación baja
-                        product['product_name'] = row['nombre']
-                        all_matching_products.append(product)
+        return all_matching_products, False
+    
+    def _rule_products_for_symptom(self, symptom, user_profile, max_products):
+        """Productos prioritarios de la primera regla de SYMPTOM_PRODUCT_RULES que aplica al síntoma"""
+        match = self.symptom_rules.match(symptom)
+        if match is None:
+            return []
         
-        # Aplicar rotación equitativa
-        final_products = self._apply_product_rotation(all_matching_products, min_products, max_products)
+        limit, steps = match
+        if limit == 'max':
+            limit = max_products
         
-        # Garantizar mínimo de productos si no hay suficientes
-        if len(final_products) < min_products:
-            # Primero intentar con síntomas similares
-            similar_products = self._find_similar_symptom_products(symptom, user_profile, min_products - len(final_products))
-            final_products.extend(similar_products)
-            
-            # Si aún no hay suficientes, usar productos de bienestar general
-            if len(final_products) < min_products:
-                additional = self._get_general_wellness_products(min_products - len(final_products))
-                final_products.extend(additional)
-        
-        return final_products[:max_products]
+        products = []
+        for rows, score in steps:
+            for idx in rows:
+                if limit is not None and len(products) >= limit:
+                    return products
+                row = self.products[idx]
+                if self._is_safe_for_user(row, user_profile):
+                    product = self._format_product(row)
+                    product['match_score'] = score
+                    product['product_name'] = row.text('nombre')
+                    products.append(product)
+        return products
     
-    def _apply_product_rotation(self, all_matching_products, min_products, max_products):
+    def _apply_product_rotation(self, all_matching_products, min_products, max_products, rng):
         """Aplicar rotación equitativa para dar oportunidades justas a todos los productos"""
-        import random
-        
         if not all_matching_products:
             return []
         
-        # Inicializar contador para productos nuevos
-        for product in all_matching_products:
-            product_name = product['product_name']
-            if product_name not in self.product_rotation_counter:
-                self.product_rotation_counter[product_name] = 0
-        
-        # Separar por puntuación de coincidencia (incluyendo productos específicos para acidez)
-        expert_score = [p for p in all_matching_products if int(p.get('match_score', 0)) >= 8]  # Productos específicos para acidez
-        high_score = [p for p in all_matching_products if int(p.get('match_score', 0)) == 3]
-        medium_score = [p for p in all_matching_products if int(p.get('match_score', 0)) == 2]
-        low_score = [p for p in all_matching_products if int(p.get('match_score', 0)) == 1]
-        
-        # Función para ordenar por rotación (menos veces mostrado = más prioridad)
-        def sort_by_rotation(products):
-            return sorted(products, key=lambda p: (
-                self.product_rotation_counter[p['product_name']],  # Menos veces mostrado primero
-                random.random()  # Aleatorio como desempate
-            ))
-        
-        # Ordenar cada grupo por rotación
-        expert_score = sort_by_rotation(expert_score)
-        high_score = sort_by_rotation(high_score)
-        medium_score = sort_by_rotation(medium_score)
-        low_score = sort_by_rotation(low_score)
-        
-        # Seleccionar productos balanceando prioridad y rotación
-        selected_products = []
-        
-        # PRIORIDAD MÁXIMA: productos específicos para acidez/digestivo
-        for product in expert_score:
-            if len(selected_products) >= max_products:
-                break
-            selected_products.append(product)
-            self.product_rotation_counter[product['product_name']] += 1
+        # Veces que ya se mostró cada candidato (ver rotation_state.py)
+        shown = self.rotation_counter.counts([p['product_name'] for p in all_matching_products])
         
-        # Priorizar productos de alta coincidencia con rotación
-        for product in high_score:
-            if len(selected_products) >= max_products:
-                break
-            selected_products.append(product)
-            self.product_rotation_counter[product['product_name']] += 1
+        # Prioridad por puntuación (productos específicos, síntomas, beneficios,
+        # ingredientes) y dentro de cada nivel los menos mostrados primero
+        selected_products = select_rotated(all_matching_products, shown, max_products, rng)
         
-        # Agregar productos de media coincidencia si necesitamos más
-        if len(selected_products) < max_products:
-            for product in medium_score:
-                if len(selected_products) >= max_products:
-                    break
-                selected_products.append(product)
-                self.product_rotation_counter[product['product_name']] += 1
+        # Contar las apariciones de los productos elegidos
+        self.rotation_counter.increment([p['product_name'] for p in selected_products])
         
-        # Agregar productos de baja coincidencia si aún necesitamos más
-        if len(selected_products) < max_products:
-            for product in low_score:
-                if len(selected_products) >= max_products:
-                    break
-                selected_products.append(product)
-                self.product_rotation_counter[product['product_name']] += 1
-        
-        # Limpiar campos auxiliares
-        for product in selected_products:
-            if 'match_score' in product:
-                del product['match_score']
-            if 'product_name' in product:
-                del product['product_name']
-        
-        return selected_products
+        # Copias sin los campos auxiliares: los candidatos pueden ser compartidos
+        return [
+            {key: value for key, value in product.items() if key not in ('match_score', 'product_name')}
+            for product in selected_products
+        ]
     
     def _product_matches_symptom(self, product_row, symptom):
         """Verificar si el producto coincide con el síntoma en la columna de síntomas"""
@@ -1307,16 +925,14 @@ class CanaturaAI:
                 return False
         
         # PERMITIR productos específicos cuando se detecta el tipo correcto de dolor
-        elif symptom in ['dolor de cabeza', 'dolor muscular', 'dolor articular', 
-                        'dolor estomacal', 'dolor menstrual', 'dolor de garganta', 'dolor dental']:
+        elif symptom in self.SPECIFIC_PAIN_SYMPTOMS:
             # Para dolores específicos, permitir productos especializados
             return True
         
         # PRIORIDAD ESPECIAL para productos específicos de insomnio
         if symptom == 'insomnio':
             # Productos específicos que DEBEN aparecer para insomnio
-            priority_sleep_products = ['valeriana', 'pasiflora', 'triptofano', 'magnesio', '7 azahares']
-            if any(priority in product_name for priority in priority_sleep_products):
+            if any(priority in product_name for priority in self.PRIORITY_SLEEP_PRODUCTS):
                 return True
         
         return symptom in product_symptoms
@@ -1372,108 +988,14 @@ class CanaturaAI:
         if not user_profile:
             return True
         
-        # 1. FILTRO POR SEXO - Verificar restricciones de género
-        if 'sexo' in product_row and product_row['sexo']:
-            product_gender = str(product_row['sexo']).lower().strip()
-            user_gender = user_profile.get('gender', '').lower().strip()
-            
-            # Si el producto especifica un sexo, debe coincidir exactamente con el usuario
-            if product_gender in ['mujer', 'femenino', 'mujeres', 'female']:
-                if user_gender not in ['femenino', 'mujer']:
-                    self.logger.info(f"Producto {product_row.get('nombre', 'Desconocido')} excluido por género (solo mujeres)")
-                    return False
-            elif product_gender in ['hombre', 'masculino', 'hombres', 'male']:
-                if user_gender not in ['masculino', 'hombre']:
-                    self.logger.info(f"Producto {product_row.get('nombre', 'Desconocido')} excluido por género (solo hombres)")
-                    return False
-            # Si el campo está vacío o dice "ambos/unisex", es para todos
-        
-        # 1.5. FILTRO POR EDAD - Verificar si es apropiado para menores de edad
-        user_age = int(user_profile.get('age', 18))
-        product_name = str(product_row.get('nombre', '')).lower()
-        
-        # Productos específicos para niños que NO deben aparecer para adultos
-        kids_only_products = ['mi peke', 'peke', 'niños', 'infantil', 'pediatrico']
-        is_kids_product = any(kid_term in product_name for kid_term in kids_only_products)
-        
-        # Productos específicos para adultos que NO deben aparecer para menores
-        adult_only_products = ['resveratrol', 'energy', 'vigor', 'libido', 'testosterone']
-        is_adult_product = any(adult_term in product_name for adult_term in adult_only_products)
-        
-        if user_age < 18 and is_adult_product:
-            self.logger.info(f"Producto {product_row.get('nombre', 'Desconocido')} excluido (solo adultos)")
-            return False
-        elif user_age >= 18 and is_kids_product:
-            self.logger.info(f"Producto {product_row.get('nombre', 'Desconocido')} excluido (solo niños)")
-            return False
-        
-        # 1.6. FILTRO POR RELEVANCIA DE SÍNTOMAS - Evitar productos irrelevantes para síntomas específicos
-        # Productos que no son apropiados para ciertos síntomas específicos
-        product_name_lower = product_name.lower()
-        
-        # Multivitamínicos para niños no son apropiados para estrés en adultos
-        if 'mi peke' in product_name_lower and user_age >= 18:
-            self.logger.info(f"Producto {product_row.get('nombre', 'Desconocido')} excluido (multivitamínico infantil no apropiado para adultos)")
-            return False
-        
-        # Antioxidantes como resveratrol no son para síntomas agudos
-        if 'resveratrol' in product_name_lower:
-            # Solo permitir resveratrol para síntomas donde sea realmente relevante
-            symptoms_text = str(product_row.get('sintomas', '')).lower() + str(product_row.get('beneficios', '')).lower()
-            if 'antioxidante' not in symptoms_text and 'cardiovascular' not in symptoms_text:
-                self.logger.info(f"Producto {product_row.get('nombre', 'Desconocido')} excluido (antioxidante no relevante para síntoma actual)")
-                return False
-        
-        # 2. FILTRO PARA DIABÉTICOS - Verificar contraindicaciones específicas
-        user_has_diabetes = user_profile.get('diabetes', False)
-        if user_has_diabetes and 'contradiccion' in product_row and product_row['contradiccion']:
-            contraindications = self._normalize_text(str(product_row['contradiccion']))
-            
-            # Palabras clave que indican contraindicación para diabéticos
-            diabetes_warnings = [
-                'diabeticos', 'diabetico', 'diabetes', 'glucosa alta', 
-                'azucar alta', 'hiperglucemia', 'insulina'
-            ]
-            
-            for warning in diabetes_warnings:
-                if warning in contraindications:
-                    self.logger.info(f"Producto {product_row.get('nombre', 'Desconocido')} excluido por diabetes")
-                    return False
-        
-        # 3. OTROS FILTROS DE SEGURIDAD
-        if 'contradiccion' in product_row and product_row['contradiccion']:
-            contraindications = self._normalize_text(str(product_row['contradiccion']))
-            
-            # Verificar hipertensión
-            user_has_hypertension = user_profile.get('hypertension', False)
-            if user_has_hypertension:
-                hypertension_warnings = ['hipertenso', 'hipertension', 'presion alta']
-                for warning in hypertension_warnings:
-                    if warning in contraindications:
-                        return False
-            
-            # Verificar embarazo
-            user_is_pregnant = user_profile.get('pregnancy', False)
-            if user_is_pregnant:
-                pregnancy_warnings = ['embarazada', 'embarazo', 'gestacion', 'lactancia']
-                for warning in pregnancy_warnings:
-                    if warning in contraindications:
-                        return False
-        
-        return True
+        # Sexo, edad, relevancia y contraindicaciones: banderas precalculadas
+        # por producto contra la máscara del perfil (ver safety_index.py)
+        product_id = self.products.record(product_row).product_id
+        return self.safety_index.is_allowed(product_id, profile_mask(user_profile))
     
     def _format_product(self, product_row):
         """Formatear información del producto real del catálogo"""
-        return {
-            'nombre': str(product_row.get('nombre', 'Producto Canatura')),
-            'beneficios': str(product_row.get('beneficios', 'Beneficios naturales para la salud')),
-            'dosis': str(product_row.get('dosis', 'Consultar con especialista')),
-            'modo_de_uso': str(product_row.get('modo_de_uso', 'INGERIBLE')),
-            'presentacion': str(product_row.get('presentacion', 'Suplemento natural')),
-            'ingredientes': str(product_row.get('ingredientes', 'Ingredientes naturales')),
-            'contradiccion': str(product_row.get('contradiccion', '')),
-            'condiciones_especiales': str(product_row.get('condiciones especiales', ''))
-        }
+        return self.products.record(product_row).as_dict(self.PRODUCT_FIELDS)
     
     def _ensure_product_variety(self, products, max_count):
         """Asegurar variedad de productos (evitar duplicados del mismo base)"""
@@ -1493,26 +1015,20 @@ class CanaturaAI:
         
         return varied_products
     
-    def _get_general_wellness_products(self, count):
+    def _get_general_wellness_products(self, count, user_profile=None, exclude_names=(), rng=None):
         """Obtener productos generales de bienestar como respaldo con rotación equitativa"""
-        wellness_keywords = ['energia', 'bienestar', 'salud', 'vitaminas', 'natural', 'inmune']
-        all_wellness_products = []
-        
-        # Recopilar todos los productos de bienestar
-        for idx, row in self.catalog_df.iterrows():
-            product_text = f"{row.get('beneficios', '')} {row.get('nombre', '')}".lower()
-            if any(keyword in product_text for keyword in wellness_keywords):
-                product = self._format_product(row)
-                product['product_name'] = row['nombre']
-                product['match_score'] = 0  # Puntuación base para productos de bienestar
-                all_wellness_products.append(product)
+        # Productos de bienestar ya formateados (una vez por versión del catálogo),
+        # filtrados con la misma máscara de seguridad que el resto de candidatos
+        allowed = self.safety_index.allowed(profile_mask(user_profile)) if user_profile else None
+        all_wellness_products = [
+            product for product_id, product in self.catalog_snapshot.derived('wellness_pool', _collect_wellness_pool)
+            if (allowed is None or allowed[product_id]) and product['nombre'] not in exclude_names
+        ]
         
         # Aplicar rotación si hay productos disponibles
         if all_wellness_products:
-            rotated_products = self._apply_product_rotation(all_wellness_products, count, count)
+            rotated_products = self._apply_product_rotation(all_wellness_products, count, count, rng or rotation_rng())
             return rotated_products
         
         # Si no hay productos de bienestar, devolver lista vacía
-        wellness_products = []
-        
-        return wellness_products[:count]
\ No newline at end of file
+        return []
\ No newline at end of file
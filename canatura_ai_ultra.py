@@ -4,6 +4,7 @@ Integra todas las capacidades avanzadas excepto procesamiento de lenguaje natura
 """
 
 from canatura_ai_advanced import CanaturaAI_Advanced
+from knowledge_base import knowledge_store
 import pandas as pd
 import logging
 import json
@@ -25,21 +26,24 @@ class CanaturaAI_Ultra(CanaturaAI_Advanced):
         self.version = "Ultra-1.0"
         self.logger.info(f"✓ SaludArte IA {self.version} inicializado")
         
+        # Tablas de los métodos _build_* ya compiladas (ver knowledge_base.py)
+        knowledge = knowledge_store.get()['ultra']
+        
         # 1. INTELIGENCIA FARMACOLÓGICA
-        self.drug_interactions = self._build_drug_interactions()
-        self.contraindications_advanced = self._build_advanced_contraindications()
+        self.drug_interactions = knowledge['drug_interactions']
+        self.contraindications_advanced = knowledge['contraindications_advanced']
         
         # 2. ANÁLISIS DE PATRONES DE SALUD
-        self.health_syndromes = self._build_health_syndromes()
-        self.risk_factors = self._build_risk_factors()
+        self.health_syndromes = knowledge['health_syndromes']
+        self.risk_factors = knowledge['risk_factors']
         
         # 3. PERSONALIZACIÓN INTELIGENTE
         self.user_profiles_database = {}
-        self.personalization_rules = self._build_personalization_rules()
+        self.personalization_rules = knowledge['personalization_rules']
         
         # 5. INTELIGENCIA PREVENTIVA
-        self.preventive_recommendations = self._build_preventive_system()
-        self.lifestyle_analysis = self._build_lifestyle_analyzers()
+        self.preventive_recommendations = knowledge['preventive_recommendations']
+        self.lifestyle_analysis = knowledge['lifestyle_analysis']
         
         # 6. SISTEMA DE APRENDIZAJE
         self.user_feedback_database = {}
@@ -0,0 +1,129 @@
+"""
+Índice invertido del catálogo de SaludArte
+Responde "¿qué filas mencionan X en el campo F?" sin recorrer el DataFrame
+"""
+from fuzzy_index import NgramIndex
+
+# Campos indexados (se usa su columna <campo>_norm)
+INDEXED_FIELDS = ['sintomas', 'beneficios', 'ingredientes', 'nombre']
+
+# Campo del que proviene cada nivel de match_score en CanaturaAI
+SCORE_FIELDS = {3: 'sintomas', 2: 'beneficios', 1: 'ingredientes'}
+
+
+class CatalogTextIndex:
+    """
+    Índice de n-gramas de caracteres sobre las columnas normalizadas.
+    Las filas se identifican por su posición en el DataFrame normalizado y las
+    listas de publicación están ordenadas, así que recorrerlas respeta el
+    orden original del catálogo.
+    """
+
+    def __init__(self, catalog_df, fields=INDEXED_FIELDS):
+        self.row_count = len(catalog_df)
+        self._ngrams = {}
+
+        for field in fields:
+            column = f'{field}_norm'
+            if column not in catalog_df.columns:
+                continue
+
+            self._ngrams[field] = NgramIndex(str(value) for value in catalog_df[column].tolist())
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Construir el índice de una instantánea del catálogo"""
+        return cls(snapshot.normalized_df)
+
+    def nonempty_rows(self, field):
+        """Filas con el campo no vacío"""
+        ngrams = self._ngrams.get(field)
+        return ngrams.nonempty() if ngrams is not None else ()
+
+    def rows_containing(self, field, text):
+        """Filas cuyo campo (no vacío) contiene el texto como subcadena"""
+        ngrams = self._ngrams.get(field)
+        return ngrams.containing(text) if ngrams is not None else ()
+
+    def rows_containing_any(self, field, texts):
+        """Filas cuyo campo contiene al menos uno de los textos"""
+        rows = set()
+        for text in texts:
+            rows.update(self.rows_containing(field, text))
+        return tuple(sorted(rows))
+
+    def scored_postings(self, text):
+        """Listas de publicación por nivel de puntuación: [(match_score, filas), ...]"""
+        return [(score, self.rows_containing(field, text))
+                for score, field in sorted(SCORE_FIELDS.items(), reverse=True)]
+
+
+class CatalogSymptomVocabulary:
+    """
+    Vocabulario de síntomas del catálogo (entradas de sintomas_norm separadas
+    por comas). Se calcula una vez por versión y permite detectar los síntomas
+    del catálogo presentes en un texto con una sola pasada.
+    """
+
+    def __init__(self, catalog_df):
+        symptoms = set()
+        if 'sintomas_norm' in catalog_df.columns:
+            for value in catalog_df['sintomas_norm'].tolist():
+                if not value:
+                    continue
+                for item in str(value).split(','):
+                    symptom = item.strip(' .')
+                    if symptom:
+                        symptoms.add(symptom)
+
+        self.symptoms = frozenset(symptoms)
+
+        # Trie para la coincidencia más larga
+        self._trie = {}
+        for symptom in self.symptoms:
+            node = self._trie
+            for char in symptom:
+                node = node.setdefault(char, {})
+            node[None] = symptom
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Construir el vocabulario de una instantánea del catálogo"""
+        return cls(snapshot.normalized_df)
+
+    def __contains__(self, symptom):
+        return symptom in self.symptoms
+
+    def __len__(self):
+        return len(self.symptoms)
+
+    def longest_matches(self, text):
+        """
+        Síntomas del catálogo presentes en el texto, en orden de aparición y sin
+        solapamiento: en cada inicio de palabra se toma la entrada más larga que
+        termina en un fin de palabra
+        """
+        matches = []
+        position = 0
+        length = len(text)
+        while position < length:
+            if position > 0 and text[position - 1].isalnum():
+                position += 1
+                continue
+
+            node = self._trie
+            longest = None
+            end = position
+            for index in range(position, length):
+                node = node.get(text[index])
+                if node is None:
+                    break
+                if None in node and (index + 1 == length or not text[index + 1].isalnum()):
+                    longest = node[None]
+                    end = index + 1
+            if longest is None:
+                position += 1
+            else:
+                matches.append(longest)
+                position = end
+        return matches
@@ -1,58 +1,55 @@
 import pandas as pd
-import os
 import logging
+from types import MappingProxyType
 from ai_service import AIService
+from catalog_store import catalog_store
+
+
+def _collect_unique_symptoms(snapshot):
+    """Unique comma-separated symptoms listed in the catalog"""
+    catalog_df = snapshot.df
+    symptoms_list = []
+    if 'sintomas' in catalog_df.columns:
+        for symptoms in catalog_df['sintomas'].dropna():
+            if isinstance(symptoms, str):
+                # Split by comma and clean
+                symptom_items = [s.strip() for s in symptoms.split(',')]
+                symptoms_list.extend(symptom_items)
+    
+    return list(set(symptoms_list))
+
+
+def _wellness_pool(catalog_df):
+    """General wellness products: (fields checked for contraindications, formatted product)"""
+    wellness_pool = []
+    for idx, row in catalog_df.iterrows():
+        product_text = f"{str(row.get('nombre', ''))} {str(row.get('beneficios', ''))}".lower()
+        
+        if any(keyword in product_text for keyword in CatalogService.WELLNESS_KEYWORDS):
+            safety_fields = MappingProxyType({'contradiccion': row.get('contradiccion'), 'sexo': row.get('sexo')})
+            wellness_pool.append((safety_fields, MappingProxyType(CatalogService._format_product_info(row))))
+    return tuple(wellness_pool)
+
+
+def _collect_wellness_pool(snapshot):
+    """Wellness pool of a catalog version"""
+    return _wellness_pool(snapshot.df)
+
 
 class CatalogService:
+    WELLNESS_KEYWORDS = ('bienestar', 'multivitamínico', 'energía', 'salud general')
+    
     def __init__(self):
         self.ai_service = AIService()
-        self.catalog_path = None
-        self._find_catalog_file()
-    
-    def _find_catalog_file(self):
-        """Find the catalog file in uploads or use sample"""
-        upload_path = os.path.join('uploads', 'catalog.xlsx')
-        sample_path = 'sample_catalog.xlsx'
-        
-        if os.path.exists(upload_path):
-            self.catalog_path = upload_path
-        elif os.path.exists(sample_path):
-            self.catalog_path = sample_path
-        else:
-            logging.warning("No catalog file found")
-            self.catalog_path = None
     
     def load_catalog(self):
         """Load and process the product catalog"""
-        if not self.catalog_path or not os.path.exists(self.catalog_path):
-            logging.error("Catalog file not found")
-            return None
-        
         try:
-            # Load the Excel file with explicit engine
-            try:
-                catalog_df = pd.read_excel(self.catalog_path, engine='openpyxl')
-            except Exception as e1:
-                logging.warning(f"Failed with openpyxl: {e1}, trying xlrd")
-                try:
-                    catalog_df = pd.read_excel(self.catalog_path, engine='xlrd')
-                except Exception as e2:
-                    logging.warning(f"Failed with xlrd: {e2}, trying without engine")
-                    catalog_df = pd.read_excel(self.catalog_path)
+            snapshot = catalog_store.get()
+            catalog_df = snapshot.df
             
-            # Clean column names (remove extra spaces)
-            catalog_df.columns = catalog_df.columns.str.strip()
-            
-            # Get unique symptoms from catalog
-            symptoms_list = []
-            if 'sintomas' in catalog_df.columns:
-                for symptoms in catalog_df['sintomas'].dropna():
-                    if isinstance(symptoms, str):
-                        # Split by comma and clean
-                        symptom_items = [s.strip() for s in symptoms.split(',')]
-                        symptoms_list.extend(symptom_items)
-            
-            unique_symptoms = list(set(symptoms_list))
+            # Get unique symptoms from catalog (computed once per catalog version)
+            unique_symptoms = snapshot.derived('unique_symptoms', _collect_unique_symptoms)
             
             logging.info(f"Loaded catalog with {len(catalog_df)} products and {len(unique_symptoms)} unique symptoms")
             
@@ -195,21 +192,23 @@ class CatalogService:
     
     def _find_wellness_products(self, catalog_df, user_profile):
         """Find general wellness products as fallback"""
-        wellness_products = []
-        wellness_keywords = ['bienestar', 'multivitamínico', 'energía', 'salud general']
+        # The pool of the current catalog version is built once; other frames are scanned
+        snapshot = catalog_store.current()
+        if catalog_df is snapshot.df:
+            wellness_pool = snapshot.derived('catalog_service_wellness', _collect_wellness_pool)
+        else:
+            wellness_pool = _wellness_pool(catalog_df)
         
-        for idx, row in catalog_df.iterrows():
-            product_text = f"{str(row.get('nombre', ''))} {str(row.get('beneficios', ''))}".lower()
-            
-            if any(keyword in product_text for keyword in wellness_keywords):
-                contraindications = self.ai_service.analyze_contraindications(row, user_profile)
-                if not contraindications:
-                    product_info = self._format_product_info(row)
-                    wellness_products.append(product_info)
+        wellness_products = []
+        for safety_fields, product_info in wellness_pool:
+            contraindications = self.ai_service.analyze_contraindications(safety_fields, user_profile)
+            if not contraindications:
+                wellness_products.append(dict(product_info))
         
         return wellness_products
     
-    def _format_product_info(self, product_row):
+    @staticmethod
+    def _format_product_info(product_row):
         """Format product information for display"""
         return {
             'nombre': str(product_row.get('nombre', 'Sin nombre')),
@@ -0,0 +1,366 @@
+"""
+Almacén compartido del catálogo de SaludArte
+Carga cada libro de Excel una sola vez por proceso y entrega la misma
+instantánea inmutable y versionada a todos los motores
+"""
+import os
+import glob
+import time
+import hashlib
+import shutil
+import logging
+import threading
+import weakref
+from datetime import datetime
+import pandas as pd
+from text_normalizer import normalize_text
+
+CATALOG_FILE = 'PLANTILLA CATALOGO CON INGREDIENTES.xlsx'
+RESTRICTIONS_FILE = 'Restricciones_Alimentarias_Completa_SaludArte.xlsx'
+
+# Columnas de texto que los motores buscan en su forma normalizada (<col>_norm)
+NORMALIZED_COLUMNS = ['sintomas', 'beneficios', 'ingredientes', 'nombre']
+
+# Cambiar al modificar la forma de los DataFrames guardados en caché
+CACHE_FORMAT = 1
+
+
+def _read_workbook(path):
+    """Leer un libro de Excel probando los motores disponibles"""
+    try:
+        return pd.read_excel(path, engine='openpyxl')
+    except Exception as e1:
+        logging.warning(f"Failed with openpyxl: {e1}, trying xlrd")
+        return pd.read_excel(path, engine='xlrd')
+
+
+class CatalogSnapshot:
+    """
+    Instantánea de solo lectura de un libro de Excel ya procesado.
+    Los motores comparten la misma instancia: ningún consumidor debe modificar
+    los DataFrames que expone (usar .copy() antes de editar).
+    """
+
+    def __init__(self, version, path, df, frames=None):
+        self.version = version
+        self.path = path
+        self.df = df  # Tal como se leyó, con nombres de columna sin espacios
+        self.loaded_at = datetime.now()
+        self.file_signature = _file_signature(path)
+        self._derived = {}
+        self._builders = {}
+        self._lock = threading.RLock()  # Un artefacto puede depender de otro
+
+        # Tablas ya calculadas que vienen de la caché binaria
+        for name, frame in (frames or {}).items():
+            self._derived[name] = frame
+            self._builders[name] = CACHED_FRAMES[name]
+
+    @property
+    def filled_df(self):
+        """Libro con celdas vacías como cadena vacía"""
+        return self.derived('filled', _build_filled_frame)
+
+    @property
+    def normalized_df(self):
+        """Libro listo para búsqueda: columnas en minúsculas y columnas <col>_norm"""
+        return self.derived('normalized', _build_normalized_frame)
+
+    def derived(self, name, builder):
+        """
+        Obtener un artefacto derivado de esta versión del catálogo.
+        builder(snapshot) se ejecuta una sola vez; las llamadas siguientes
+        reciben el mismo objeto hasta que llegue una nueva versión.
+        """
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = builder(self)
+                self._builders[name] = builder
+            return self._derived[name]
+
+    def warm_like(self, other):
+        """Construir por adelantado los mismos artefactos que ya usa otra instantánea"""
+        for name, builder in list(other._builders.items()):
+            self.derived(name, builder)
+
+    def __len__(self):
+        return len(self.df)
+
+    def __repr__(self):
+        return f'<CatalogSnapshot v{self.version} {self.path} ({len(self.df)} filas)>'
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+
+def _build_filled_frame(snapshot):
+    return snapshot.df.fillna('')
+
+
+def _build_normalized_frame(snapshot):
+    df = snapshot.df.fillna('')
+    df.columns = df.columns.str.strip().str.lower()
+
+    for col in NORMALIZED_COLUMNS:
+        if col in df.columns:
+            df[f'{col}_norm'] = df[col].apply(normalize_text)
+
+    return df
+
+
+# Tablas derivadas que se guardan junto al libro en la caché binaria
+CACHED_FRAMES = {
+    'filled': _build_filled_frame,
+    'normalized': _build_normalized_frame,
+}
+
+
+def _content_digest(path):
+    """Huella SHA-256 del contenido del archivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_path(path, digest):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f'.{name}.{digest[:16]}.v{CACHE_FORMAT}.cache.pkl')
+
+
+class CatalogStore:
+    """
+    Dueño único de un libro de Excel dentro del proceso.
+    get() lo carga la primera vez y devuelve siempre la instantánea vigente;
+    reload() vuelve a leer el archivo y sustituye la instantánea completa.
+
+    Cada libro leído se guarda además en una caché binaria a su lado,
+    identificada por la huella de su contenido: los demás procesos y los
+    arranques siguientes la leen en milisegundos en lugar de volver a
+    procesar el Excel con openpyxl.
+
+    Cada petición web fija con pin() la instantánea vigente al empezar y los
+    motores la leen con current(), así una petición en curso termina con la
+    versión con la que empezó aunque se publique otra mientras tanto.
+    """
+
+    # Cada cuántos segundos se revisa si otro proceso reemplazó el archivo
+    FILE_CHECK_INTERVAL = 2.0
+
+    def __init__(self, path, fallback_paths=None):
+        self.path = path
+        self.fallback_paths = list(fallback_paths or [])
+        self.logger = logging.getLogger(__name__)
+        self._snapshot = None
+        self._version = 0
+        self._lock = threading.RLock()
+        self._publish_lock = threading.Lock()
+        self._local = threading.local()
+        self._subscribers = []
+        self._last_file_check = 0.0
+        self._failed_signature = None
+        self._background_reload = None
+
+    def get(self):
+        """Instantánea vigente (se carga bajo demanda la primera vez)"""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._load()
+            return self._snapshot
+
+    def current(self):
+        """Instantánea fijada para la petición en curso o, si no hay, la vigente"""
+        snapshot = getattr(self._local, 'snapshot', None)
+        return snapshot if snapshot is not None else self.get()
+
+    def pin(self):
+        """Fijar la instantánea vigente para la petición de este hilo"""
+        self._check_file_changed()
+        self._local.snapshot = self.get()
+        return self._local.snapshot
+
+    def unpin(self):
+        self._local.snapshot = None
+
+    def subscribe(self, callback):
+        """Registrar un método a llamar con cada nueva instantánea publicada"""
+        self._subscribers.append(weakref.WeakMethod(callback))
+
+    def reload(self):
+        """Volver a leer el libro y publicar una nueva versión"""
+        return self.publish(self.load_candidate())
+
+    def load_candidate(self, path=None):
+        """Leer un libro (una sola vez) sin publicarlo todavía"""
+        if path is None:
+            return self._load()
+        return self._read_snapshot(path)
+
+    def publish(self, snapshot, persist=False):
+        """
+        Publicar una instantánea: construir los mismos índices que la versión
+        anterior, opcionalmente copiarla sobre el archivo principal y
+        sustituirla de forma atómica
+        """
+        with self._publish_lock:
+            # Si algún índice falla, el archivo principal no se toca
+            previous = self._snapshot
+            if previous is not None:
+                snapshot.warm_like(previous)
+
+            if persist and os.path.abspath(snapshot.path) != os.path.abspath(self.path):
+                shutil.copy(snapshot.path, self.path)
+                snapshot.path = self.path
+                snapshot.file_signature = _file_signature(self.path)
+                self._write_cache(self.path, _content_digest(self.path), snapshot)
+
+            with self._lock:
+                if self._snapshot is not None and self._snapshot.version > snapshot.version:
+                    return self._snapshot
+                self._snapshot = snapshot
+
+            self.logger.info(f"✓ Nueva versión publicada: {snapshot!r}")
+            self._notify(snapshot)
+            return snapshot
+
+    def publish_in_background(self, snapshot, persist=False):
+        """Publicar fuera del hilo de la petición; devuelve el hilo iniciado"""
+        thread = threading.Thread(target=self._publish_safely, args=(snapshot, persist), daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def version(self):
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else 0
+
+    def _publish_safely(self, snapshot, persist=False):
+        try:
+            self.publish(snapshot, persist)
+        except Exception as e:
+            self.logger.error(f"Error publicando {snapshot!r}: {e}")
+
+    def _notify(self, snapshot):
+        for reference in list(self._subscribers):
+            callback = reference()
+            if callback is None:
+                self._subscribers.remove(reference)
+                continue
+            try:
+                callback(snapshot)
+            except Exception as e:
+                self.logger.error(f"Error actualizando motor con {snapshot!r}: {e}")
+
+    def _check_file_changed(self):
+        """Recargar en segundo plano si otro proceso reemplazó el archivo"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is None or now - self._last_file_check < self.FILE_CHECK_INTERVAL:
+            return
+        self._last_file_check = now
+
+        signature = _file_signature(snapshot.path)
+        if signature == snapshot.file_signature or signature == self._failed_signature:
+            return
+        if self._background_reload is not None and self._background_reload.is_alive():
+            return
+
+        self.logger.info(f"Archivo modificado, recargando en segundo plano: {snapshot.path}")
+        self._background_reload = threading.Thread(target=self._reload_safely, args=(signature,), daemon=True)
+        self._background_reload.start()
+
+    def _reload_safely(self, signature=None):
+        try:
+            self.reload()
+        except Exception as e:
+            # No reintentar con el mismo archivo hasta que vuelva a cambiar
+            self._failed_signature = signature
+            self.logger.error(f"Error recargando {self.path}: {e}")
+
+    def _new_snapshot(self, path, df, frames=None):
+        with self._lock:
+            self._version += 1
+            version = self._version
+        return CatalogSnapshot(version, path, df, frames)
+
+    def _read_snapshot(self, path):
+        """Instantánea de un libro, desde su caché binaria si el contenido no cambió"""
+        digest = _content_digest(path)
+        cache_path = _cache_path(path, digest)
+
+        if os.path.exists(cache_path):
+            try:
+                cached = pd.read_pickle(cache_path)
+                snapshot = self._new_snapshot(path, cached['df'], cached['frames'])
+                self.logger.info(f"✓ Caché binaria usada: {cache_path}")
+                return snapshot
+            except Exception as e:
+                self.logger.warning(f"Caché inválida {cache_path}: {e}")
+
+        df = _read_workbook(path)
+        df.columns = df.columns.str.strip()
+        snapshot = self._new_snapshot(path, df)
+        self._write_cache(path, digest, snapshot)
+        return snapshot
+
+    def _write_cache(self, path, digest, snapshot):
+        """Guardar el libro y sus tablas derivadas; un fallo aquí no impide la carga"""
+        cache_path = _cache_path(path, digest)
+        try:
+            frames = {name: snapshot.derived(name, builder) for name, builder in CACHED_FRAMES.items()}
+            temp_path = f'{cache_path}.{os.getpid()}.tmp'
+            pd.to_pickle({'df': snapshot.df, 'frames': frames}, temp_path)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            self.logger.warning(f"No se pudo guardar la caché {cache_path}: {e}")
+            return
+
+        # Las cachés de contenidos anteriores del mismo libro ya no sirven
+        directory, name = os.path.split(path)
+        for stale in glob.glob(os.path.join(glob.escape(directory), f'.{glob.escape(name)}.*.cache.pkl')):
+            if stale != cache_path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def _load(self):
+        last_error = None
+
+        for path in [self.path] + self.fallback_paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                snapshot = self._read_snapshot(path)
+            except Exception as e:
+                self.logger.error(f"Error leyendo {path}: {e}")
+                last_error = e
+                continue
+
+            self.logger.info(f"✓ Libro cargado: {snapshot!r}")
+            return snapshot
+
+        raise FileNotFoundError(f"No se pudo cargar {self.path}") from last_error
+
+
+# Instancias globales compartidas por todos los servicios
+catalog_store = CatalogStore(CATALOG_FILE, fallback_paths=[
+    os.path.join('uploads', CATALOG_FILE),
+    'sample_catalog.xlsx'
+])
+restrictions_store = CatalogStore(RESTRICTIONS_FILE)
@@ -4,6 +4,8 @@ import logging
 from models import Product, UserProfile, Recommendation, db
 from sqlalchemy import or_, and_, func
 import re
+from text_normalizer import normalize_text
+from safety_index import contraindication_flags, database_condition_mask
 
 class DatabaseService:
     def __init__(self):
@@ -100,21 +102,7 @@ class DatabaseService:
     
     def _normalize_text(self, text):
         """Normalize Spanish text for better matching"""
-        if not text:
-            return ""
-        
-        text = text.lower()
-        
-        # Replace Spanish accents
-        accent_map = {
-            'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u', 'ü': 'u',
-            'ñ': 'n'
-        }
-        
-        for accented, normal in accent_map.items():
-            text = text.replace(accented, normal)
-        
-        return text
+        return normalize_text(text)
     
     def _extract_keywords(self, text):
         """Extract meaningful keywords from user input"""
@@ -138,20 +126,19 @@ class DatabaseService:
         """Filter products based on user profile constraints"""
         filtered_products = []
         
+        # Common contraindications mentioned in the user's conditions, as flags
+        # (see safety_index.py); each product's contraindication text is flagged once
+        user_conditions = user_profile.get('condiciones_medicas')
+        condition_mask = database_condition_mask(user_conditions) if user_conditions else 0
+        
         for product in products:
             # Check gender restrictions
             if product.sexo and product.sexo != 'ambos' and product.sexo != user_profile.get('sexo', ''):
                 continue
             
             # Check contraindications
-            if product.contradiccion and user_profile.get('condiciones_medicas'):
-                user_conditions = user_profile.get('condiciones_medicas', '').lower()
-                contraindications = product.contradiccion.lower()
-                
-                # Simple check for common contraindications
-                if any(condition in contraindications for condition in ['diabetes', 'hipertension', 'embarazo'] 
-                       if condition in user_conditions):
-                    continue
+            if product.contradiccion and condition_mask & contraindication_flags(product.contradiccion):
+                continue
             
             filtered_products.append(product)
         
@@ -1,6 +1,229 @@
-import pandas as pd
 import logging
 import re
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+from catalog_store import restrictions_store
+
+# Mapeo de síntomas a problemas de salud
+SYMPTOM_TO_CONDITION = {
+    'dolor': ['gastritis', 'colitis', 'artritis'],
+    'nauseas': ['gastritis', 'higado graso'],
+    'estres': ['hipertension arterial', 'ansiedad'],
+    'insomnio': ['ansiedad', 'estres'],
+    'diabetes': ['diabetes'],
+    'hipertension': ['hipertension arterial'],
+    'dolor_articular': ['artritis', 'osteoporosis'],
+    'digestivo': ['gastritis', 'colitis'],
+    'fatiga': ['anemia', 'diabetes', 'tiroides'],
+    'sobrepeso': ['diabetes', 'higado graso'],
+    'colesterol': ['higado graso', 'hipertension arterial']
+}
+
+# Condiciones que se agregan según el perfil del usuario
+PROFILE_CONDITIONS = [('diabetes', 'diabetes'), ('hypertension', 'hipertension arterial')]
+
+# Campos de cada restricción: (clave, columna del libro)
+RESTRICTION_FIELDS = (
+    ('avoid_foods', 'Alimentos NO recomendados'),
+    ('recommended_foods', 'Alimentos SÍ recomendados'),
+    ('clinical_justification', 'Justificación clínica'),
+    ('mexican_examples_avoid', 'Ejemplos mexicanos NO recomendados'),
+    ('warnings', 'Observaciones/Advertencias'),
+    ('medication_interactions', 'Restricciones por medicamentos'),
+)
+
+
+class RestrictionIndex:
+    """
+    Libro de restricciones compilado para buscar por condición.
+    Cada fila queda como un diccionario inmutable y cada palabra apunta a la
+    primera fila cuyo Problema/Síntoma la contiene; la restricción de una
+    condición es la primera fila que contiene alguna de sus palabras (la
+    misma que encontraba el recorrido fila por fila).
+    """
+
+    def __init__(self, restrictions_df):
+        self.problems = tuple(str(value).lower() for value in restrictions_df['Problema/Síntoma'].tolist())
+        columns = {
+            key: [str(value) for value in restrictions_df[column].tolist()] if column in restrictions_df.columns
+            else [''] * len(self.problems)
+            for key, column in RESTRICTION_FIELDS
+        }
+        self.restrictions = tuple(
+            MappingProxyType({key: columns[key][row] for key, _ in RESTRICTION_FIELDS})
+            for row in range(len(self.problems))
+        )
+        self._first_row = {}
+        self._by_condition = {}
+
+        # Las condiciones conocidas se resuelven al compilar
+        known_conditions = {condition for conditions in SYMPTOM_TO_CONDITION.values() for condition in conditions}
+        known_conditions.update(condition for _, condition in PROFILE_CONDITIONS)
+        for condition in known_conditions:
+            self.find(condition)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.filled_df)
+
+    def first_row(self, word):
+        """Primera fila cuyo Problema/Síntoma contiene la palabra, o None"""
+        if word not in self._first_row:
+            self._first_row[word] = next(
+                (row for row, problem in enumerate(self.problems) if word in problem), None
+            )
+        return self._first_row[word]
+
+    def find(self, condition):
+        """Restricción (inmutable) de una condición, o None"""
+        condition_lower = condition.lower()
+        if condition_lower not in self._by_condition:
+            # Si la condición completa aparece, también aparece cada una de sus palabras
+            rows = [self.first_row(keyword) for keyword in condition_lower.split()]
+            rows = [row for row in rows if row is not None]
+            if not condition_lower.split() and self.problems:
+                rows = [0]  # La cadena vacía está contenida en cualquier texto
+            self._by_condition[condition_lower] = self.restrictions[min(rows)] if rows else None
+        return self._by_condition[condition_lower]
+
+
+def render_advice_for_display(dietary_advice):
+    """Consejos alimentarios en el formato de la receta"""
+    if not dietary_advice or not dietary_advice['restrictions']:
+        return ""
+    
+    formatted_advice = []
+    
+    for restriction in dietary_advice['restrictions']:
+        advice_section = f"\n🍽️ **RECOMENDACIONES ALIMENTARIAS para {restriction['condition']}:**\n"
+        
+        # Alimentos a evitar
+        if restriction['avoid_foods']:
+            advice_section += f"\n❌ **EVITAR:**\n{restriction['avoid_foods']}\n"
+        
+        # Alimentos recomendados
+        if restriction['recommended_foods']:
+            advice_section += f"\n✅ **CONSUMIR:**\n{restriction['recommended_foods']}\n"
+        
+        # Ejemplos mexicanos a evitar
+        if restriction['mexican_examples_avoid']:
+            advice_section += f"\n🇲🇽 **Ejemplos mexicanos a evitar:**\n{restriction['mexican_examples_avoid']}\n"
+        
+        # Advertencias importantes
+        if restriction['warnings']:
+            advice_section += f"\n⚠️ **IMPORTANTE:**\n{restriction['warnings']}\n"
+        
+        # Interacciones con medicamentos
+        if restriction['medication_interactions']:
+            advice_section += f"\n💊 **Interacciones medicamentosas:**\n{restriction['medication_interactions']}\n"
+        
+        formatted_advice.append(advice_section)
+    
+    return "\n".join(formatted_advice)
+
+
+def render_advice_for_whatsapp(dietary_advice):
+    """Consejos alimentarios en texto plano para WhatsApp"""
+    if not dietary_advice or not dietary_advice['restrictions']:
+        return ""
+    
+    whatsapp_text = "\n🍽️ RECOMENDACIONES ALIMENTARIAS:\n\n"
+    
+    for restriction in dietary_advice['restrictions']:
+        whatsapp_text += f"📋 {restriction['condition']}:\n"
+        
+        if restriction['avoid_foods']:
+            whatsapp_text += f"❌ Evitar: {restriction['avoid_foods']}\n"
+        
+        if restriction['recommended_foods']:
+            whatsapp_text += f"✅ Consumir: {restriction['recommended_foods']}\n"
+        
+        if restriction['warnings']:
+            whatsapp_text += f"⚠️ Importante: {restriction['warnings']}\n"
+        
+        whatsapp_text += "\n"
+    
+    return whatsapp_text
+
+
+class DietaryAdvice:
+    """
+    Consejo alimentario de un conjunto de condiciones, con sus textos para
+    la página y WhatsApp ya formateados. Se comparte entre
+    peticiones: as_dict() entrega una copia.
+    """
+
+    __slots__ = ('restrictions', 'display', 'whatsapp')
+
+    def __init__(self, restrictions):
+        self.restrictions = tuple(MappingProxyType(restriction) for restriction in restrictions)
+        advice = self.as_dict()
+        self.display = render_advice_for_display(advice)
+        self.whatsapp = render_advice_for_whatsapp(advice)
+
+    def as_dict(self):
+        return {
+            'restrictions': [dict(restriction) for restriction in self.restrictions],
+            'recommendations': [],
+            'warnings': [],
+            'medication_interactions': []
+        }
+
+    def matches(self, dietary_advice):
+        """True si el diccionario tiene exactamente estas restricciones"""
+        restrictions = dietary_advice.get('restrictions') or []
+        return len(restrictions) == len(self.restrictions) and all(
+            restriction == dict(cached) for restriction, cached in zip(restrictions, self.restrictions)
+        )
+
+
+class DietaryAdviceCache:
+    """
+    Consejos ya calculados de una versión del libro de restricciones, por
+    condiciones relevantes en el orden en que se recorren (las condiciones
+    ya incluyen las del perfil: diabetes e hipertensión). Se crea una caché nueva con cada
+    versión del libro. LRU acotada.
+    """
+
+    MAX_ENTRIES = 256
+
+    def __init__(self, snapshot=None):
+        self._entries = OrderedDict()  # (condiciones, ...) → DietaryAdvice
+        self._by_conditions = {}       # (condiciones mostradas, ...) → DietaryAdvice
+        self._lock = threading.Lock()
+
+    def get(self, conditions, build):
+        key = tuple(conditions)
+        with self._lock:
+            advice = self._entries.get(key)
+            if advice is not None:
+                self._entries.move_to_end(key)
+                return advice
+        
+        advice = build()
+        with self._lock:
+            self._entries[key] = advice
+            self._by_conditions[self._conditions_key(advice.restrictions)] = advice
+            while len(self._entries) > self.MAX_ENTRIES:
+                _, evicted = self._entries.popitem(last=False)
+                self._by_conditions.pop(self._conditions_key(evicted.restrictions), None)
+        return advice
+
+    def find(self, dietary_advice):
+        """DietaryAdvice guardado con las mismas restricciones que el diccionario, o None"""
+        if not isinstance(dietary_advice, dict) or not dietary_advice.get('restrictions'):
+            return None
+        try:
+            advice = self._by_conditions.get(self._conditions_key(dietary_advice['restrictions']))
+        except (KeyError, TypeError):
+            return None
+        return advice if advice is not None and advice.matches(dietary_advice) else None
+
+    @staticmethod
+    def _conditions_key(restrictions):
+        return tuple(restriction['condition'] for restriction in restrictions)
+
 
 class DietaryRestrictionsService:
     """
@@ -14,13 +237,13 @@ class DietaryRestrictionsService:
         self.load_dietary_restrictions()
     
     def load_dietary_restrictions(self):
-        """Cargar archivo de restricciones alimentarias"""
+        """Cargar archivo de restricciones alimentarias desde la instantánea compartida"""
         try:
-            self.restrictions_df = pd.read_excel('Restricciones_Alimentarias_Completa_SaludArte.xlsx')
-            self.restrictions_df = self.restrictions_df.fillna('')
-            
-            # Limpiar nombres de columnas
-            self.restrictions_df.columns = self.restrictions_df.columns.str.strip()
+            snapshot = restrictions_store.get()
+            self.restrictions_df = snapshot.filled_df
+            # Compilar el índice por condición al iniciar y no en la primera petición
+            snapshot.derived('condition_index', RestrictionIndex.from_snapshot)
+            snapshot.derived('advice_cache', DietaryAdviceCache)
             
             self.logger.info(f"✓ Restricciones alimentarias cargadas: {len(self.restrictions_df)} condiciones")
             
@@ -28,139 +251,66 @@ class DietaryRestrictionsService:
             self.logger.error(f"Error cargando restricciones alimentarias: {e}")
             self.restrictions_df = None
     
+    @property
+    def restriction_index(self):
+        return restrictions_store.current().derived('condition_index', RestrictionIndex.from_snapshot)
+    
+    @property
+    def advice_cache(self):
+        return restrictions_store.current().derived('advice_cache', DietaryAdviceCache)
+    
     def get_dietary_recommendations(self, detected_symptoms, user_profile=None):
         """
         Obtener sugerencias alimentarias según síntomas detectados
         """
+        advice = self.get_dietary_advice(detected_symptoms, user_profile)
+        return advice.as_dict() if advice is not None else None
+    
+    def get_dietary_advice(self, detected_symptoms, user_profile=None):
+        """DietaryAdvice (compartido, con textos ya formateados) o None si no hay restricciones"""
         if self.restrictions_df is None:
             return None
         
-        dietary_advice = {
-            'restrictions': [],
-            'recommendations': [],
-            'warnings': [],
-            'medication_interactions': []
-        }
-        
-        # Mapeo de síntomas a problemas de salud
-        symptom_to_condition = {
-            'dolor': ['gastritis', 'colitis', 'artritis'],
-            'nauseas': ['gastritis', 'higado graso'],
-            'estres': ['hipertension arterial', 'ansiedad'],
-            'insomnio': ['ansiedad', 'estres'],
-            'diabetes': ['diabetes'],
-            'hipertension': ['hipertension arterial'],
-            'dolor_articular': ['artritis', 'osteoporosis'],
-            'digestivo': ['gastritis', 'colitis'],
-            'fatiga': ['anemia', 'diabetes', 'tiroides'],
-            'sobrepeso': ['diabetes', 'higado graso'],
-            'colesterol': ['higado graso', 'hipertension arterial']
-        }
-        
         # Buscar condiciones relacionadas con los síntomas
         relevant_conditions = set()
         for symptom in detected_symptoms:
-            if symptom in symptom_to_condition:
-                relevant_conditions.update(symptom_to_condition[symptom])
+            if symptom in SYMPTOM_TO_CONDITION:
+                relevant_conditions.update(SYMPTOM_TO_CONDITION[symptom])
         
         # Agregar condiciones del perfil del usuario
         if user_profile:
-            if user_profile.get('diabetes', False):
-                relevant_conditions.add('diabetes')
-            if user_profile.get('hypertension', False):
-                relevant_conditions.add('hipertension arterial')
+            for profile_key, condition in PROFILE_CONDITIONS:
+                if user_profile.get(profile_key, False):
+                    relevant_conditions.add(condition)
         
-        # Buscar restricciones para cada condición
+        advice = self.advice_cache.get(relevant_conditions, lambda: self._build_advice(relevant_conditions))
+        return advice if advice.restrictions else None
+    
+    def _build_advice(self, relevant_conditions):
+        # Buscar restricciones para cada condición, en el orden del set como
+        # siempre se mostraron (la clave de la caché conserva ese orden)
+        restriction_index = self.restriction_index
+        restrictions = []
         for condition in relevant_conditions:
-            restriction_info = self._find_restriction_by_condition(condition)
+            restriction_info = restriction_index.find(condition)
             if restriction_info:
-                dietary_advice['restrictions'].append({
+                restrictions.append({
                     'condition': condition.title(),
-                    'avoid_foods': restriction_info['avoid_foods'],
-                    'recommended_foods': restriction_info['recommended_foods'],
-                    'clinical_justification': restriction_info['clinical_justification'],
-                    'mexican_examples_avoid': restriction_info['mexican_examples_avoid'],
-                    'warnings': restriction_info['warnings'],
-                    'medication_interactions': restriction_info['medication_interactions']
+                    **restriction_info
                 })
-        
-        return dietary_advice if dietary_advice['restrictions'] else None
+        return DietaryAdvice(restrictions)
     
     def _find_restriction_by_condition(self, condition):
         """Buscar restricciones para una condición específica"""
-        condition_lower = condition.lower()
-        
-        for _, row in self.restrictions_df.iterrows():
-            problem_symptom = str(row['Problema/Síntoma']).lower()
-            
-            # Buscar coincidencias exactas o parciales
-            if (condition_lower in problem_symptom or 
-                any(keyword in problem_symptom for keyword in condition_lower.split())):
-                
-                return {
-                    'avoid_foods': str(row.get('Alimentos NO recomendados', '')),
-                    'recommended_foods': str(row.get('Alimentos SÍ recomendados', '')),
-                    'clinical_justification': str(row.get('Justificación clínica', '')),
-                    'mexican_examples_avoid': str(row.get('Ejemplos mexicanos NO recomendados', '')),
-                    'warnings': str(row.get('Observaciones/Advertencias', '')),
-                    'medication_interactions': str(row.get('Restricciones por medicamentos', ''))
-                }
-        
-        return None
+        restriction_info = self.restriction_index.find(condition)
+        return dict(restriction_info) if restriction_info is not None else None
     
     def format_dietary_advice_for_display(self, dietary_advice):
         """Formatear consejos alimentarios para mostrar en la receta"""
-        if not dietary_advice or not dietary_advice['restrictions']:
-            return ""
-        
-        formatted_advice = []
-        
-        for restriction in dietary_advice['restrictions']:
-            advice_section = f"\n🍽️ **RECOMENDACIONES ALIMENTARIAS para {restriction['condition']}:**\n"
-            
-            # Alimentos a evitar
-            if restriction['avoid_foods']:
-                advice_section += f"\n❌ **EVITAR:**\n{restriction['avoid_foods']}\n"
-            
-            # Alimentos recomendados
-            if restriction['recommended_foods']:
-                advice_section += f"\n✅ **CONSUMIR:**\n{restriction['recommended_foods']}\n"
-            
-            # Ejemplos mexicanos a evitar
-            if restriction['mexican_examples_avoid']:
-                advice_section += f"\n🇲🇽 **Ejemplos mexicanos a evitar:**\n{restriction['mexican_examples_avoid']}\n"
-            
-            # Advertencias importantes
-            if restriction['warnings']:
-                advice_section += f"\n⚠️ **IMPORTANTE:**\n{restriction['warnings']}\n"
-            
-            # Interacciones con medicamentos
-            if restriction['medication_interactions']:
-                advice_section += f"\n💊 **Interacciones medicamentosas:**\n{restriction['medication_interactions']}\n"
-            
-            formatted_advice.append(advice_section)
-        
-        return "\n".join(formatted_advice)
+        advice = self.advice_cache.find(dietary_advice)
+        return advice.display if advice is not None else render_advice_for_display(dietary_advice)
     
     def format_dietary_advice_for_whatsapp(self, dietary_advice):
         """Formatear consejos alimentarios para WhatsApp"""
-        if not dietary_advice or not dietary_advice['restrictions']:
-            return ""
-        
-        whatsapp_text = "\n🍽️ RECOMENDACIONES ALIMENTARIAS:\n\n"
-        
-        for restriction in dietary_advice['restrictions']:
-            whatsapp_text += f"📋 {restriction['condition']}:\n"
-            
-            if restriction['avoid_foods']:
-                whatsapp_text += f"❌ Evitar: {restriction['avoid_foods']}\n"
-            
-            if restriction['recommended_foods']:
-                whatsapp_text += f"✅ Consumir: {restriction['recommended_foods']}\n"
-            
-            if restriction['warnings']:
-                whatsapp_text += f"⚠️ Importante: {restriction['warnings']}\n"
-            
-            whatsapp_text += "\n"
-        
-        return whatsapp_text
\ No newline at end of file
+        advice = self.advice_cache.find(dietary_advice)
+        return advice.whatsapp if advice is not None else render_advice_for_whatsapp(dietary_advice)
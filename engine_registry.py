@@ -0,0 +1,84 @@
+"""
+Registro de motores de SaludArte
+Cada motor se construye una sola vez por proceso y sólo cuando una ruta lo
+usa. Con gunicorn --preload el proceso maestro puede construirlos todos
+antes de crear los workers, que los comparten por copia en escritura.
+"""
+import gc
+import logging
+import threading
+
+
+class EngineRegistry:
+    """
+    Fábricas de motores con nombre.
+    get(name) construye el motor la primera vez y devuelve siempre la misma
+    instancia; proxy(name) entrega un objeto que lo construye al primer uso.
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._factories = {}
+        self._engines = {}
+        self._lock = threading.RLock()  # Una fábrica puede pedir otro motor
+
+    def register(self, name, factory):
+        """Registrar la fábrica (sin argumentos) de un motor"""
+        self._factories[name] = factory
+        return self.proxy(name)
+
+    def get(self, name):
+        """Instancia del motor (se construye bajo demanda la primera vez)"""
+        try:
+            return self._engines[name]
+        except KeyError:
+            pass
+
+        with self._lock:
+            if name not in self._engines:
+                self._engines[name] = self._factories[name]()
+                self.logger.info(f"✓ Motor construido: {name}")
+            return self._engines[name]
+
+    def proxy(self, name):
+        return LazyEngine(self, name)
+
+    def is_loaded(self, name):
+        return name in self._engines
+
+    def preload(self, names=None):
+        """
+        Construir los motores indicados (todos por defecto) antes de crear
+        los workers. gc.freeze() deja los objetos ya creados fuera de las
+        recolecciones siguientes, para que el recolector no toque sus
+        páginas de memoria y éstas sigan compartidas entre los workers.
+        """
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                self.logger.error(f"Error precargando motor {name}: {e}")
+
+        gc.collect()
+        gc.freeze()
+
+
+class LazyEngine:
+    """Representante de un motor del registro: delega todo atributo en él"""
+
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __repr__(self):
+        state = 'cargado' if self._registry.is_loaded(self._name) else 'pendiente'
+        return f'<LazyEngine {self._name} ({state})>'
+
+
+# Instancia global compartida por la aplicación
+engines = EngineRegistry()
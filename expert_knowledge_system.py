@@ -2,38 +2,103 @@
 Sistema de Conocimiento Experto para SaludArte
 Integra casos especializados aprendidos de expertos médicos
 """
+import logging
 import pandas as pd
-import os
+from types import MappingProxyType
+from catalog_store import catalog_store
+from product_store import ProductStore
+from safety_index import ProductSafetyIndex, profile_mask
+from keyword_automaton import KeywordAutomaton
+from fuzzy_index import NgramIndex
+from knowledge_base import knowledge_store
+from text_normalizer import normalize_text_extended, normalized_input
 
 class ExpertKnowledgeSystem:
     """Sistema que maneja casos complejos con conocimiento experto"""
     
+    # Campos del producto para mostrar: (clave, columna del catálogo, valor por defecto)
+    PRODUCT_FIELDS = (
+        ('nombre', 'nombre', ''),
+        ('presentacion', 'presentacion', 'CAPSULA'),
+        ('instrucciones', 'instrucciones', 'Según indicaciones del especialista'),
+        ('contradiccion', 'contradiccion', 'Consulte con su médico si está embarazada o lactando'),
+        ('beneficios', 'beneficios', 'Producto natural para el bienestar'),
+        ('ingredientes', 'ingredientes', 'Ingredientes naturales'),
+        ('dosis', 'dosis', 'Según indicaciones'),
+        ('modo_de_uso', 'modo_de_uso', 'Según indicaciones del fabricante'),
+    )
+    
+    # Información del catálogo que devuelve resolve_products
+    CATALOG_FIELDS = (
+        ('nombre', 'nombre', ''),
+        ('presentacion', 'presentacion', ''),
+        ('contradiccion', 'contradiccion', ''),
+        ('beneficios', 'beneficios', ''),
+        ('ingredientes', 'ingredientes', ''),
+        ('dosis', 'dosis', ''),
+        ('modo_de_uso', 'modo_de_uso', ''),
+        ('sintomas', 'sintomas', ''),
+    )
+    
     def __init__(self, catalog_df=None):
-        self.catalog_df = catalog_df if catalog_df is not None else self._load_catalog()
-        self.expert_cases = self._load_expert_knowledge()
+        self.logger = logging.getLogger(__name__)
+        uses_shared_catalog = catalog_df is None
+        if uses_shared_catalog:
+            catalog_df = self._load_catalog()
+        
+        # Casos y autómata precompilados (ver knowledge_base.py)
+        knowledge = knowledge_store.get()
+        self.expert_cases = knowledge['expert_cases']
+        self._case_names = knowledge['expert_case_names']
+        self._case_matcher = knowledge['expert_case_matcher']
+        self._bind_catalog(catalog_df, *self._catalog_tables(catalog_df))
+        
+        # Reconstruir las respuestas cuando se publique un catálogo nuevo
+        if uses_shared_catalog:
+            catalog_store.subscribe(self._on_catalog_published)
+    
+    def _bind_catalog(self, catalog_df, products, safety_index, catalog_version=None):
+        """
+        Indexar un catálogo y precompilar las respuestas de los casos con él.
+        catalog_version es la versión de la instantánea compartida (None para
+        un catalog_df propio).
+        """
+        self.catalog_df = catalog_df
+        self.products = products
+        self._build_catalog_name_index()
+        self._resolved_products = {}
+        self._preresolve_expert_products()
+        # Último paso: las peticiones en curso siguen usando la tabla anterior
+        self._build_expert_answers(safety_index, catalog_version)
+    
+    def _on_catalog_published(self, snapshot):
+        # Corre en el hilo de publicación en segundo plano: al log, no a stdout
+        self.logger.info(f"Catálogo actualizado a la versión {snapshot.version}: {snapshot.path}")
+        self._bind_catalog(snapshot.df, snapshot.derived('products', ProductStore.from_snapshot),
+                           snapshot.derived('safety_index', ProductSafetyIndex.from_snapshot), snapshot.version)
     
     def _load_catalog(self):
-        """Cargar catálogo real de productos"""
+        """Cargar catálogo real de productos desde la instantánea compartida"""
         try:
-            # Intentar cargar el catálogo principal
-            catalog_files = [
-                'PLANTILLA CATALOGO CON INGREDIENTES.xlsx',
-                'uploads/PLANTILLA CATALOGO CON INGREDIENTES.xlsx',
-                'sample_catalog.xlsx'
-            ]
-            
-            for file_path in catalog_files:
-                if os.path.exists(file_path):
-                    df = pd.read_excel(file_path)
-                    print(f"✓ Catálogo cargado desde: {file_path}")
-                    return df
-            
-            print("⚠ No se encontró catálogo, usando DataFrame vacío")
-            return pd.DataFrame()
+            snapshot = catalog_store.get()
+            print(f"✓ Catálogo cargado desde: {snapshot.path}")
+            return snapshot.df
         except Exception as e:
             print(f"Error cargando catálogo: {e}")
             return pd.DataFrame()
     
+    def _catalog_tables(self, catalog_df):
+        """
+        (registros, índice de seguridad, versión) del catálogo: los de la
+        instantánea compartida si catalog_df es su tabla
+        """
+        snapshot = catalog_store.current()
+        if snapshot is not None and catalog_df is snapshot.df:
+            return (snapshot.derived('products', ProductStore.from_snapshot),
+                    snapshot.derived('safety_index', ProductSafetyIndex.from_snapshot), snapshot.version)
+        products = ProductStore(catalog_df)
+        return products, ProductSafetyIndex(products), None
+    
     def _load_expert_knowledge(self):
         """Cargar conocimiento experto de casos especializados"""
         return {
@@ -4336,31 +4401,75 @@ class ExpertKnowledgeSystem:
     
     def _normalize_text(self, text):
         """Normalizar texto eliminando acentos y caracteres especiales"""
-        # Mapeo de caracteres con acento a sin acento
-        accent_map = {
-            'á': 'a', 'à': 'a', 'ä': 'a', 'â': 'a',
-            'é': 'e', 'è': 'e', 'ë': 'e', 'ê': 'e',
-            'í': 'i', 'ì': 'i', 'ï': 'i', 'î': 'i',
-            'ó': 'o', 'ò': 'o', 'ö': 'o', 'ô': 'o',
-            'ú': 'u', 'ù': 'u', 'ü': 'u', 'û': 'u',
-            'ñ': 'n', 'ç': 'c'
-        }
+        return normalize_text_extended(text)
+    
+    def _build_case_matcher(self):
+        """Compilar las palabras clave de todos los casos en un solo autómata"""
+        # El valor de cada frase es la posición de su caso: el menor valor
+        # presente en el texto es el primer caso que la búsqueda lineal encontraría
+        self._case_names = list(self.expert_cases.keys())
+        self._case_matcher = KeywordAutomaton(
+            (self._normalize_text(keyword), index)
+            for index, case_data in enumerate(self.expert_cases.values())
+            for keyword in case_data['keywords']
+        )
+    
+    def _build_catalog_name_index(self):
+        """Indexar los nombres válidos del catálogo para las búsquedas por palabras clave"""
+        self._catalog_name_rows = []
+        names = []
+        for record in self.products:
+            catalog_product_original = record.get('nombre')
+            if catalog_product_original is None or str(catalog_product_original) == 'nan':
+                continue
+            if str(catalog_product_original).strip() == '':
+                continue
+            self._catalog_name_rows.append(record.product_id)
+            names.append(self._clean_product_name(catalog_product_original))
         
-        text = text.lower()
-        for accented, normal in accent_map.items():
-            text = text.replace(accented, normal)
+        # Coincidencia exacta y parcial (nombre buscado dentro del nombre del catálogo)
+        self._catalog_names = NgramIndex(names)
+        # Coincidencia inversa (nombre del catálogo dentro del nombre buscado): el valor
+        # es la posición, así el menor valor presente es la primera fila del catálogo
+        self._catalog_name_matcher = KeywordAutomaton((name, position) for position, name in enumerate(names))
         
-        return text
+        # Búsqueda flexible: mismas palabras en cualquier orden, sin el tamaño (C/60)
+        self._catalog_name_words = {}
+        for position, name in enumerate(names):
+            self._catalog_name_words.setdefault(self._name_words(name), position)
+    
+    @staticmethod
+    def _clean_product_name(product_name):
+        """Nombre en minúsculas con los espacios normalizados"""
+        return ' '.join(str(product_name).lower().split())
+    
+    @staticmethod
+    def _name_words(product_name_clean):
+        """Palabras que identifican el producto: línea, ingrediente, forma y marca (sin el tamaño)"""
+        return frozenset(word for word in product_name_clean.split() if '/' not in word)
+    
+    def _preresolve_expert_products(self):
+        """Resolver una sola vez todos los productos de los casos expertos"""
+        product_names = list(dict.fromkeys(
+            product_name for case_data in self.expert_cases.values() for product_name in case_data['productos']
+        ))
+        unresolved = [name for name in product_names if self._resolve_record(name) is None]
+        
+        self.logger.info(f"Productos de casos expertos resueltos: "
+                         f"{len(product_names) - len(unresolved)}/{len(product_names)} "
+                         f"(catálogo de {len(self._catalog_name_rows)} productos)")
+        if unresolved:
+            sample = ', '.join(unresolved[:5])
+            self.logger.warning(f"{len(unresolved)} productos de casos expertos no encontrados en catálogo (ej.: {sample})")
     
     def detect_expert_case(self, user_input):
         """Detectar si la entrada del usuario corresponde a un caso experto"""
-        user_input_normalized = self._normalize_text(user_input)
+        user_input_normalized = normalized_input(user_input).extended
         
-        for case_name, case_data in self.expert_cases.items():
-            for keyword in case_data['keywords']:
-                keyword_normalized = self._normalize_text(keyword)
-                if keyword_normalized in user_input_normalized:
-                    return case_name, case_data
+        case_index = self._case_matcher.min_value(user_input_normalized)
+        if case_index is not None:
+            case_name = self._case_names[case_index]
+            return case_name, self.expert_cases[case_name]
         
         return None, None
     
@@ -4376,143 +4485,118 @@ class ExpertKnowledgeSystem:
             }
         return None
     
+    def resolve_products(self, product_names):
+        """Información real del catálogo para varios productos (None si no se encuentra)"""
+        return [self._get_real_catalog_info(product_name) for product_name in product_names]
+    
     def _get_real_catalog_info(self, product_name):
         """Buscar información real del producto en el catálogo"""
-        if self.catalog_df is None:
-            print(f"⚠ Catálogo no disponible para buscar: {product_name}")
-            return None
+        record = self._resolve_record(product_name)
+        return self._extract_catalog_info(record) if record is not None else None
+    
+    def _resolve_record(self, product_name):
+        """Registro del catálogo de un producto de los casos expertos (None si no se encuentra)"""
+        try:
+            return self._resolved_products[product_name]
+        except KeyError:
+            pass
         
         # Normalizar nombre del producto para búsqueda
-        product_name_clean = str(product_name).strip().lower()
+        product_name_clean = self._clean_product_name(product_name)
         
-        # Buscar producto en el catálogo
-        for index, row in self.catalog_df.iterrows():
-            catalog_product_original = row.get('PRODUCTO', '')
-            try:
-                if catalog_product_original is None or str(catalog_product_original) == 'nan':
-                    continue
-                if str(catalog_product_original).strip() == '':
-                    continue
-            except:
-                continue
-                
-            catalog_product = str(catalog_product_original).strip().lower()
-            
-            # Estrategia 1: Coincidencia exacta
-            if catalog_product == product_name_clean:
-                print(f"✓ Coincidencia exacta: {catalog_product_original}")
-                return self._extract_catalog_info(row)
-            
-            # Estrategia 2: Coincidencia parcial mejorada
-            if catalog_product and product_name_clean in catalog_product:
-                print(f"✓ Coincidencia parcial: {catalog_product_original}")
-                return self._extract_catalog_info(row)
-            
-            # Estrategia 3: Coincidencia inversa mejorada
-            if product_name_clean and catalog_product in product_name_clean:
-                print(f"✓ Coincidencia inversa: {catalog_product_original}")
-                return self._extract_catalog_info(row)
+        # La primera fila con coincidencia exacta, parcial o inversa gana
+        # (el mismo orden en que se recorría el catálogo)
+        partial = self._catalog_names.containing(product_name_clean)
+        candidates = [partial[0]] if partial else []
+        if product_name_clean:
+            inverse = self._catalog_name_matcher.min_value(product_name_clean)
+            if inverse is not None:
+                candidates.append(inverse)
+        
+        if candidates:
+            position = min(candidates)
+            record = self.products[self._catalog_name_rows[position]]
+        else:
+            # Intentar con coincidencias más flexibles
+            record = self._fuzzy_search_catalog(product_name_clean)
         
-        print(f"⚠ No encontrado en catálogo: {product_name}")
-        # Intentar con coincidencias más flexibles
-        return self._fuzzy_search_catalog(product_name_clean)
+        self._resolved_products[product_name] = record
+        return record
     
     def _fuzzy_search_catalog(self, product_name_clean):
-        """Búsqueda más flexible por palabras clave"""
-        # Extraer palabras clave importantes del producto buscado
-        search_keywords = [word for word in product_name_clean.split() if len(word) > 2]
+        """
+        Búsqueda flexible: un producto con exactamente las mismas palabras
+        (otro orden o tamaño). Nunca se sustituye por otra fórmula, marca o
+        presentación; sin coincidencia el producto queda sin resolver.
+        """
+        position = self._catalog_name_words.get(self._name_words(product_name_clean))
+        if position is not None:
+            return self.products[self._catalog_name_rows[position]]
         
-        best_match = None
-        max_matches = 0
+        return None
+    
+    def _extract_catalog_info(self, record):
+        """Extraer información del catálogo de un registro"""
+        return {key: value.strip() for key, value in record.as_dict(self.CATALOG_FIELDS).items()}
+
+    def _format_expert_product(self, case_name, case_data, record):
+        """Producto de un caso experto listo para mostrar, con la información real del catálogo"""
+        product = record.as_dict(self.PRODUCT_FIELDS)
+        product['match_reason'] = case_data['razon']
+        product['expert_case'] = case_name
+        return product
+    
+    def _build_expert_answers(self, safety_index, catalog_version):
+        """Precompilar la respuesta final de cada caso experto para este catálogo"""
+        answers = {}
+        for case_name, case_data in self.expert_cases.items():
+            # Sólo productos que existen en el catálogo: nunca tarjetas genéricas
+            records = [self._resolve_record(product_name) for product_name in case_data['productos']]
+            products = tuple(
+                (record.product_id, MappingProxyType(self._format_expert_product(case_name, case_data, record)))
+                for record in dict.fromkeys(record for record in records if record is not None)
+            )
+            answers[case_name] = (products, case_name.replace('_', ' ').title(), case_data['razon'])
         
-        for index, row in self.catalog_df.iterrows():
-            catalog_product_original = row.get('PRODUCTO', '')
-            try:
-                if catalog_product_original is None or str(catalog_product_original) == 'nan':
-                    continue
-                if str(catalog_product_original).strip() == '':
-                    continue
-            except:
-                continue
-                
-            catalog_product = str(catalog_product_original).strip().lower()
-            
-            # Contar coincidencias de palabras clave
-            matches = sum(1 for search_keyword in search_keywords if search_keyword in catalog_product)
-            
-            if matches > max_matches and matches >= 2:  # Al menos 2 palabras coinciden
-                max_matches = matches
-                best_match = row
+        # Una sola asignación: versión, índice de seguridad y respuestas siempre coinciden
+        self._expert_answers = (catalog_version, safety_index, MappingProxyType(answers))
+    
+    def get_expert_answer(self, case_name, user_profile=None):
+        """
+        Respuesta precompilada de un caso experto, filtrada por el perfil del
+        usuario con el mismo índice de seguridad que CanaturaAI. None si el caso
+        no existe, si las respuestas aún no corresponden al catálogo de la
+        petición o si ningún producto es apto.
+        """
+        catalog_version, safety_index, answers = self._expert_answers
+        answer = answers.get(case_name)
+        if answer is None:
+            return None
+        if catalog_version is not None and catalog_version != catalog_store.current().version:
+            self.logger.info(f"Respuestas expertas de la versión {catalog_version} del catálogo; "
+                             f"se omite el caso {case_name}")
+            return None
         
-        if best_match is not None:
-            product_name = best_match.get('PRODUCTO', '')
-            print(f"✓ Coincidencia por palabras clave: {product_name}")
-            return self._extract_catalog_info(best_match)
+        products, condition, explanation = answer
+        allowed = safety_index.allowed(profile_mask(user_profile)) if user_profile else None
+        expert_products = [dict(product) for product_id, product in products
+                           if allowed is None or allowed[product_id]]
         
+        if expert_products:
+            return {
+                'products': expert_products,
+                'condition': condition,
+                'explanation': explanation,
+                'expert_mode': True
+            }
         return None
     
-    def _extract_catalog_info(self, row):
-        """Extraer información del catálogo de una fila"""
-        return {
-            'PRODUCTO': str(row.get('PRODUCTO', '')).strip(),
-            'PRESENTACION': str(row.get('PRESENTACION', '')).strip(),
-            'INSTRUCCIONES': str(row.get('INSTRUCCIONES', '')).strip(),
-            'CONTRADICCION': str(row.get('CONTRADICCION', '')).strip(),
-            'BENEFICIOS': str(row.get('BENEFICIOS', '')).strip(),
-            'INGREDIENTES': str(row.get('INGREDIENTES', '')).strip(),
-            'DOSIS': str(row.get('DOSIS', '')).strip(),
-            'MODO DE USO': str(row.get('MODO DE USO', '')).strip(),
-            'SINTOMAS': str(row.get('SINTOMAS', '')).strip()
-        }
-
     def get_expert_recommendation(self, user_input, user_profile=None):
         """Método principal para obtener recomendación experta basada en entrada del usuario"""
         case_name, case_data = self.detect_expert_case(user_input)
         
         if case_name and case_data:
-            # Formatear TODOS los productos configurados para la enfermedad
-            expert_products = []
-            for i, product_name in enumerate(case_data['productos']):  # TODOS los productos
-                # Obtener información real del catálogo
-                catalog_info = self._get_real_catalog_info(product_name)
-                
-                if catalog_info:
-                    # Usar información real del catálogo
-                    formatted_product = {
-                        'nombre': catalog_info.get('PRODUCTO', product_name),
-                        'presentacion': catalog_info.get('PRESENTACION', 'CAPSULA'),
-                        'instrucciones': catalog_info.get('INSTRUCCIONES', 'Según indicaciones del especialista'),
-                        'contradiccion': catalog_info.get('CONTRADICCION', 'Consulte con su médico si está embarazada o lactando'),
-                        'beneficios': catalog_info.get('BENEFICIOS', 'Producto natural para el bienestar'),
-                        'ingredientes': catalog_info.get('INGREDIENTES', 'Ingredientes naturales'),
-                        'dosis': catalog_info.get('DOSIS', 'Según indicaciones'),
-                        'modo_de_uso': catalog_info.get('MODO DE USO', 'Según indicaciones del fabricante'),
-                        'match_reason': case_data['razon'],
-                        'expert_case': case_name
-                    }
-                else:
-                    # Fallback si no se encuentra en el catálogo
-                    formatted_product = {
-                        'nombre': product_name,
-                        'presentacion': 'CAPSULA',
-                        'instrucciones': 'Según indicaciones del especialista',
-                        'contradiccion': 'Consulte con su médico si está embarazada o lactando',
-                        'beneficios': 'Producto natural especializado',
-                        'ingredientes': 'Ingredientes naturales especializados',
-                        'dosis': '1-2 cápsulas al día con los alimentos',
-                        'modo_de_uso': 'Tomar con abundante agua durante las comidas',
-                        'match_reason': case_data['razon'],
-                        'expert_case': case_name
-                    }
-                expert_products.append(formatted_product)
-            
-            if expert_products:
-                return {
-                    'products': expert_products,
-                    'condition': case_name.replace('_', ' ').title(),
-                    'explanation': case_data['razon'],
-                    'expert_mode': True
-                }
+            return self.get_expert_answer(case_name, user_profile)
         
         return None
     
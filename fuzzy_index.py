@@ -0,0 +1,130 @@
+"""
+Búsqueda aproximada para SaludArte
+Índice de n-gramas y comparador difuso sobre el vocabulario del catálogo:
+devuelven los candidatos parecidos a una palabra sin recorrer el catálogo
+"""
+from collections import defaultdict
+from difflib import SequenceMatcher
+import numpy as np
+
+NGRAM_SIZE = 3
+
+
+class NgramIndex:
+    """
+    Índice de n-gramas de caracteres (tamaños 1..NGRAM_SIZE) sobre una lista
+    de textos. Responde qué textos contienen una subcadena; los resultados son
+    posiciones en la lista original, en orden ascendente.
+    """
+
+    def __init__(self, texts):
+        self.texts = tuple(texts)
+        ngrams = defaultdict(set)
+        for position, text in enumerate(self.texts):
+            for size in range(1, NGRAM_SIZE + 1):
+                for start in range(len(text) - size + 1):
+                    ngrams[text[start:start + size]].add(position)
+
+        self._ngrams = {gram: tuple(sorted(positions)) for gram, positions in ngrams.items()}
+        self._nonempty = tuple(position for position, text in enumerate(self.texts) if text)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def nonempty(self):
+        """Posiciones de los textos no vacíos"""
+        return self._nonempty
+
+    def containing(self, text):
+        """Posiciones de los textos (no vacíos) que contienen la subcadena"""
+        if not text:
+            return self._nonempty
+        if len(text) <= NGRAM_SIZE:
+            return self._ngrams.get(text, ())
+
+        # Intersectar las listas de todos los trigramas y verificar la subcadena
+        grams = {text[start:start + NGRAM_SIZE] for start in range(len(text) - NGRAM_SIZE + 1)}
+        postings = []
+        for gram in grams:
+            positions = self._ngrams.get(gram)
+            if not positions:
+                return ()
+            postings.append(positions)
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for positions in postings[1:]:
+            candidates.intersection_update(positions)
+            if not candidates:
+                return ()
+
+        texts = self.texts
+        return tuple(position for position in sorted(candidates) if text in texts[position])
+
+    def count_containing(self, texts):
+        """{posición: cuántos de los textos contiene} para las posiciones con al menos uno"""
+        counts = defaultdict(int)
+        for text in texts:
+            for position in self.containing(text):
+                counts[position] += 1
+        return counts
+
+
+class FuzzyMatcher:
+    """
+    Palabras del vocabulario cuyo SequenceMatcher.ratio() supera un umbral.
+    ratio = 2·M / (|a| + |b|) y M nunca excede los caracteres que ambas
+    palabras tienen en común (contando repeticiones), que es la cota de
+    quick_ratio(). Esa cota se calcula para todo el vocabulario con una sola
+    operación de NumPy y la razón exacta sólo se evalúa sobre los candidatos.
+    """
+
+    MAX_CACHED_WORDS = 4096
+
+    def __init__(self, vocabulary, threshold=0.8):
+        self.threshold = threshold
+        self.words = tuple(sorted(set(vocabulary)))
+
+        # Conteo de caracteres por palabra (una columna por carácter del vocabulario)
+        self._alphabet = {char: column for column, char in
+                          enumerate(sorted({char for word in self.words for char in word}))}
+        self._char_counts = np.zeros((len(self.words), len(self._alphabet)), dtype=np.int32)
+        for row, word in enumerate(self.words):
+            for char in word:
+                self._char_counts[row, self._alphabet[char]] += 1
+        self._lengths = np.array([len(word) for word in self.words], dtype=np.int32)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.words)
+
+    def similar(self, word):
+        """Conjunto de palabras del vocabulario con ratio > umbral"""
+        similar = self._cache.get(word)
+        if similar is not None:
+            return similar
+
+        # Los caracteres ajenos al vocabulario nunca coinciden
+        query = np.zeros(len(self._alphabet), dtype=np.int32)
+        for char in word:
+            column = self._alphabet.get(char)
+            if column is not None:
+                query[column] += 1
+
+        threshold = self.threshold
+        common = np.minimum(self._char_counts, query).sum(axis=1)
+        candidates = np.flatnonzero(2 * common > threshold * (self._lengths + len(word)))
+
+        matcher = SequenceMatcher(None, word, '')
+        found = set()
+        for row in candidates:
+            candidate = self.words[row]
+            matcher.set_seq2(candidate)
+            if matcher.ratio() > threshold:
+                found.add(candidate)
+
+        similar = frozenset(found)
+        if len(self._cache) >= self.MAX_CACHED_WORDS:
+            self._cache.clear()
+        self._cache[word] = similar
+        return similar
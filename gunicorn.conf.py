@@ -0,0 +1,25 @@
+"""
+Configuración de gunicorn para SaludArte
+El maestro importa la aplicación y construye los motores antes de crear
+los workers, así el catálogo, sus índices y las tablas de conocimiento se
+comparten entre todos ellos en lugar de duplicarse en cada uno
+"""
+
+preload_app = True
+
+
+def when_ready(server):
+    from catalog_store import catalog_store, restrictions_store
+    from engine_registry import engines
+
+    catalog_store.get()
+    restrictions_store.get()
+    engines.preload()
+    server.log.info("Motores precargados en el proceso maestro")
+
+
+def post_fork(server, worker):
+    # Cada worker hereda el generador del maestro: desempates propios por worker
+    from rotation_state import reseed_rotation_random
+
+    reseed_rotation_random()
@@ -0,0 +1,127 @@
+"""
+Autómata de palabras clave (Aho–Corasick) para SaludArte
+Busca cientos de frases en el texto del usuario con una sola pasada
+"""
+from collections import deque
+
+
+class KeywordAutomaton:
+    """
+    Autómata Aho–Corasick sobre frases ya normalizadas.
+    Cada frase lleva un valor; el autómata se compila una vez y después
+    responde consultas sobre cualquier texto en tiempo lineal.
+    """
+
+    def __init__(self, patterns=None):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]      # (longitud, valor) de las frases que terminan en el nodo
+        self._link = [0]      # siguiente nodo con salidas en la cadena de fallos
+        self._best = [None]   # valor mínimo alcanzable desde el nodo (para prioridad)
+        self._built = True
+        self.pattern_count = 0
+
+        for pattern, value in (patterns or []):
+            self.add(pattern, value)
+        self.build()
+
+    def add(self, pattern, value):
+        """Agregar una frase con su valor asociado"""
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._link.append(0)
+                self._best.append(None)
+            node = next_node
+
+        self._out[node].append((len(pattern), value))
+        self.pattern_count += 1
+        self._built = False
+
+    def build(self):
+        """Calcular enlaces de fallo y salidas (se llama tras agregar frases)"""
+        goto, fail, out, link, best = self._goto, self._fail, self._out, self._link, self._best
+
+        best[0] = min((value for _, value in out[0]), default=None)
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            fallback = fail[node]
+            link[node] = fallback if out[fallback] else link[fallback]
+            best[node] = _min_value(
+                min((value for _, value in out[node]), default=None),
+                best[fallback]
+            )
+
+            for char, child in goto[node].items():
+                state = fallback
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                queue.append(child)
+
+        self._built = True
+        return self
+
+    def _step(self, node, char):
+        goto, fail = self._goto, self._fail
+        while node and char not in goto[node]:
+            node = fail[node]
+        return goto[node].get(char, 0)
+
+    def iter_matches(self, text):
+        """Generar (inicio, fin, valor) para cada aparición de cada frase"""
+        if not self._built:
+            self.build()
+
+        out, link = self._out, self._link
+        for length, value in out[0]:
+            yield 0, 0, value
+
+        node = 0
+        for index, char in enumerate(text):
+            node = self._step(node, char)
+            state = node if out[node] else link[node]
+            while state:
+                for length, value in out[state]:
+                    yield index + 1 - length, index + 1, value
+                state = link[state]
+
+    def min_value(self, text):
+        """Menor valor entre todas las frases presentes en el texto (o None)"""
+        if not self._built:
+            self.build()
+
+        best_table = self._best
+        best = best_table[0]
+        node = 0
+        for char in text:
+            node = self._step(node, char)
+            best = _min_value(best, best_table[node])
+        return best
+
+    def values(self, text):
+        """Conjunto de valores de las frases presentes en el texto"""
+        return {value for _, _, value in self.iter_matches(text)}
+
+    def __len__(self):
+        return self.pattern_count
+
+
+def _min_value(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a if a <= b else b
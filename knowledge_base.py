@@ -0,0 +1,183 @@
+"""
+Base de conocimiento compilada de SaludArte
+Los casos expertos, mapeos de síntomas y tablas de resolución se escriben
+como diccionarios en el código de cada motor; este módulo los compila una
+vez (junto con sus autómatas y tablas de palabras clave) en un artefacto
+binario versionado que los motores cargan con una sola lectura.
+
+Compilar el artefacto (por ejemplo al construir la imagen):
+    python knowledge_base.py
+"""
+import os
+import hashlib
+import logging
+import pickle
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+
+KNOWLEDGE_FILE = 'knowledge_base.kb'
+
+# Cambiar al modificar la forma de las secciones compiladas
+KB_FORMAT = 1
+
+# Módulos cuyo contenido define la base de conocimiento
+SOURCE_MODULES = [
+    'knowledge_base.py',
+    'keyword_automaton.py',
+    'text_normalizer.py',
+    'expert_knowledge_system.py',
+    'canatura_ai.py',
+    'sistema_final_100_porciento.py',
+    'sistema_completo_alimentado.py',
+    'canatura_ai_ultra.py',
+]
+
+# Tablas de SaludArteFinal100Porciento que se buscan por palabras del nombre
+CONDITION_TABLES = [
+    'enfermedades_raras_completas',
+    'trastornos_neurologicos_especificos',
+    'gastroenterologia_ultra_compleja',
+    'trastornos_metabolicos_raros',
+]
+
+
+def source_digest():
+    """Huella del código fuente de la base de conocimiento"""
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256(str(KB_FORMAT).encode())
+    for module in SOURCE_MODULES:
+        with open(os.path.join(base_dir, module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _condition_keywords(table):
+    """[(condición, palabras de más de 3 letras del nombre), ...] en el orden de la tabla"""
+    return [
+        (condition, tuple(word for word in condition.split() if len(word) > 3))
+        for condition in table
+    ]
+
+
+def compile_sections():
+    """Ejecutar los constructores de cada motor y derivar sus tablas de búsqueda"""
+    from expert_knowledge_system import ExpertKnowledgeSystem
+    from canatura_ai import CanaturaAI
+    from sistema_final_100_porciento import SaludArteFinal100Porciento
+    from sistema_completo_alimentado import SaludArteCompleto
+    from canatura_ai_ultra import CanaturaAI_Ultra
+
+    # Casos expertos y su autómata de palabras clave
+    expert = ExpertKnowledgeSystem.__new__(ExpertKnowledgeSystem)
+    expert.expert_cases = expert._load_expert_knowledge()
+    expert._build_case_matcher()
+
+    # Tablas que _init_complete_resolution_system asigna como atributos
+    resolution = SimpleNamespace()
+    SaludArteFinal100Porciento._init_complete_resolution_system(resolution)
+    resolution = vars(resolution)
+
+    return {
+        'expert_cases': expert.expert_cases,
+        'expert_case_names': expert._case_names,
+        'expert_case_matcher': expert._case_matcher,
+        'symptom_mappings': CanaturaAI._build_symptom_mappings(None),
+        'resolution_tables': resolution,
+        'condition_keywords': {name: _condition_keywords(resolution[name]) for name in CONDITION_TABLES},
+        'complete_knowledge': SaludArteCompleto._cargar_conocimiento_completo(None),
+        'ultra': {
+            'drug_interactions': CanaturaAI_Ultra._build_drug_interactions(None),
+            'contraindications_advanced': CanaturaAI_Ultra._build_advanced_contraindications(None),
+            'health_syndromes': CanaturaAI_Ultra._build_health_syndromes(None),
+            'risk_factors': CanaturaAI_Ultra._build_risk_factors(None),
+            'personalization_rules': CanaturaAI_Ultra._build_personalization_rules(None),
+            'preventive_recommendations': CanaturaAI_Ultra._build_preventive_system(None),
+            'lifestyle_analysis': CanaturaAI_Ultra._build_lifestyle_analyzers(None),
+        },
+    }
+
+
+class KnowledgeStore:
+    """
+    Dueño único de la base de conocimiento dentro del proceso.
+    get() lee el artefacto la primera vez; si falta o fue compilado desde
+    otra versión del código, compila en memoria e intenta guardarlo.
+    Los motores comparten las mismas tablas: ninguno debe modificarlas.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._sections = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Secciones de la base de conocimiento (se cargan bajo demanda)"""
+        sections = self._sections
+        if sections is not None:
+            return sections
+
+        with self._lock:
+            if self._sections is None:
+                self._sections = self._load()
+            return self._sections
+
+    def reload(self):
+        """Volver a leer el artefacto; los motores nuevos usarán las tablas leídas"""
+        with self._lock:
+            self._sections = self._load()
+            return self._sections
+
+    def compile(self):
+        """Compilar desde el código y guardar el artefacto"""
+        sections = compile_sections()
+        self._save(sections, source_digest())
+        return sections
+
+    def _save(self, sections, digest):
+        artifact = {
+            'format': KB_FORMAT,
+            'source_digest': digest,
+            'compiled_at': datetime.now().isoformat(),
+            'sections': sections,
+        }
+
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+        self.logger.info(f"✓ Base de conocimiento compilada: {self.path}")
+
+    def _load(self):
+        digest = source_digest()
+        try:
+            with open(self.path, 'rb') as f:
+                artifact = pickle.load(f)
+            if artifact.get('format') == KB_FORMAT and artifact.get('source_digest') == digest:
+                self.logger.info(f"✓ Base de conocimiento cargada: {self.path} ({artifact['compiled_at']})")
+                return artifact['sections']
+            self.logger.warning(f"Base de conocimiento desactualizada, recompilando: {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning(f"Base de conocimiento inválida {self.path}: {e}")
+
+        sections = compile_sections()
+        try:
+            self._save(sections, digest)
+        except OSError as e:
+            # Sin permisos de escritura: usar la versión compilada en memoria
+            self.logger.warning(f"No se pudo guardar {self.path}: {e}")
+        return sections
+
+
+# Instancia global compartida por todos los motores
+knowledge_store = KnowledgeStore(KNOWLEDGE_FILE)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sections = knowledge_store.compile()
+    print(f"✓ {len(sections['expert_cases'])} casos expertos, "
+          f"{len(sections['symptom_mappings'])} mapeos de síntomas → {knowledge_store.path}")
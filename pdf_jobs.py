@@ -0,0 +1,289 @@
+"""
+Generación de PDFs en segundo plano para SaludArte
+El armado de ReportLab consume CPU, así que las recetas pueden generarse en
+un pequeño grupo de procesos en lugar del worker web que recibió la petición.
+Cada trabajo tiene un identificador que la página consulta.
+
+El estado de los trabajos y los PDFs terminados viven en disco, no en la
+memoria del worker que aceptó el trabajo: con varios workers de gunicorn la
+consulta puede llegar a cualquiera de ellos. En el directorio (PDF_JOBS_DIR,
+si no el de PDFCache, PDF_CACHE_DIR, o uno temporal) hay:
+
+    jobs/<id>.json          estado de cada trabajo
+    results/<sha256>.pdf    PDFs terminados, uno por SHA-256 de su contenido
+"""
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pdf_service import PDFService
+
+# Estados de un trabajo que todavía puede terminar
+PENDING_STATUSES = ('queued', 'running')
+
+_JOB_ID = re.compile(r'[0-9a-f]{32}')
+
+# PDFService de cada proceso del grupo, creado con su primer trabajo
+_worker_service = None
+
+
+def _render_in_worker(directory, job_id, user_profile, symptoms, recommendations):
+    """Generar el PDF de un trabajo y dejar el resultado y su estado en disco"""
+    global _worker_service
+    store = PDFJobStore(directory)
+    store.update(job_id, status='running')
+
+    if _worker_service is None:
+        _worker_service = PDFService()
+    try:
+        pdf = _worker_service.generate_prescription_pdf(user_profile, symptoms, recommendations)
+    except Exception as e:
+        store.update(job_id, status='error', error=str(e) or type(e).__name__)
+        raise
+
+    digest = store.put_result(pdf)
+    store.update(job_id, status='done', digest=digest)
+    return digest
+
+
+class PDFQueueFull(Exception):
+    """Se lanza cuando ya hay max_pending trabajos esperando un proceso"""
+
+
+class PDFJobStore:
+    """
+    Estado de los trabajos y PDFs terminados en un directorio compartido por
+    todos los workers. Cada archivo se escribe completo en un temporal y se
+    sustituye de forma atómica, así nadie lee un archivo a medias.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.jobs_dir = os.path.join(directory, 'jobs')
+        self.results_dir = os.path.join(directory, 'results')
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        os.makedirs(self.results_dir, exist_ok=True)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f'{job_id}.json')
+
+    def _result_path(self, digest):
+        return os.path.join(self.results_dir, f'{digest}.pdf')
+
+    @staticmethod
+    def _write(path, data):
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def create(self, job_id, download_name):
+        self._write(self._job_path(job_id), json.dumps({
+            'job_id': job_id, 'status': 'queued', 'download_name': download_name,
+            'created': time.time(), 'digest': None, 'error': None,
+        }).encode('utf-8'))
+
+    def load(self, job_id):
+        """Estado guardado de un trabajo, o None si no existe o el id no es válido"""
+        if not isinstance(job_id, str) or not _JOB_ID.fullmatch(job_id):
+            return None
+        try:
+            with open(self._job_path(job_id), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def update(self, job_id, **changes):
+        """Cambiar el estado de un trabajo; un estado final no se sobrescribe"""
+        job = self.load(job_id)
+        if job is None or job['status'] not in PENDING_STATUSES:
+            return
+        job.update(changes)
+        self._write(self._job_path(job_id), json.dumps(job).encode('utf-8'))
+
+    def put_result(self, pdf):
+        digest = hashlib.sha256(pdf).hexdigest()
+        path = self._result_path(digest)
+        if os.path.exists(path):
+            os.utime(path)  # Los más usados se eliminan al final
+        else:
+            self._write(path, pdf)
+        return digest
+
+    def get_result(self, digest):
+        try:
+            with open(self._result_path(digest), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def has_result(self, digest):
+        return os.path.exists(self._result_path(digest))
+
+    @staticmethod
+    def _files(directory, suffix):
+        """[(mtime, ruta), ...] de los archivos con ese sufijo, del más antiguo al más nuevo"""
+        files = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(suffix):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        return sorted(files)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def expire(self, job_ttl, max_results):
+        """Borrar los trabajos de más de job_ttl segundos y los PDFs más allá de max_results"""
+        limit = time.time() - job_ttl
+        for mtime, path in self._files(self.jobs_dir, '.json'):
+            if mtime >= limit:
+                break
+            self._remove(path)
+
+        results = self._files(self.results_dir, '.pdf')
+        for _, path in results[:max(len(results) - max_results, 0)]:
+            self._remove(path)
+
+    def counts(self):
+        return (len(self._files(self.jobs_dir, '.json')), len(self._files(self.results_dir, '.pdf')))
+
+
+def _default_directory():
+    return (os.environ.get('PDF_JOBS_DIR') or os.environ.get('PDF_CACHE_DIR')
+            or os.path.join(tempfile.gettempdir(), 'saludarte_pdf'))
+
+
+class PDFJobQueue:
+    """
+    Cola acotada de trabajos de PDF atendida por un grupo de procesos.
+    Cada worker web tiene su grupo y a lo sumo max_pending trabajos esperando
+    o en curso, así la impresión en lote no acumula trabajo sin límite. El
+    estado y los resultados se leen del directorio compartido desde cualquier
+    worker; los trabajos se borran a los job_ttl segundos y sólo se conservan
+    los max_results PDFs más recientes.
+    """
+
+    def __init__(self, max_workers=2, max_pending=16, job_ttl=600, max_results=64, directory=None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.job_ttl = job_ttl
+        self.max_results = max_results
+        self.logger = logging.getLogger(__name__)
+        self.store = PDFJobStore(directory or _default_directory())
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: el proceso web tiene hilos en segundo plano (recargas del
+            # catálogo, conexiones a Redis) que fork copiaría a medio estado
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def submit(self, user_profile, symptoms, recommendations, download_name='receta_saludarte.pdf'):
+        """Encolar una receta y devolver el identificador del trabajo"""
+        job_id = uuid.uuid4().hex
+        args = (self.store.directory, job_id, user_profile, symptoms, recommendations)
+        with self._lock:
+            self.store.expire(self.job_ttl, self.max_results)
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PDFQueueFull(f'{self._pending} PDFs ya pendientes')
+
+            # El estado existe antes de que cualquier worker pueda consultarlo
+            self.store.create(job_id, download_name)
+            try:
+                future = self._get_executor().submit(_render_in_worker, *args)
+            except BrokenProcessPool:
+                self.logger.warning("Grupo de procesos de PDF roto, se inicia uno nuevo")
+                self._executor = None
+                future = self._get_executor().submit(_render_in_worker, *args)
+            self._pending += 1
+
+        future.add_done_callback(lambda future: self._finish(job_id, future))
+        return job_id
+
+    def _finish(self, job_id, future):
+        try:
+            future.result()
+            error = None
+        except Exception as e:
+            self.logger.error(f"Error generando PDF en segundo plano: {str(e)}")
+            error = str(e) or type(e).__name__
+
+        # Si el proceso murió sin escribir su estado, dejarlo registrado aquí
+        if error is not None:
+            self.store.update(job_id, status='error', error=error)
+
+        with self._lock:
+            self._pending -= 1
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def status(self, job_id):
+        """Estado del trabajo ('queued', 'running', 'done', 'error' o 'expired'), o None si no existe"""
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+
+        status = job['status']
+        if status == 'done' and not self.store.has_result(job['digest']):
+            status = 'expired'
+        elif status in PENDING_STATUSES and time.time() - job['created'] > self.job_ttl:
+            status = 'expired'  # El worker que lo aceptó ya no existe
+        return {'job_id': job_id, 'status': status, 'error': job['error']}
+
+    def result(self, job_id):
+        """(bytes del PDF, nombre de descarga) de un trabajo terminado, o None"""
+        job = self.store.load(job_id)
+        if job is None or job['status'] != 'done':
+            return None
+        pdf = self.store.get_result(job['digest'])
+        return (pdf, job['download_name']) if pdf is not None else None
+
+    def stats(self):
+        jobs, results = self.store.counts()
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'jobs': jobs,
+                'results': results,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Instancia global usada por las rutas; el grupo de procesos arranca con el primer trabajo
+pdf_jobs = PDFJobQueue(max_workers=int(os.environ.get('PDF_WORKERS', 2)),
+                       max_pending=int(os.environ.get('PDF_MAX_PENDING', 16)))
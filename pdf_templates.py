@@ -0,0 +1,225 @@
+"""
+Shared building blocks for SaludArte prescription PDFs.
+Styles are built once per process and the parts of a prescription that do
+not depend on the patient (header, section titles, warnings, footer and the
+table of each catalog product) are kept as prebuilt flowables. Every
+document receives shallow copies, so concurrent builds never share the
+state reportlab sets while laying out and drawing a flowable.
+"""
+import copy
+import threading
+from collections import OrderedDict
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus.paragraph import _FUZZ
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
+from catalog_store import catalog_store
+
+WARNINGS = [
+    "⚠️ IMPORTANTE: Esta recomendación es generada por un asistente digital y no reemplaza la consulta médica profesional.",
+    "⚠️ Consulte con su médico antes de iniciar cualquier suplemento, especialmente si está tomando medicamentos.",
+    "⚠️ Suspenda el uso y consulte a un profesional si experimenta efectos adversos.",
+    "⚠️ Los suplementos naturales pueden interactuar con medicamentos convencionales."
+]
+
+# Product table rows: (label, product key)
+PRODUCT_ROWS = [
+    ("<b>Beneficios:</b>", 'beneficios'),
+    ("<b>Ingredientes principales:</b>", 'ingredientes'),
+    ("<b>Dosis recomendada:</b>", 'dosis'),
+    ("<b>Modo de uso:</b>", 'modo_de_uso'),
+    ("<b>Presentación:</b>", 'presentacion'),
+]
+NO_CONTRAINDICATIONS = 'Sin contraindicaciones conocidas'
+
+
+class StaticParagraph(Paragraph):
+    """
+    Paragraph whose text and style never change, reused across documents.
+    Line breaking is computed once per available width.
+    """
+
+    def __init__(self, text, style):
+        super().__init__(text, style)
+        self._layouts = {}
+
+    def wrap(self, availWidth, availHeight):
+        layout = self._layouts.get(availWidth)
+        if layout is None:
+            width, height = super().wrap(availWidth, availHeight)
+            if availWidth >= _FUZZ:
+                self._layouts[availWidth] = (self.blPara, self._wrapWidths, height)
+            return width, height
+
+        self.width = availWidth
+        self.blPara, self._wrapWidths, self.height = layout
+        return availWidth, self.height
+
+
+class PDFStyles:
+    """Paragraph and table styles of the prescription"""
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+        self.normal = styles['Normal']
+
+        self.title = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            textColor=colors.Color(0.2, 0.6, 0.3)  # Canatura green
+        )
+
+        self.header = ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Heading2'],
+            fontSize=16,
+            spaceAfter=12,
+            textColor=colors.Color(0.1, 0.4, 0.2)  # Dark green
+        )
+
+        self.explanation = ParagraphStyle(
+            'Explanation',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=colors.Color(0.1, 0.4, 0.2),
+            leftIndent=20,
+            spaceAfter=10
+        )
+
+        # Product box with proper text wrapping
+        self.cell = ParagraphStyle(
+            'CellText',
+            parent=styles['Normal'],
+            fontSize=9,
+            alignment=TA_LEFT,
+            wordWrap='LTR'
+        )
+
+        self.warning = ParagraphStyle(
+            'Warning',
+            parent=styles['Normal'],
+            fontSize=9,
+            textColor=colors.red,
+            alignment=TA_JUSTIFY
+        )
+
+        self.footer = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=8,
+            alignment=TA_CENTER,
+            textColor=colors.gray
+        )
+
+        self.patient_table = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ])
+
+        self.product_table = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.9, 0.95, 0.9)),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.Color(0.8, 0.8, 0.8)),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.Color(0.98, 0.98, 0.98)]),
+        ])
+
+
+class PDFTemplates:
+    """
+    Prebuilt fragments of the prescription. Product tables are memoized by
+    catalog version and product contents (session products carry no id), in
+    a bounded LRU.
+    """
+
+    MAX_PRODUCTS = 1024
+
+    def __init__(self):
+        self.styles = styles = PDFStyles()
+
+        self._header = (
+            StaticParagraph("SaludArte App", styles.title),
+            StaticParagraph("Asistente Digital de Salud Natural - Canatura", styles.normal),
+            Spacer(1, 20),
+        )
+        self._section_titles = {}
+
+        warnings = [Spacer(1, 20)]
+        for warning in WARNINGS:
+            warnings.append(StaticParagraph(warning, styles.warning))
+            warnings.append(Spacer(1, 5))
+        self._warnings = tuple(warnings)
+
+        self._footer = (
+            Spacer(1, 20),
+            StaticParagraph("SaludArte App - Canatura | Asistente Digital de Salud Natural", styles.footer),
+        )
+
+        self._labels = {label: StaticParagraph(label, styles.cell) for label, _ in PRODUCT_ROWS}
+        self._labels["<b>⚠️ Contraindicaciones:</b>"] = StaticParagraph("<b>⚠️ Contraindicaciones:</b>", styles.cell)
+        self._product_rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _copies(flowables):
+        return [copy.copy(flowable) for flowable in flowables]
+
+    def header(self):
+        return self._copies(self._header)
+
+    def section_title(self, title):
+        paragraph = self._section_titles.get(title)
+        if paragraph is None:
+            paragraph = self._section_titles[title] = StaticParagraph(title, self.styles.header)
+        return copy.copy(paragraph)
+
+    def warnings(self):
+        return self._copies(self._warnings)
+
+    def footer(self, generated_at):
+        return self._copies(self._footer) + [
+            Paragraph(f"Generado el {generated_at.strftime('%d/%m/%Y a las %H:%M')}", self.styles.footer)
+        ]
+
+    def product_table(self, number, product):
+        """Table of one recommended product; only the numbered title row is built here"""
+        rows = self._rows_for(product)
+        cells = [[Paragraph(f"<b>PRODUCTO {number}: {product['nombre']}</b>", self.styles.cell), ""]]
+        cells.extend([copy.copy(label), copy.copy(value)] for label, value in rows)
+
+        product_table = Table(cells, colWidths=[2*inch, 4*inch])
+        product_table.setStyle(self.styles.product_table)
+        return product_table
+
+    def _rows_for(self, product):
+        key = (catalog_store.version, product['contradiccion'],
+               *(product[product_key] for _, product_key in PRODUCT_ROWS))
+        with self._lock:
+            rows = self._product_rows.get(key)
+            if rows is not None:
+                self._product_rows.move_to_end(key)
+                return rows
+
+        cell = self.styles.cell
+        rows = [(self._labels[label], StaticParagraph(product[product_key], cell)) for label, product_key in PRODUCT_ROWS]
+        if product['contradiccion'] and product['contradiccion'] != NO_CONTRAINDICATIONS:
+            rows.append((self._labels["<b>⚠️ Contraindicaciones:</b>"], StaticParagraph(product['contradiccion'], cell)))
+        rows = tuple(rows)
+
+        with self._lock:
+            self._product_rows[key] = rows
+            while len(self._product_rows) > self.MAX_PRODUCTS:
+                self._product_rows.popitem(last=False)
+        return rows
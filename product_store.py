@@ -0,0 +1,93 @@
+"""
+Almacén columnar de productos de SaludArte
+Cada columna del catálogo se guarda una sola vez (valores y su texto ya
+convertido); los motores trabajan con identificadores enteros y registros
+ligeros en lugar de filas de pandas
+"""
+import sys
+
+
+class ProductRecord:
+    """
+    Vista de solo lectura de un producto dentro de un ProductStore.
+    Admite el acceso de una fila de pandas (get, [] e in) para que las
+    funciones de filtrado existentes la acepten sin cambios.
+    """
+
+    __slots__ = ('_store', 'product_id')
+
+    def __init__(self, store, product_id):
+        self._store = store
+        self.product_id = product_id
+
+    @property
+    def name(self):
+        """Igual que Series.name: la posición del producto en el catálogo"""
+        return self.product_id
+
+    def __contains__(self, column):
+        return column in self._store.values
+
+    def __getitem__(self, column):
+        return self._store.values[column][self.product_id]
+
+    def get(self, column, default=None):
+        values = self._store.values.get(column)
+        return values[self.product_id] if values is not None else default
+
+    def text(self, column, default=''):
+        """str() del valor de la columna (precalculado) o default si no existe"""
+        texts = self._store.texts.get(column)
+        return texts[self.product_id] if texts is not None else default
+
+    def as_dict(self, fields):
+        """Diccionario para mostrar a partir de [(clave, columna, valor por defecto), ...]"""
+        texts = self._store.texts
+        product_id = self.product_id
+        return {
+            key: texts[column][product_id] if column in texts else default
+            for key, column, default in fields
+        }
+
+    def __repr__(self):
+        return f"<ProductRecord {self.product_id} {self.text('nombre')!r}>"
+
+
+class ProductStore:
+    """
+    Catálogo en forma de columnas (struct-of-arrays), construido una vez por
+    versión. Los textos se internan: las cadenas repetidas entre productos
+    (presentaciones, modos de uso, contraindicaciones) ocupan una sola copia.
+    """
+
+    def __init__(self, catalog_df):
+        self.values = {}
+        self.texts = {}
+        for column in catalog_df.columns:
+            values = tuple(catalog_df[column].tolist())
+            self.values[column] = values
+            self.texts[column] = tuple(sys.intern(str(value)) for value in values)
+
+        self.records = tuple(ProductRecord(self, product_id) for product_id in range(len(catalog_df)))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """Productos del catálogo normalizado de una instantánea"""
+        return cls(snapshot.normalized_df)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, product_id):
+        return self.records[product_id]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def record(self, product):
+        """Registro de un producto dado como registro, fila de pandas o identificador"""
+        if isinstance(product, ProductRecord):
+            return product
+        if isinstance(product, int):
+            return self.records[product]
+        return self.records[product.name]
@@ -0,0 +1,81 @@
+"""
+Caché de recomendaciones de SaludArte
+Muchos usuarios escriben los mismos síntomas; los productos candidatos de un
+síntoma sólo dependen del texto normalizado, de la máscara de seguridad del
+perfil y de la versión del catálogo, así que se guardan con esa clave.
+Se guardan los candidatos ANTES de la rotación: cada respuesta servida desde
+la caché vuelve a pasar por _apply_product_rotation.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from catalog_store import catalog_store
+
+
+class RecommendationCache:
+    """
+    Caché LRU con caducidad por tiempo y contadores de aciertos y fallos.
+    Se vacía al publicarse una nueva versión del catálogo; además la versión
+    forma parte de la clave, así que nunca se mezclan catálogos.
+    """
+
+    def __init__(self, max_entries=2048, ttl=900):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Valor guardado para la clave, o None si no está o caducó"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Guardar un valor (inmutable: se comparte entre peticiones), desalojando las claves menos usadas"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def on_catalog_published(self, snapshot):
+        """Las recomendaciones de la versión anterior ya no sirven"""
+        self.clear()
+        self.logger.info(f"Caché de recomendaciones vaciada por {snapshot!r}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Instancia global compartida por todos los motores
+recommendation_cache = RecommendationCache()
+catalog_store.subscribe(recommendation_cache.on_catalog_published)
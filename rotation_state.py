@@ -0,0 +1,448 @@
+"""
+Estado de la rotación equitativa de productos de SaludArte
+_apply_product_rotation muestra primero los productos que menos veces se han
+mostrado. Con varios workers de gunicorn un diccionario por proceso da N
+rotaciones independientes, así que los contadores viven en un backend:
+
+    memory         diccionario del proceso (por defecto)
+    shared_memory  arreglo en multiprocessing.shared_memory indexado por el
+                   identificador del producto, compartido por los workers
+                   creados después de precargar la aplicación
+    redis          hash en un servidor que hable el protocolo de Redis
+
+Se elige con ROTATION_BACKEND (y REDIS_URL para redis). Cada
+ROTATION_DECAY_SECONDS los contadores se reducen a la mitad, para que el
+historial antiguo pese cada vez menos y el estado no crezca sin límite.
+
+select_rotated elige los productos a mostrar; los empates se deciden con un
+generador aleatorio: el de la petición si trae semilla (rotation_rng(seed)),
+si no el del proceso. Éste se vuelve a sembrar en cada worker después del
+fork (reseed_rotation_random), con ROTATION_SEED si está fijada o con el PID
+y entropía del sistema.
+"""
+import atexit
+import heapq
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+from multiprocessing import shared_memory
+from urllib.parse import urlparse
+import numpy as np
+from catalog_store import catalog_store
+
+DEFAULT_DECAY_SECONDS = 3600
+
+# Semilla del desempate aleatorio (None = distinta en cada proceso)
+ROTATION_SEED = os.environ.get('ROTATION_SEED')
+
+# Desempate de las peticiones sin semilla propia
+rotation_random = random.Random(ROTATION_SEED)
+
+
+def reseed_rotation_random():
+    """
+    Sembrar de nuevo el desempate del proceso. Los workers creados con fork
+    heredan el estado del maestro: sin esto todos repetirían la misma secuencia
+    """
+    if ROTATION_SEED is not None:
+        rotation_random.seed(ROTATION_SEED)
+    else:
+        rotation_random.seed((os.getpid() << 64) ^ int.from_bytes(os.urandom(8), 'big'))
+
+
+def rotation_rng(seed=None):
+    """Generador del desempate: uno nuevo para una semilla dada o el del proceso"""
+    return random.Random(seed) if seed is not None else rotation_random
+
+
+# Puntuación de los productos de bienestar general (respaldo): último nivel.
+# No es 0, que marca los productos excluidos por _adjust_score_for_insomnia
+WELLNESS_SCORE = -1
+
+
+def score_tier(match_score):
+    """
+    Nivel de prioridad de una puntuación (0 el más alto), o None si la
+    rotación no la considera. Las puntuaciones llegan como 20 o '20'.
+    """
+    score = int(match_score)
+    if score >= 8:
+        return 0  # Productos específicos (reglas por síntoma)
+    if score == 3:
+        return 1  # Coincidencia en síntomas
+    if score == 2:
+        return 2  # Coincidencia en beneficios
+    if score == 1:
+        return 3  # Coincidencia en ingredientes
+    if score == WELLNESS_SCORE:
+        return 4  # Bienestar general
+    return None
+
+
+def select_rotated(products, shown, max_products, rng):
+    """
+    Los max_products productos de mayor prioridad: primero por nivel de
+    puntuación, luego los menos mostrados y al final un desempate aleatorio.
+    Una sola pasada con un montículo acotado, sin ordenar toda la lista.
+    """
+    ranked = []
+    for position, product in enumerate(products):
+        tier = score_tier(product.get('match_score', 0))
+        if tier is not None:
+            ranked.append((tier, shown[product['product_name']], rng.random(), position, product))
+    return [entry[-1] for entry in heapq.nsmallest(max_products, ranked)]
+
+
+def _rotation_slots(snapshot):
+    """{nombre del producto: identificador} del primer producto con cada nombre"""
+    from product_store import ProductStore
+
+    slots = {}
+    for product_id, name in enumerate(snapshot.derived('products', ProductStore.from_snapshot).texts.get('nombre', ())):
+        slots.setdefault(name, product_id)
+    return slots
+
+
+class InProcessRotationCounter:
+    """Contadores en un diccionario del proceso"""
+
+    def __init__(self, decay_seconds=DEFAULT_DECAY_SECONDS):
+        self.decay_seconds = decay_seconds
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._next_decay = time.monotonic() + decay_seconds
+
+    def counts(self, names):
+        """{nombre: veces mostrado} de los productos pedidos"""
+        counts = self._counts
+        return {name: counts.get(name, 0) for name in names}
+
+    def increment(self, names):
+        self._maybe_decay()
+        with self._lock:
+            for name in names:
+                self._counts[name] = self._counts.get(name, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+    def _maybe_decay(self):
+        if time.monotonic() < self._next_decay:
+            return
+        with self._lock:
+            self._next_decay = time.monotonic() + self.decay_seconds
+            # Los productos que vuelven a cero dejan de ocupar memoria
+            self._counts = {name: count // 2 for name, count in self._counts.items() if count > 1}
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedMemoryRotationCounter:
+    """
+    Contadores en memoria compartida: una fila de enteros por worker y una
+    columna por identificador de producto. Cada fila tiene un solo proceso
+    dueño (su PID en una tabla compartida) y sólo él escribe en ella; al leer
+    se suman todas las filas. Un worker nuevo reutiliza sólo filas libres o
+    de procesos que ya terminaron. El arreglo debe crearse antes del fork
+    (preload_app de gunicorn).
+    """
+
+    def __init__(self, max_products=8192, max_workers=64, decay_seconds=DEFAULT_DECAY_SECONDS):
+        self.max_products = max_products
+        self.max_workers = max_workers
+        self.decay_seconds = decay_seconds
+        self.logger = logging.getLogger(__name__)
+
+        shape = (max_workers, max_products)
+        self._shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        self._table = np.ndarray(shape, dtype=np.int64, buffer=self._shm.buf)
+        self._table[:] = 0
+        self._owner_pid = os.getpid()
+        atexit.register(self._release)
+
+        # Asignación de filas: una sola vez por proceso, no en cada petición.
+        # _row_owners guarda el PID dueño de cada fila (0 = libre)
+        self._claim_lock = multiprocessing.Lock()
+        self._row_owners = multiprocessing.Array('q', max_workers, lock=False)
+        self._row = None
+        self._row_pid = None
+        self._local = None  # Respaldo del proceso si no quedan filas libres
+        self._write_lock = threading.Lock()  # Hilos del mismo worker
+        self._next_decay = time.monotonic() + decay_seconds
+
+        catalog_store.subscribe(self.on_catalog_published)
+
+    def _own_row(self):
+        """Fila de este proceso, o None si todas tienen un dueño vivo"""
+        pid = os.getpid()
+        if self._row_pid != pid:
+            self._write_lock = threading.Lock()
+            with self._claim_lock:
+                self._row = next((row for row, owner in enumerate(self._row_owners)
+                                  if owner in (0, pid) or not _process_alive(owner)), None)
+                if self._row is not None:
+                    # El dueño anterior terminó: nadie más escribe en la fila
+                    self._row_owners[self._row] = pid
+                    self._table[self._row] = 0
+            if self._row is None:
+                self.logger.warning(f"Sin filas libres de rotación ({self.max_workers}); "
+                                    f"el proceso {pid} cuenta sólo localmente")
+                self._local = InProcessRotationCounter(self.decay_seconds)
+            self._row_pid = pid
+            self._next_decay = time.monotonic() + self.decay_seconds
+        return self._row
+
+    def _slots(self, names):
+        """Columna de cada producto (None si el nombre no está en el catálogo vigente)"""
+        slots = catalog_store.current().derived('rotation_slots', _rotation_slots)
+        columns = []
+        for name in names:
+            product_id = slots.get(str(name))
+            columns.append(product_id % self.max_products if product_id is not None else None)
+        return columns
+
+    def counts(self, names):
+        columns = self._slots(names)
+        known = [column for column in columns if column is not None]
+        totals = iter(self._table[:, known].sum(axis=0).tolist()) if known else iter(())
+        counts = {name: next(totals) if column is not None else 0 for name, column in zip(names, columns)}
+
+        local = self._local if self._row_pid == os.getpid() else None
+        if local is not None:
+            for name, count in local.counts(names).items():
+                counts[name] += count
+        return counts
+
+    def increment(self, names):
+        row = self._own_row()
+        if row is None:
+            self._local.increment(names)
+            return
+
+        slots = self._slots(names)
+        with self._write_lock:
+            self._maybe_decay(row)
+            for slot in slots:
+                if slot is not None:
+                    self._table[row, slot] += 1
+
+    def reset(self):
+        row = self._own_row()
+        if row is None:
+            self._local.reset()
+            return
+        with self._write_lock:
+            self._table[row] = 0
+
+    def on_catalog_published(self, snapshot):
+        """Los identificadores cambian con cada versión del catálogo"""
+        if self._row_pid == os.getpid() and self._row is not None:
+            with self._write_lock:
+                self._table[self._row] = 0
+
+    def _maybe_decay(self, row):
+        if time.monotonic() >= self._next_decay:
+            self._next_decay = time.monotonic() + self.decay_seconds
+            self._table[row] //= 2
+
+    def _release(self):
+        # Liberar la fila para el siguiente worker
+        if self._row_pid == os.getpid() and self._row is not None:
+            self._row_owners[self._row] = 0
+        self._shm.close()
+        if os.getpid() == self._owner_pid:
+            self._shm.unlink()
+
+
+class RedisError(Exception):
+    """Respuesta de error del servidor"""
+
+
+class RedisConnection:
+    """Cliente mínimo del protocolo de Redis (RESP) sobre un socket TCP"""
+
+    def __init__(self, url, timeout=0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def execute(self, *commands):
+        """Enviar varios comandos en una sola escritura y devolver sus respuestas"""
+        with self._lock:
+            if self._sock is None or self._pid != os.getpid():
+                self._connect()
+            try:
+                self._sock.sendall(b''.join(self._encode(command) for command in commands))
+                replies = [self._read_reply() for _ in commands]
+            except OSError:
+                self.close()
+                raise
+
+        # Leer todas las respuestas antes de informar un error, para no desalinear el flujo
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile('rb')
+        self._pid = os.getpid()
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        for command in setup:
+            self._sock.sendall(self._encode(command))
+            reply = self._read_reply()
+            if isinstance(reply, RedisError):
+                self.close()
+                raise reply
+
+    @staticmethod
+    def _encode(command):
+        parts = [str(part).encode() for part in command]
+        return b''.join([f'*{len(parts)}\r\n'.encode()] +
+                        [b'$%d\r\n%s\r\n' % (len(part), part) for part in parts])
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Conexión cerrada por el servidor')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            return RedisError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)[:-2]
+            return data.decode()
+        if kind == b'*':
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise ConnectionError(f'Respuesta inválida: {line!r}')
+
+
+class RedisRotationCounter:
+    """
+    Contadores en un hash de Redis. HINCRBY es atómico en el servidor, así que
+    todos los workers (y todas las máquinas) comparten una sola rotación. El
+    decaimiento lo aplica el primer worker que obtiene la marca SET NX EX de
+    cada periodo. Si el servidor no responde se usan contadores locales.
+    """
+
+    RETRY_SECONDS = 30
+
+    def __init__(self, url, key='saludarte:rotation', decay_seconds=DEFAULT_DECAY_SECONDS):
+        self.key = key
+        self.decay_key = f'{key}:decay'
+        self.decay_seconds = decay_seconds
+        self.logger = logging.getLogger(__name__)
+        self.connection = RedisConnection(url)
+        self.fallback = InProcessRotationCounter(decay_seconds)
+        self._next_decay_check = 0.0
+        self._retry_at = 0.0
+
+    def counts(self, names):
+        if not names:
+            return {}
+        if time.monotonic() < self._retry_at:
+            return self.fallback.counts(names)
+        try:
+            values, = self.connection.execute(('HMGET', self.key, *names))
+        except (OSError, RedisError) as e:
+            self._unavailable(e)
+            return self.fallback.counts(names)
+        return {name: int(value) if value is not None else 0 for name, value in zip(names, values)}
+
+    def increment(self, names):
+        if not names:
+            return
+        if time.monotonic() < self._retry_at:
+            self.fallback.increment(names)
+            return
+        try:
+            self.connection.execute(*(('HINCRBY', self.key, name, 1) for name in names))
+            self._maybe_decay()
+        except (OSError, RedisError) as e:
+            self._unavailable(e)
+            self.fallback.increment(names)
+
+    def _unavailable(self, error):
+        # No reintentar la conexión en cada petición mientras el servidor no responde
+        self._retry_at = time.monotonic() + self.RETRY_SECONDS
+        self.logger.warning(f"Redis no disponible para la rotación, usando contadores locales: {error}")
+
+    def reset(self):
+        self.connection.execute(('DEL', self.key))
+
+    def _maybe_decay(self):
+        now = time.monotonic()
+        if now < self._next_decay_check:
+            return
+        self._next_decay_check = now + min(60, self.decay_seconds)
+
+        acquired, = self.connection.execute(('SET', self.decay_key, 1, 'NX', 'EX', self.decay_seconds))
+        if acquired != 'OK':
+            return
+
+        flat, = self.connection.execute(('HGETALL', self.key))
+        # Restar en lugar de sobrescribir: no se pierden los incrementos concurrentes
+        decrements = [('HINCRBY', self.key, name, -(int(count) - int(count) // 2))
+                      for name, count in zip(flat[::2], flat[1::2]) if int(count) > 0]
+        if decrements:
+            self.connection.execute(*decrements)
+
+
+def create_rotation_counter():
+    """Backend indicado por ROTATION_BACKEND"""
+    backend = os.environ.get('ROTATION_BACKEND', 'memory')
+    decay_seconds = int(os.environ.get('ROTATION_DECAY_SECONDS', DEFAULT_DECAY_SECONDS))
+
+    if backend == 'shared_memory':
+        return SharedMemoryRotationCounter(decay_seconds=decay_seconds)
+    if backend == 'redis':
+        return RedisRotationCounter(os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+                                    decay_seconds=decay_seconds)
+    if backend != 'memory':
+        logging.getLogger(__name__).warning(f"ROTATION_BACKEND desconocido '{backend}', usando memory")
+    return InProcessRotationCounter(decay_seconds)
+
+
+# Instancia global compartida por todos los motores
+rotation_counter = create_rotation_counter()
@@ -1,5 +1,6 @@
 from flask import render_template, request, redirect, url_for, session, flash, jsonify, send_file, abort
 from werkzeug.utils import secure_filename
+import io
 import os
 import logging
 import json
@@ -13,14 +14,32 @@ from dietary_restrictions_service import DietaryRestrictionsService
 from expert_knowledge_system import ExpertKnowledgeSystem
 from auth_service import auth_service
 from admin_service import admin_service
+from catalog_store import catalog_store, restrictions_store
+from recommendation_cache import recommendation_cache
+from pdf_jobs import pdf_jobs, PDFQueueFull
+from engine_registry import engines
+
+# Register services (each one is built on first use, or preloaded by gunicorn)
+ai_service = engines.register('ai_service', AIService)
+catalog_service = engines.register('catalog_service', CatalogService)
+pdf_service = engines.register('pdf_service', PDFService)
+canatura_ai = engines.register('canatura_ai', crear_sistema_completo)  # Sistema completo alimentado con 200+ casos
+dietary_service = engines.register('dietary_service', DietaryRestrictionsService)  # Servicio de restricciones alimentarias
+expert_system = engines.register('expert_system', ExpertKnowledgeSystem)  # Sistema de conocimiento experto
+
+@app.before_request
+def pin_catalog_version():
+    """Fijar la versión del catálogo y de las restricciones para toda la petición"""
+    try:
+        catalog_store.pin()
+        restrictions_store.pin()
+    except Exception as e:
+        logging.error(f"Error fijando versión del catálogo: {e}")
 
-# Initialize services
-ai_service = AIService()
-catalog_service = CatalogService()
-pdf_service = PDFService()
-canatura_ai = crear_sistema_completo()  # Sistema completo alimentado con 200+ casos
-dietary_service = DietaryRestrictionsService()  # Servicio de restricciones alimentarias
-expert_system = ExpertKnowledgeSystem()  # Sistema de conocimiento experto
+@app.teardown_request
+def unpin_catalog_version(exception=None):
+    catalog_store.unpin()
+    restrictions_store.unpin()
 
 @app.route('/')
 def index():
@@ -88,31 +107,14 @@ def recommendations():
         case_name, case_data = expert_system.detect_expert_case(symptoms_text)
         
         if case_name and case_data:
-            # Si el sistema experto detecta una enfermedad específica,
-            # usar productos directos del catálogo real
+            # Si el sistema experto detecta una enfermedad específica, usar la respuesta
+            # precompilada del caso: sólo productos del catálogo vigente aptos para el
+            # perfil; si no queda ninguno se usa el sistema completo
             try:
-                from expert_direct_products import get_expert_products_direct, get_expert_explanation
-                
-                # Obtener el DataFrame del catálogo completo directamente
-                import pandas as pd
-                try:
-                    catalog_df = pd.read_excel('PLANTILLA CATALOGO CON INGREDIENTES.xlsx')
-                    app.logger.info(f"Cargando catálogo completo con {len(catalog_df)} productos")
-                except Exception as e:
-                    app.logger.error(f"Error cargando catálogo: {e}")
-                    catalog_df = None
-                
-                expert_products = get_expert_products_direct(case_name, catalog_df)
-                explanation = get_expert_explanation(case_name)
+                expert_recommendation = expert_system.get_expert_answer(case_name, user_profile)
                 
-                if expert_products:
-                    expert_recommendation = {
-                        'products': expert_products,
-                        'condition': case_name.replace('_', ' ').title(),
-                        'explanation': explanation,
-                        'expert_mode': True
-                    }
-                    app.logger.info(f"Expert system found {len(expert_products)} products for {case_name}")
+                if expert_recommendation:
+                    app.logger.info(f"Expert system found {len(expert_recommendation['products'])} products for {case_name}")
                 else:
                     app.logger.warning(f"No products found for expert case: {case_name}")
                 
@@ -207,6 +209,22 @@ def recommendations():
         flash('Ocurrió un error al generar las recomendaciones. Por favor intenta nuevamente.', 'error')
         return redirect(url_for('symptoms'))
 
+def _wants_background_pdf():
+    """The page asked (async=1) to render the PDF in the worker pool and poll for it"""
+    return request.values.get('async') == '1'
+
+def _queue_pdf(user_profile, symptoms, recommendations, download_name):
+    """Enqueue a PDF job owned by this session and answer with its status URL"""
+    try:
+        job_id = pdf_jobs.submit(user_profile, symptoms, recommendations, download_name)
+    except PDFQueueFull as e:
+        logging.warning(f"PDF queue full: {str(e)}")
+        return jsonify({'error': 'Hay muchos PDFs en preparación. Intenta de nuevo en unos segundos.'}), 503
+    
+    # Only the session that created a job can poll or download it
+    session['pdf_jobs'] = (session.get('pdf_jobs', []) + [job_id])[-10:]
+    return jsonify({'job_id': job_id, 'status_url': url_for('pdf_job_status', job_id=job_id)}), 202
+
 @app.route('/download_pdf')
 def download_pdf():
     """Generate and download PDF prescription"""
@@ -215,20 +233,44 @@ def download_pdf():
         return redirect(url_for('index'))
     
     try:
+        if _wants_background_pdf():
+            return _queue_pdf(session['user_profile'], session['symptoms'], session['recommendations'],
+                              'receta_saludarte.pdf')
+        
         # Generate PDF
-        pdf_path = pdf_service.generate_prescription_pdf(
+        pdf = pdf_service.generate_prescription_pdf(
             session['user_profile'],
             session['symptoms'],
             session['recommendations']
         )
         
-        return send_file(pdf_path, as_attachment=True, download_name='receta_saludarte.pdf')
+        return send_file(io.BytesIO(pdf), as_attachment=True, download_name='receta_saludarte.pdf',
+                         mimetype='application/pdf')
     
     except Exception as e:
         logging.error(f"Error generating PDF: {str(e)}")
         flash('Error al generar el PDF. Por favor intenta nuevamente.', 'error')
         return redirect(url_for('recommendations'))
 
+@app.route('/pdf_jobs/<job_id>')
+def pdf_job_status(job_id):
+    """Status of a background PDF job, polled by the page"""
+    status = pdf_jobs.status(job_id) if job_id in session.get('pdf_jobs', []) else None
+    if status is None:
+        return jsonify({'job_id': job_id, 'status': 'unknown'}), 404
+    if status['status'] == 'done':
+        status['download_url'] = url_for('pdf_job_download', job_id=job_id)
+    return jsonify(status)
+
+@app.route('/pdf_jobs/<job_id>/download')
+def pdf_job_download(job_id):
+    """Download a PDF rendered in the background"""
+    result = pdf_jobs.result(job_id) if job_id in session.get('pdf_jobs', []) else None
+    if result is None:
+        abort(404)
+    pdf, download_name = result
+    return send_file(io.BytesIO(pdf), as_attachment=True, download_name=download_name, mimetype='application/pdf')
+
 
 
 @app.route('/reset')
@@ -285,18 +327,21 @@ def download_custom_pdf():
             }
             custom_recommendations.append(recommendation)
         
+        download_name = f"receta_personalizada_saludarte_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        if _wants_background_pdf():
+            return _queue_pdf(user_profile, symptoms_text, custom_recommendations, download_name)
+        
         # Generate custom PDF
-        pdf_service = PDFService()
-        pdf_path = pdf_service.generate_prescription_pdf(
+        pdf = pdf_service.generate_prescription_pdf(
             user_profile, 
             symptoms_text, 
             custom_recommendations
         )
         
         return send_file(
-            pdf_path,
+            io.BytesIO(pdf),
             as_attachment=True,
-            download_name=f"receta_personalizada_saludarte_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+            download_name=download_name,
             mimetype='application/pdf'
         )
         
@@ -455,6 +500,8 @@ def api_add_case_notes(case_id):
 def api_get_stats():
     """API: Obtener estadísticas del sistema"""
     stats = admin_service.get_system_statistics()
+    stats['recommendation_cache'] = recommendation_cache.stats()
+    stats['pdf_jobs'] = pdf_jobs.stats()
     return jsonify(stats)
 
 @app.route('/master/api/analytics')
@@ -491,21 +538,21 @@ def master_upload_catalog():
         os.makedirs('uploads', exist_ok=True)
         file.save(filepath)
         
-        # Validar estructura del catálogo
+        # Validar estructura del catálogo (el libro se lee una sola vez)
         try:
-            import pandas as pd
-            df = pd.read_excel(filepath)
+            candidate = catalog_store.load_candidate(filepath)
             
-            # Verificar columnas requeridas
-            required_columns = ['PRODUCTO', 'SINTOMAS', 'BENEFICIOS', 'PRESENTACION']
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            # Verificar columnas requeridas (en minúsculas, como la instantánea normalizada)
+            required_columns = ['nombre', 'sintomas', 'beneficios', 'presentacion']
+            candidate_columns = set(candidate.df.columns.str.strip().str.lower())
+            missing_columns = [col for col in required_columns if col not in candidate_columns]
             
             if missing_columns:
                 return jsonify({'error': f'Faltan columnas requeridas: {", ".join(missing_columns)}'}), 400
             
-            # Si la validación es exitosa, reemplazar el catálogo principal
-            import shutil
-            shutil.copy(filepath, 'PLANTILLA CATALOGO CON INGREDIENTES.xlsx')
+            # Si la validación es exitosa, reemplazar el catálogo principal y publicar
+            # la nueva versión en segundo plano (índices incluidos) sin reiniciar
+            catalog_store.publish_in_background(candidate, persist=True)
             
             auth_service.log_master_action('catalog_upload', f'Catálogo actualizado: {filename}')
             
@@ -0,0 +1,182 @@
+"""
+Índice de seguridad de productos de SaludArte
+Las restricciones de cada producto (contraindicaciones, sexo y edad) se
+calculan una vez por versión del catálogo como un entero de banderas; el
+perfil del usuario se compila a una máscara y un producto es apto cuando
+ambas no comparten ningún bit.
+"""
+from functools import lru_cache
+import numpy as np
+from product_store import ProductStore
+from text_normalizer import normalize_text
+
+# Restricciones del producto por nombre, sexo y relevancia
+WOMEN_ONLY = 1 << 0
+MEN_ONLY = 1 << 1
+KIDS_ONLY = 1 << 2
+ADULTS_ONLY = 1 << 3
+OFF_TOPIC_ANTIOXIDANT = 1 << 4  # Resveratrol sin relación antioxidante o cardiovascular
+
+# Palabras de contraindicación. Cada motor conserva su propia lista y su
+# propia forma de leer el texto: 'normalized' (minúsculas y sin acentos) o
+# 'lower' (sólo minúsculas)
+_FLAG_WORDS = []
+
+
+def _flag(form, words):
+    bit = 1 << (5 + len(_FLAG_WORDS))
+    _FLAG_WORDS.append((bit, form, tuple(words)))
+    return bit
+
+
+# CanaturaAI._is_safe_for_user
+DIABETES_WARNING = _flag('normalized', ['diabeticos', 'diabetico', 'diabetes', 'glucosa alta',
+                                        'azucar alta', 'hiperglucemia', 'insulina'])
+HYPERTENSION_WARNING = _flag('normalized', ['hipertenso', 'hipertension', 'presion alta'])
+PREGNANCY_WARNING = _flag('normalized', ['embarazada', 'embarazo', 'gestacion', 'lactancia'])
+
+# SmartSearchService.filter_by_profile: palabra del producto y de las condiciones
+SEARCH_CONDITION_WORDS = ['diabetes', 'hipertension', 'embarazo', 'lactancia']
+SEARCH_FLAGS = {word: _flag('normalized', [word]) for word in SEARCH_CONDITION_WORDS}
+
+# DatabaseService._filter_by_user_profile
+DATABASE_CONDITION_WORDS = ['diabetes', 'hipertension', 'embarazo']
+DATABASE_FLAGS = {word: _flag('lower', [word]) for word in DATABASE_CONDITION_WORDS}
+
+# AIService.analyze_contraindications: (condición del perfil, nombre devuelto, bit)
+AI_CONTRAINDICATIONS = [
+    ('diabetes', 'diabetes', _flag('lower', ['diabetes', 'diabético'])),
+    ('hypertension', 'hipertension', _flag('lower', ['hipertensión', 'presión alta'])),
+    ('pregnancy', 'embarazo', _flag('lower', ['embarazo', 'embarazada'])),
+]
+
+KIDS_ONLY_TERMS = ['mi peke', 'peke', 'niños', 'infantil', 'pediatrico']
+ADULTS_ONLY_TERMS = ['resveratrol', 'energy', 'vigor', 'libido', 'testosterone']
+WOMEN_VALUES = ['mujer', 'femenino', 'mujeres', 'female']
+MEN_VALUES = ['hombre', 'masculino', 'hombres', 'male']
+
+
+@lru_cache(maxsize=4096)
+def contraindication_flags(text):
+    """Bits de contraindicación presentes en un texto de contraindicaciones"""
+    forms = {'lower': text.lower(), 'normalized': normalize_text(text)}
+    flags = 0
+    for bit, form, words in _FLAG_WORDS:
+        if any(word in forms[form] for word in words):
+            flags |= bit
+    return flags
+
+
+def profile_mask(user_profile):
+    """Máscara de CanaturaAI: bits que hacen a un producto no apto para el perfil"""
+    mask = OFF_TOPIC_ANTIOXIDANT
+
+    # Perfiles incompletos (gender=None, edad vacía o no numérica) no deben fallar
+    user_gender = str(user_profile.get('gender') or '').lower().strip()
+    if user_gender not in ['femenino', 'mujer']:
+        mask |= WOMEN_ONLY
+    if user_gender not in ['masculino', 'hombre']:
+        mask |= MEN_ONLY
+
+    try:
+        user_age = int(user_profile.get('age', 18))
+    except (TypeError, ValueError):
+        user_age = 18
+    mask |= ADULTS_ONLY if user_age < 18 else KIDS_ONLY
+
+    if user_profile.get('diabetes', False):
+        mask |= DIABETES_WARNING
+    if user_profile.get('hypertension', False):
+        mask |= HYPERTENSION_WARNING
+    if user_profile.get('pregnancy', False):
+        mask |= PREGNANCY_WARNING
+    return mask
+
+
+def search_condition_mask(user_profile):
+    """Máscara de SmartSearch: palabras peligrosas presentes en las condiciones médicas"""
+    user_conditions = normalize_text(str(user_profile.get('condiciones_medicas', [])))
+    mask = 0
+    for word, bit in SEARCH_FLAGS.items():
+        if word in user_conditions:
+            mask |= bit
+    return mask
+
+
+def database_condition_mask(user_conditions):
+    """Máscara de DatabaseService a partir del texto de condiciones médicas"""
+    user_conditions = user_conditions.lower()
+    mask = 0
+    for word, bit in DATABASE_FLAGS.items():
+        if word in user_conditions:
+            mask |= bit
+    return mask
+
+
+def ai_contraindications(text, user_profile):
+    """Condiciones (en el orden de AIService) que el texto contraindica para el perfil"""
+    flags = contraindication_flags(text)
+    return [name for condition, name, bit in AI_CONTRAINDICATIONS
+            if user_profile.get(condition) and flags & bit]
+
+
+class ProductSafetyIndex:
+    """
+    Banderas de seguridad de todos los productos de una versión del catálogo.
+    allowed(mask) devuelve, con una sola operación sobre todo el catálogo,
+    qué productos son aptos para una máscara de perfil.
+    """
+
+    def __init__(self, products):
+        flags = []
+        restricted_sex = []
+        for record in products:
+            product_flags = 0
+
+            sex = record.get('sexo')
+            if sex:
+                product_gender = str(sex).lower().strip()
+                if product_gender in WOMEN_VALUES:
+                    product_flags |= WOMEN_ONLY
+                elif product_gender in MEN_VALUES:
+                    product_flags |= MEN_ONLY
+
+            product_name = str(record.get('nombre', '')).lower()
+            if any(term in product_name for term in KIDS_ONLY_TERMS):
+                product_flags |= KIDS_ONLY
+            if any(term in product_name for term in ADULTS_ONLY_TERMS):
+                product_flags |= ADULTS_ONLY
+            if 'resveratrol' in product_name:
+                symptoms_text = str(record.get('sintomas', '')).lower() + str(record.get('beneficios', '')).lower()
+                if 'antioxidante' not in symptoms_text and 'cardiovascular' not in symptoms_text:
+                    product_flags |= OFF_TOPIC_ANTIOXIDANT
+
+            contraindications = record.get('contradiccion')
+            if contraindications:
+                product_flags |= contraindication_flags(str(contraindications))
+
+            flags.append(product_flags)
+
+            # Sexo exigido por SmartSearch (None = para todos)
+            sex = sex.lower() if isinstance(sex, str) and sex else None
+            restricted_sex.append(None if sex in (None, 'ambos', 'todos') else sex)
+
+        self.flags = np.array(flags, dtype=np.int64)
+        self.restricted_sex = tuple(restricted_sex)
+        self._allowed = {}
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.derived('products', ProductStore.from_snapshot))
+
+    def allowed(self, mask):
+        """Arreglo booleano: True para los productos sin ningún bit de la máscara"""
+        allowed = self._allowed.get(mask)
+        if allowed is None:
+            allowed = (self.flags & mask) == 0
+            allowed.flags.writeable = False
+            self._allowed[mask] = allowed
+        return allowed
+
+    def is_allowed(self, product_id, mask):
+        return bool(self.allowed(mask)[product_id])
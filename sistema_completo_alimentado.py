@@ -4,6 +4,7 @@ Integra todo el conocimiento y capacidades desarrolladas
 """
 
 from sistema_final_100_porciento import SaludArteFinal100Porciento
+from knowledge_base import knowledge_store
 import json
 import os
 from datetime import datetime
@@ -15,7 +16,7 @@ class SaludArteCompleto(SaludArteFinal100Porciento):
     
     def __init__(self):
         super().__init__()
-        self.conocimiento_alimentado = self._cargar_conocimiento_completo()
+        self.conocimiento_alimentado = knowledge_store.get()['complete_knowledge']
         self.casos_resueltos_total = 0
         
     def _cargar_conocimiento_completo(self):
@@ -105,7 +106,7 @@ class SaludArteCompleto(SaludArteFinal100Porciento):
             }
         }
     
-    def find_products_for_symptoms_completo(self, user_input, user_profile=None):
+    def find_products_for_symptoms_completo(self, user_input, user_profile=None, seed=None):
         """
         Función principal mejorada que utiliza todo el conocimiento acumulado
         """
@@ -113,7 +114,7 @@ class SaludArteCompleto(SaludArteFinal100Porciento):
         self.casos_resueltos_total += 1
         
         # Primero intentar con el sistema base
-        resultado_base = super().find_products_for_symptoms(user_input, user_profile)
+        resultado_base = super().find_products_for_symptoms(user_input, user_profile, seed=seed)
         
         # Si el resultado base es exitoso, agregamos conocimiento adicional
         if isinstance(resultado_base, list) and len(resultado_base) > 0:
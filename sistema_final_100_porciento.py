@@ -4,6 +4,7 @@ Implementa soluciones específicas para TODOS los casos restantes
 """
 
 from canatura_ai import CanaturaAI
+from knowledge_base import knowledge_store
 import re
 import logging
 
@@ -15,7 +16,11 @@ class SaludArteFinal100Porciento(CanaturaAI):
     
     def __init__(self):
         super().__init__()
-        self._init_complete_resolution_system()
+        # Tablas de _init_complete_resolution_system ya compiladas (ver knowledge_base.py)
+        knowledge = knowledge_store.get()
+        for name, table in knowledge['resolution_tables'].items():
+            setattr(self, name, table)
+        self._condition_keywords = knowledge['condition_keywords']
     
     def _init_complete_resolution_system(self):
         """Inicializar sistema de resolución completa"""
@@ -253,7 +258,7 @@ class SaludArteFinal100Porciento(CanaturaAI):
             }
         }
     
-    def find_products_for_symptoms(self, user_symptoms, user_profile=None, min_per_symptom=2, max_per_symptom=2):
+    def find_products_for_symptoms(self, user_symptoms, user_profile=None, min_per_symptom=2, max_per_symptom=2, seed=None):
         """
         Función final que alcanza 100% de resolución
         """
@@ -299,7 +304,7 @@ class SaludArteFinal100Porciento(CanaturaAI):
         
         # NIVEL 9: Procesamiento del sistema base con síntomas expandidos
         try:
-            resultado = super().find_products_for_symptoms(sintomas_expandidos, user_profile, min_per_symptom, max_per_symptom)
+            resultado = super().find_products_for_symptoms(sintomas_expandidos, user_profile, min_per_symptom, max_per_symptom, seed)
             
             if not resultado or (isinstance(resultado, list) and len(resultado) == 0):
                 return self._resolucion_final_garantizada(user_symptoms)
@@ -314,10 +319,9 @@ class SaludArteFinal100Porciento(CanaturaAI):
         """Buscar enfermedades raras específicas"""
         user_lower = user_input.lower()
         
-        for enfermedad, info in self.enfermedades_raras_completas.items():
-            # Buscar tanto el nombre completo como palabras clave
-            palabras_clave = enfermedad.split()
-            if any(palabra in user_lower for palabra in palabras_clave if len(palabra) > 3):
+        for enfermedad, palabras_clave in self._condition_keywords['enfermedades_raras_completas']:
+            if any(palabra in user_lower for palabra in palabras_clave):
+                info = self.enfermedades_raras_completas[enfermedad]
                 return [{
                     'symptom': f'enfermedad_rara_especifica: {enfermedad}',
                     'products': [{'nombre': prod, 'beneficios': info['mensaje'], 'tipo': 'enfermedad_rara'} 
@@ -333,9 +337,9 @@ class SaludArteFinal100Porciento(CanaturaAI):
         """Buscar trastornos neurológicos específicos"""
         user_lower = user_input.lower()
         
-        for trastorno, info in self.trastornos_neurologicos_especificos.items():
-            palabras_clave = trastorno.split()
-            if any(palabra in user_lower for palabra in palabras_clave if len(palabra) > 3):
+        for trastorno, palabras_clave in self._condition_keywords['trastornos_neurologicos_especificos']:
+            if any(palabra in user_lower for palabra in palabras_clave):
+                info = self.trastornos_neurologicos_especificos[trastorno]
                 return [{
                     'symptom': f'trastorno_neurologico_especifico: {trastorno}',
                     'products': [{'nombre': prod, 'beneficios': info['mensaje'], 'tipo': 'neurologico_especifico'} 
@@ -351,9 +355,9 @@ class SaludArteFinal100Porciento(CanaturaAI):
         """Buscar condiciones gastroenterológicas ultra-complejas"""
         user_lower = user_input.lower()
         
-        for condicion, info in self.gastroenterologia_ultra_compleja.items():
-            palabras_clave = condicion.split()
-            if any(palabra in user_lower for palabra in palabras_clave if len(palabra) > 3):
+        for condicion, palabras_clave in self._condition_keywords['gastroenterologia_ultra_compleja']:
+            if any(palabra in user_lower for palabra in palabras_clave):
+                info = self.gastroenterologia_ultra_compleja[condicion]
                 return [{
                     'symptom': f'gastroenterologia_ultra_compleja: {condicion}',
                     'products': [{'nombre': prod, 'beneficios': info['mensaje'], 'tipo': 'gastro_complejo'} 
@@ -369,9 +373,9 @@ class SaludArteFinal100Porciento(CanaturaAI):
         """Buscar trastornos metabólicos raros"""
         user_lower = user_input.lower()
         
-        for trastorno, info in self.trastornos_metabolicos_raros.items():
-            palabras_clave = trastorno.split()
-            if any(palabra in user_lower for palabra in palabras_clave if len(palabra) > 3):
+        for trastorno, palabras_clave in self._condition_keywords['trastornos_metabolicos_raros']:
+            if any(palabra in user_lower for palabra in palabras_clave):
+                info = self.trastornos_metabolicos_raros[trastorno]
                 return [{
                     'symptom': f'trastorno_metabolico_raro: {trastorno}',
                     'products': [{'nombre': prod, 'beneficios': info['mensaje'], 'tipo': 'metabolico_raro'} 
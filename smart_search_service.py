@@ -1,58 +1,161 @@
-import pandas as pd
+import numpy as np
 import re
-from difflib import SequenceMatcher
+from collections import defaultdict
 import logging
+from catalog_store import catalog_store
+from catalog_index import CatalogTextIndex
+from fuzzy_index import FuzzyMatcher
+from text_normalizer import normalize_text
+from safety_index import ProductSafetyIndex, search_condition_mask
+from product_store import ProductStore
+
+
+class ProductScoringTables:
+    """
+    Per catalog version tables behind SmartSearchService.score_products.
+    Keyword counts are kept as sparse per-keyword columns and combined into
+    keyword x product matrices, so a whole query is scored in a few array ops.
+    """
+    
+    # (normalized column, match label, weight)
+    FIELD_WEIGHTS = [
+        ('sintomas_norm', 'Síntoma', 5),
+        ('beneficios_norm', 'Beneficio', 3),
+        ('ingredientes_norm', 'Ingrediente', 1)
+    ]
+    SIMILAR_WEIGHT = 2
+    SIMILARITY_THRESHOLD = 0.8
+    MAX_CACHED_KEYWORDS = 4096
+    
+    def __init__(self, catalog_df, text_index):
+        self.row_count = len(catalog_df)
+        self.text_index = text_index
+        self.fields = [field for field in self.FIELD_WEIGHTS if field[0] in catalog_df.columns]
+        self._texts = {column: tuple(catalog_df[column].tolist()) for column, _, _ in self.fields}
+        
+        # Words used by the fuzzy "Similar" bonus (repeats kept, they add score)
+        sintomas = catalog_df['sintomas'] if 'sintomas' in catalog_df.columns else [''] * self.row_count
+        beneficios = catalog_df['beneficios'] if 'beneficios' in catalog_df.columns else [''] * self.row_count
+        self.product_words = [
+            tuple(re.findall(r'\b\w{4,}\b', f"{sintoma} {beneficio}".lower()))
+            for sintoma, beneficio in zip(sintomas, beneficios)
+        ]
+        
+        self._rows_by_word = defaultdict(dict)
+        for row, words in enumerate(self.product_words):
+            for word in words:
+                self._rows_by_word[word][row] = self._rows_by_word[word].get(row, 0) + 1
+        
+        self.fuzzy_matcher = FuzzyMatcher(self._rows_by_word, self.SIMILARITY_THRESHOLD)
+        self._count_cache = {}
+    
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.normalized_df, snapshot.derived('text_index', CatalogTextIndex.from_snapshot))
+    
+    def keyword_counts(self, column, keyword):
+        """Sparse occurrence counts of keyword in a column: {row: count}"""
+        key = (column, keyword)
+        counts = self._count_cache.get(key)
+        if counts is None:
+            texts = self._texts[column]
+            field = column[:-len('_norm')]
+            counts = {}
+            for row in self.text_index.rows_containing(field, keyword):
+                counts[row] = texts[row].count(keyword)
+            self._remember(self._count_cache, key, counts)
+        return counts
+    
+    def similar_words(self, keyword):
+        """Catalog words whose SequenceMatcher ratio against keyword exceeds the threshold"""
+        return self.fuzzy_matcher.similar(keyword)
+    
+    def _remember(self, cache, key, value):
+        if len(cache) >= self.MAX_CACHED_KEYWORDS:
+            cache.clear()
+        cache[key] = value
+    
+    def score(self, keywords):
+        """
+        Score every product for the keywords.
+        Returns (scores, per-field keyword x product counts, keyword x product similar-word counts).
+        """
+        scores = np.zeros(self.row_count, dtype=np.int64)
+        field_counts = []
+        
+        for (column, _, weight) in self.fields:
+            counts = np.zeros((len(keywords), self.row_count), dtype=np.int64)
+            for position, keyword in enumerate(keywords):
+                for row, count in self.keyword_counts(column, keyword).items():
+                    counts[position, row] = count
+            scores += weight * counts.sum(axis=0)
+            field_counts.append(counts)
+        
+        similar_counts = None
+        if keywords:
+            similar_counts = np.zeros((len(keywords), self.row_count), dtype=np.int64)
+            for position, keyword in enumerate(keywords):
+                for word in self.similar_words(keyword):
+                    for row, count in self._rows_by_word[word].items():
+                        similar_counts[position, row] += count
+            scores += self.SIMILAR_WEIGHT * similar_counts.sum(axis=0)
+        
+        return scores, field_counts, similar_counts
+
+
+def _collect_wellness_ids(snapshot):
+    """Ids of general wellness products, in catalog order"""
+    products = snapshot.derived('products', ProductStore.from_snapshot)
+    return tuple(
+        record.product_id for record in products
+        if any(keyword in f"{record.text('beneficios')} {record.text('nombre')}".lower()
+               for keyword in SmartSearchService.WELLNESS_KEYWORDS)
+    )
+
 
 class SmartSearchService:
+    WELLNESS_KEYWORDS = ('energia', 'bienestar', 'salud', 'vitaminas', 'natural')
+    
     def __init__(self):
         self.logger = logging.getLogger(__name__)
-        self.catalog_df = None
+        self.catalog_loaded = False
         self.load_catalog()
     
     def load_catalog(self):
-        """Load the Canatura catalog"""
+        """Load the Canatura catalog from the shared snapshot"""
         try:
-            # Try to load the main catalog
-            catalog_file = "PLANTILLA CATALOGO CON INGREDIENTES.xlsx"
-            try:
-                self.catalog_df = pd.read_excel(catalog_file, engine='openpyxl')
-            except:
-                try:
-                    self.catalog_df = pd.read_excel(catalog_file, engine='xlrd')
-                except:
-                    # Use sample catalog as fallback
-                    self.catalog_df = pd.read_excel("sample_catalog.xlsx", engine='openpyxl')
-            
-            # Clean and normalize
-            self.catalog_df = self.catalog_df.fillna('')
-            self.catalog_df.columns = self.catalog_df.columns.str.strip().str.lower()
-            
-            # Normalize text columns for better searching
-            for col in ['sintomas', 'beneficios', 'ingredientes']:
-                if col in self.catalog_df.columns:
-                    self.catalog_df[f'{col}_norm'] = self.catalog_df[col].apply(self.normalize_text)
+            snapshot = catalog_store.get()
+            snapshot.derived('products', ProductStore.from_snapshot)
+            snapshot.derived('smart_search_scoring', ProductScoringTables.from_snapshot)
+            snapshot.derived('safety_index', ProductSafetyIndex.from_snapshot)
+            snapshot.derived('smart_search_wellness', _collect_wellness_ids)
+            self.catalog_loaded = True
             
-            self.logger.info(f"Loaded catalog with {len(self.catalog_df)} products")
+            self.logger.info(f"Loaded catalog with {len(snapshot.normalized_df)} products")
             
         except Exception as e:
             self.logger.error(f"Error loading catalog: {e}")
-            self.catalog_df = None
+            self.catalog_loaded = False
+    
+    # Catalog data always comes from the snapshot pinned for the current request
+    
+    @property
+    def catalog_snapshot(self):
+        return catalog_store.current() if self.catalog_loaded else None
+    
+    @property
+    def catalog_df(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.normalized_df if snapshot is not None else None
+    
+    @property
+    def products(self):
+        snapshot = self.catalog_snapshot
+        return snapshot.derived('products', ProductStore.from_snapshot) if snapshot is not None else None
     
     def normalize_text(self, text):
         """Normalize Spanish text for better matching"""
-        if not isinstance(text, str):
-            return ""
-        
-        text = text.lower()
-        
-        # Replace Spanish accents
-        accent_map = {
-            'á': 'a', 'é': 'e', 'í': 'i', 'ó': 'o', 'ú': 'u', 'ü': 'u', 'ñ': 'n'
-        }
-        for accented, normal in accent_map.items():
-            text = text.replace(accented, normal)
-        
-        return text
+        return normalize_text(text)
     
     def search_products_by_symptoms(self, user_symptoms, user_profile=None, min_products=5):
         """Main search function for finding products by symptoms"""
@@ -117,53 +220,34 @@ class SmartSearchService:
     
     def score_products(self, keywords):
         """Score products based on keyword matches"""
-        scored_products = []
+        snapshot = self.catalog_snapshot
+        tables = snapshot.derived('smart_search_scoring', ProductScoringTables.from_snapshot)
+        products = snapshot.derived('products', ProductStore.from_snapshot)
+        scores, field_counts, similar_counts = tables.score(keywords)
         
-        for idx, product in self.catalog_df.iterrows():
-            score = 0
+        scored_products = []
+        for row in np.flatnonzero(scores > 0):
             matches = []
             
-            # Search in symptoms (highest weight)
-            if 'sintomas_norm' in self.catalog_df.columns:
-                for keyword in keywords:
-                    count = product['sintomas_norm'].count(keyword)
-                    if count > 0:
-                        score += count * 5
-                        matches.append(f"Síntoma: {keyword}")
-            
-            # Search in benefits (medium weight)
-            if 'beneficios_norm' in self.catalog_df.columns:
-                for keyword in keywords:
-                    count = product['beneficios_norm'].count(keyword)
-                    if count > 0:
-                        score += count * 3
-                        matches.append(f"Beneficio: {keyword}")
-            
-            # Search in ingredients (lower weight)
-            if 'ingredientes_norm' in self.catalog_df.columns:
-                for keyword in keywords:
-                    count = product['ingredientes_norm'].count(keyword)
-                    if count > 0:
-                        score += count * 1
-                        matches.append(f"Ingrediente: {keyword}")
+            # Symptoms, benefits and ingredients, in keyword order
+            for (_, label, _), counts in zip(tables.fields, field_counts):
+                for position, keyword in enumerate(keywords):
+                    if counts[position, row] > 0:
+                        matches.append(f"{label}: {keyword}")
             
             # Fuzzy matching for similar terms
-            for keyword in keywords:
-                all_text = f"{product.get('sintomas', '')} {product.get('beneficios', '')}".lower()
-                words_in_product = re.findall(r'\b\w{4,}\b', all_text)
-                
-                for word in words_in_product:
-                    similarity = SequenceMatcher(None, keyword, word).ratio()
-                    if similarity > 0.8:
-                        score += 2
-                        matches.append(f"Similar: {word}")
+            if similar_counts is not None:
+                words_in_product = tables.product_words[row]
+                for position, keyword in enumerate(keywords):
+                    if similar_counts[position, row] > 0:
+                        similar = tables.similar_words(keyword)
+                        matches.extend(f"Similar: {word}" for word in words_in_product if word in similar)
             
-            if score > 0:
-                scored_products.append({
-                    'product_data': product,
-                    'score': score,
-                    'matches': matches
-                })
+            scored_products.append({
+                'product_data': products[row],
+                'score': int(scores[row]),
+                'matches': matches
+            })
         
         # Sort by score
         scored_products.sort(key=lambda x: x['score'], reverse=True)
@@ -171,25 +255,27 @@ class SmartSearchService:
     
     def filter_by_profile(self, scored_products, user_profile):
         """Filter products based on user profile constraints"""
-        filtered = []
+        if not scored_products:
+            return []
         
+        # Precomputed per-product flags (see safety_index.py); one vectorized
+        # check over the catalog for the dangerous words in the user's conditions
+        safety = self.catalog_snapshot.derived('safety_index', ProductSafetyIndex.from_snapshot)
+        allowed = safety.allowed(search_condition_mask(user_profile))
+        user_sex = user_profile.get('sexo', '').lower()
+        
+        filtered = []
         for item in scored_products:
-            product = item['product_data']
+            product_id = item['product_data'].product_id
             
             # Check gender restrictions
-            if 'sexo' in product and product['sexo']:
-                if product['sexo'].lower() not in ['ambos', 'todos'] and product['sexo'].lower() != user_profile.get('sexo', '').lower():
-                    continue
+            required_sex = safety.restricted_sex[product_id]
+            if required_sex is not None and required_sex != user_sex:
+                continue
             
             # Check contraindications
-            if 'contradiccion' in product and product['contradiccion']:
-                contraindications = self.normalize_text(product['contradiccion'])
-                user_conditions = self.normalize_text(str(user_profile.get('condiciones_medicas', [])))
-                
-                # Basic contraindication checking
-                danger_words = ['diabetes', 'hipertension', 'embarazo', 'lactancia']
-                if any(word in contraindications and word in user_conditions for word in danger_words):
-                    continue
+            if not allowed[product_id]:
+                continue
             
             filtered.append(item)
         
@@ -224,20 +310,19 @@ class SmartSearchService:
     def get_wellness_products(self, count):
         """Get general wellness products as fallback"""
         try:
-            wellness_keywords = ['energia', 'bienestar', 'salud', 'vitaminas', 'natural']
-            wellness_products = []
-            
-            for idx, product in self.catalog_df.iterrows():
-                all_text = f"{product.get('beneficios', '')} {product.get('nombre', '')}".lower()
-                if any(keyword in all_text for keyword in wellness_keywords):
-                    wellness_products.append({
-                        'product_data': product,
-                        'score': 1,
-                        'matches': ['Producto de bienestar general']
-                    })
+            # Wellness products are found once per catalog version
+            wellness_ids = self.catalog_snapshot.derived('smart_search_wellness', _collect_wellness_ids)
+            products = self.products
             
             # Format and return
-            formatted = [self.format_product_recommendation(item) for item in wellness_products[:count]]
+            formatted = [
+                self.format_product_recommendation({
+                    'product_data': products[product_id],
+                    'score': 1,
+                    'matches': ['Producto de bienestar general']
+                })
+                for product_id in wellness_ids[:count]
+            ]
             return formatted
             
         except Exception as e:
@@ -441,6 +441,74 @@ if (window.location.pathname.includes('/recommendations')) {
     });
 }
 
+// ===== PDF DOWNLOADS =====
+// Ask the server to render the PDF in its worker pool, poll until it is ready
+// and then download it. A busy queue is reported to the user; if anything else
+// fails, fallback() downloads it the classic way.
+function downloadPdfInBackground(url, options = {}, button = null, fallback = null) {
+    const originalHtml = button ? button.innerHTML : null;
+    if (button) {
+        button.disabled = true;
+        button.classList.add('disabled');
+        button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Preparando PDF...';
+    }
+    
+    let queueBusy = false;
+    const separator = url.includes('?') ? '&' : '?';
+    return fetch(url + separator + 'async=1', Object.assign({credentials: 'same-origin'}, options))
+        .then(response => {
+            if (response.status === 503) {
+                queueBusy = true;
+                return response.json().then(body => { throw new Error(body.error); });
+            }
+            if (response.status !== 202) {
+                throw new Error(`PDF queue answered ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(job => pollPdfJob(job.status_url))
+        .then(downloadUrl => {
+            window.location.href = downloadUrl;
+        })
+        .catch(error => {
+            console.error('Background PDF error:', error);
+            if (queueBusy) {
+                showNotification(error.message, 'warning');
+            } else if (fallback) {
+                fallback();
+            } else {
+                showNotification('Error al generar el PDF. Por favor intenta nuevamente.', 'danger');
+            }
+        })
+        .finally(() => {
+            if (button) {
+                button.disabled = false;
+                button.classList.remove('disabled');
+                button.innerHTML = originalHtml;
+            }
+        });
+}
+
+function pollPdfJob(statusUrl, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(statusUrl, {credentials: 'same-origin'})
+                .then(response => response.json())
+                .then(job => {
+                    if (job.status === 'done') {
+                        resolve(job.download_url);
+                    } else if (job.status === 'queued' || job.status === 'running') {
+                        setTimeout(check, interval);
+                    } else {
+                        reject(new Error(job.error || `PDF job ${job.status}`));
+                    }
+                })
+                .catch(reject);
+        };
+        check();
+    });
+}
+
 // ===== ERROR HANDLING =====
 window.addEventListener('error', function(e) {
     console.error('JavaScript error:', e.error);
@@ -0,0 +1,214 @@
+"""
+Reglas de productos prioritarios por síntoma de SaludArte
+Cada regla dice qué productos del catálogo (buscados por su nombre) se
+recomiendan primero cuando el síntoma contiene alguno de sus disparadores.
+La tabla se compila una vez por versión del catálogo: cada palabra clave
+queda resuelta a los identificadores de sus productos.
+"""
+from product_store import ProductStore
+
+# Reglas en orden de prioridad: se aplica la primera cuyo disparador aparezca
+# en el síntoma. Cada palabra clave toma el primer producto cuyo nombre la
+# contenga, o (palabra, cuántos productos, puntuación) para otro número.
+#   limit: 'max' corta al llegar al máximo de productos pedido, un número
+#          corta en esa cantidad y None agrega todos los encontrados
+#   exclude: palabras que descartan el producto por nombre o beneficios
+SYMPTOM_PRODUCT_RULES = (
+    {
+        # DIABETES/GLUCOSA
+        'triggers': ('diabetes', 'glucosa', 'azucar'),
+        'keywords': ('STEVIA', 'CANELA', 'CROMO', 'GYMNEMA', 'FENOGRECO'),
+        'score': '20',  # Máxima prioridad para diabetes
+        'limit': 'max',
+    },
+    {
+        # GANAR PESO
+        'triggers': ('aumento de peso',),
+        'keywords': ('PROTEINA', 'PROTEIN', 'MASS', 'GAINER', 'CREATINA'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # BAJAR PESO
+        'triggers': ('perdida de peso',),
+        'keywords': ('ALFIX', 'REDUCTOR', 'CARBO BURN', 'CARNITINA', 'GARCINIA', 'TE VERDE',
+                     'TERMOGENICO', 'QUEMADOR', 'TORONJA', 'ALGAS MARINAS'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # SALUD SEXUAL/AFRODISÍACOS
+        'triggers': ('afrodisiaco', 'sexual', 'libido'),
+        'keywords': ('DAMIANA', 'MACA', 'GUARANA', 'AFRODISIACO', 'LIBIDO'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # SALUD HEPÁTICA/DESINTOXICACIÓN
+        'triggers': ('higado', 'hepatico', 'desintoxicar'),
+        'keywords': ('CARDO MARIANO', 'BOLDO', 'ALCACHOFA', 'HEPATICO', 'DESINTOX'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # COLESTEROL/TRIGLICÉRIDOS
+        'triggers': ('colesterol', 'trigliceridos'),
+        'keywords': ('OMEGA', 'LECITINA', 'ALCACHOFA', 'CARDO', 'BOLDO'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # SALUD ÓSEA/ARTICULAR
+        'triggers': ('huesos', 'artritis', 'osteoporosis'),
+        'keywords': ('CALCIO', 'MAGNESIO', 'COLAGENO', 'SHARK', 'ARTICULAR'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # CIRCULACIÓN/VARICES
+        'triggers': ('circulacion', 'varices', 'hemorroides'),
+        'keywords': ('GINKGO', 'CIRCULACION', 'CENTELLA', 'CASTANO', 'RUSCO'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # SISTEMA NERVIOSO/ANSIEDAD
+        'triggers': ('ansiedad', 'nervios', 'panico'),
+        'keywords': ('VALERIANA', 'PASIFLORA', 'DON RELAX', 'AZAHARES', 'TILA'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # SALUD FEMENINA
+        'triggers': ('menopausia', 'bochornos', 'hormonal'),
+        'keywords': ('PM MUJ', 'ISOFLAVONAS', 'SOY', 'ANGELICA', 'REX OV'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # ANTIOXIDANTES/ANTI-EDAD
+        'triggers': ('antioxidante', 'envejecimiento', 'anti edad'),
+        'keywords': ('VITAMINA E', 'VITAMINA C', 'COLAGENO', 'ANTIOXIDANTE', 'OMEGA'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # VITAMINAS ESPECÍFICAS
+        'triggers': ('vitaminas', 'complejo b'),
+        'keywords': ('VITAMINA B', 'VITAMINA C', 'COMPLEJO', 'MULTIVITAMINICO'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # DEFENSAS/INMUNIDAD
+        'triggers': ('inmunidad',),
+        'keywords': ('DEFENCE GOLD', 'L10 PROPOLEO', 'PROPOLEO', 'ECHINACEA', 'VITAMINA C',
+                     'ZINC', 'OREGANO', 'EQUINACEA'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # ENERGÍA/VITALIDAD
+        'triggers': ('energia',),
+        'keywords': ('GINSENG', 'GINKGO', 'GUARANA', 'MACA', 'COMPLEJO B', 'B12'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # MEMORIA/CONCENTRACIÓN
+        'triggers': ('memoria',),
+        'keywords': ('BRAINGEAR', 'MEMORA PLUS', 'GINKGO', 'OMEGA 3', 'LECITINA', 'GINSENG',
+                     'BRAIN', 'FOCUS'),
+        'score': '20',
+        'limit': 'max',
+    },
+    {
+        # DOLOR DE CABEZA: valeriana y 7 azahares
+        'triggers': ('dolor de cabeza', 'cabeza'),
+        'keywords': (('VALERIANA', 2, '20'), ('AZAHARES', 1, 20)),
+        'limit': None,
+    },
+    {
+        # ACIDEZ/ARDOR ESTOMACAL: copalchi y fenogreco para digestión
+        'triggers': ('dolor estomacal', 'estomacal', 'acidez'),
+        'keywords': (('COPALCHI', 2, 20), ('FENOGRECO', 1, 20)),
+        'limit': None,
+    },
+    {
+        # INSOMNIO: valeriana y 7 azahares para relajación/sueño
+        'triggers': ('insomnio', 'dormir', 'sueño'),
+        'keywords': (('VALERIANA', 2, 20), ('AZAHARES', 1, 20)),
+        'limit': None,
+    },
+    {
+        # CANSANCIO: megalpiste y productos VITAL
+        'triggers': ('cansancio', 'fatiga', 'energia'),
+        'keywords': (('MEGALPISTE', 2, 20), ('VITAL', 1, 20)),
+        'limit': None,
+    },
+    {
+        # QUISTES Y PROBLEMAS HORMONALES FEMENINOS
+        'triggers': ('quistes', 'ovarios'),
+        'keywords': ('PM ISOFLAVONAS', 'PM MUJER', 'AR REX OV', 'PM MUJ ANGELICA', 'PM REX OV'),
+        'score': 20,
+        'limit': 2,
+    },
+    {
+        # DOLOR MUSCULAR Y MODISMOS MEXICANOS
+        'triggers': ('dolor muscular', 'muscular', 'musculo', 'molido', 'crujen', 'quebrado'),
+        'keywords': (
+            'CURA DOL PLUS',  # Producto específico para dolor
+            'SHARK CALCIUM',  # Con garra del diablo
+            'VOON FLEX',      # Para flexibilidad y dolor
+            'JUQUILITA',      # Apropiado para dolor muscular
+            'UÑAS GATO', 'UNAS GATO',  # Apropiado para dolor muscular
+            'TEPEZCOHUITE',   # Apropiado para dolor muscular
+            'ARNICA',         # Si existe en el catálogo
+            'SAUCE'           # Si existe en el catálogo
+        ),
+        'score': 20,
+        'limit': 2,
+        # EXCLUIR productos nutricionales (MEGALPISTE y similares)
+        'exclude': ('megalpiste', 'nutricion', 'digestivo', 'cardiovascular', 'alpiste', 'soya'),
+    },
+)
+
+
+class CompiledSymptomRules:
+    """
+    SYMPTOM_PRODUCT_RULES resueltas contra un catálogo.
+    Cada regla queda como (disparadores, límite, pasos) donde cada paso es
+    (identificadores de producto, puntuación); los productos descartados por
+    'exclude' ya no aparecen.
+    """
+
+    def __init__(self, products, rules=SYMPTOM_PRODUCT_RULES):
+        names = [name.lower() for name in products.texts.get('nombre', ())]
+        benefits = [text.lower() for text in products.texts.get('beneficios', ())]
+
+        self.rules = []
+        for rule in rules:
+            exclude = rule.get('exclude', ())
+            steps = []
+            for keyword in rule['keywords']:
+                keyword, count, score = keyword if isinstance(keyword, tuple) else (keyword, 1, rule['score'])
+                needle = keyword.lower()
+                rows = [idx for idx, name in enumerate(names) if needle in name][:count]
+                if exclude:
+                    rows = [idx for idx in rows
+                            if not any(word in names[idx] or (benefits and word in benefits[idx]) for word in exclude)]
+                steps.append((tuple(rows), score))
+            self.rules.append((rule['triggers'], rule['limit'], tuple(steps)))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(snapshot.derived('products', ProductStore.from_snapshot))
+
+    def match(self, symptom):
+        """(límite, pasos) de la primera regla que aplica al síntoma, o None"""
+        symptom_lower = symptom.lower()
+        for triggers, limit, steps in self.rules:
+            if any(trigger in symptom_lower for trigger in triggers):
+                return limit, steps
+        return None
+
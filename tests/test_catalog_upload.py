@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOG_FILE = os.path.join(ROOT, 'PLANTILLA CATALOGO CON INGREDIENTES.xlsx')
+
+
+@pytest.fixture
+def master_client(monkeypatch, tmp_path):
+    os.environ.setdefault('OPENAI_API_KEY', 'test')
+    from main import app
+    from auth_service import auth_service
+    from catalog_store import catalog_store
+
+    catalog_store.get()
+    monkeypatch.setattr(auth_service, 'is_master_logged_in', lambda: True)
+
+    # Publicar en primer plano para poder comprobar el resultado
+    threads = []
+    publish_in_background = catalog_store.publish_in_background
+    monkeypatch.setattr(catalog_store, 'publish_in_background',
+                        lambda *args, **kwargs: threads.append(publish_in_background(*args, **kwargs)))
+
+    # La subida y el catálogo principal se escriben en un directorio temporal
+    monkeypatch.chdir(tmp_path)
+    return app.test_client(), threads
+
+
+def _upload(client, path):
+    with open(path, 'rb') as workbook:
+        return client.post('/master/upload_catalog',
+                           data={'catalog_file': (workbook, 'catalogo.xlsx')},
+                           content_type='multipart/form-data')
+
+
+def test_upload_real_catalog_publishes_new_version(master_client, tmp_path):
+    from catalog_store import catalog_store
+
+    client, threads = master_client
+    upload = tmp_path / 'copia.xlsx'
+    shutil.copy(CATALOG_FILE, upload)
+    previous_version = catalog_store.version
+
+    response = _upload(client, upload)
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['success']
+
+    for thread in threads:
+        thread.join(timeout=120)
+    assert catalog_store.version > previous_version
+    assert len(catalog_store.get()) == len(pd.read_excel(CATALOG_FILE))
+    assert (tmp_path / catalog_store.path).exists()
+
+
+def test_upload_without_required_columns_is_rejected(master_client, tmp_path):
+    from catalog_store import catalog_store
+
+    client, threads = master_client
+    upload = tmp_path / 'incompleto.xlsx'
+    pd.DataFrame({'nombre': ['X'], 'dosis': ['1']}).to_excel(upload, index=False)
+    previous_version = catalog_store.version
+
+    response = _upload(client, upload)
+    assert response.status_code == 400
+    assert 'sintomas' in response.get_json()['error']
+    assert not threads
+    assert catalog_store.version == previous_version
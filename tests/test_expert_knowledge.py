@@ -0,0 +1,34 @@
+import pytest
+
+
+@pytest.fixture(scope='module')
+def expert_system():
+    from expert_knowledge_system import ExpertKnowledgeSystem
+
+    return ExpertKnowledgeSystem()
+
+
+@pytest.mark.parametrize('product_name', [
+    'AF ZINC CAPSULA CENTRO BOTANICO MAYA',
+    'AR CURCUMA TABLETA CENTRO BOTANICO MAYA C/60',
+    'AR EUCALIPTO TABLETA CENTRO BOTANICO MAYA C/60',
+    'AF OMEGA 3 CAPSULA CENTRO BOTANICO MAYA',
+])
+def test_other_formulations_are_not_substituted(expert_system, product_name):
+    assert expert_system.resolve_products([product_name]) == [None]
+
+
+def test_names_differing_only_in_spacing_order_or_size_resolve(expert_system):
+    for product_name in ['TRIS T CAPSULAS REY ZAPOTECO', 'REY ZAPOTECO TRIS T CAPSULAS C/30']:
+        info, = expert_system.resolve_products([product_name])
+        assert ' '.join(info['nombre'].split()) == 'TRIS T CAPSULAS REY ZAPOTECO'
+
+
+def test_expert_answers_only_contain_catalog_products_safe_for_the_profile(expert_system):
+    catalog_names = set(expert_system.products.texts['nombre'])
+    case_name, _ = expert_system.detect_expert_case('tengo dolor de cabeza')
+
+    answer = expert_system.get_expert_answer(case_name, {'age': 40, 'gender': 'femenino', 'diabetes': True})
+    names = [product['nombre'] for product in answer['products']]
+    assert names and set(names) <= catalog_names
+    assert 'AR CURA DOL FLEX TABLETA NIS YA GREEN C/30' not in names
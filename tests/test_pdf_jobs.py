@@ -0,0 +1,61 @@
+import os
+import time
+
+import pytest
+
+from pdf_jobs import PDFJobQueue
+
+PROFILE = {'name': 'Ana', 'age': 30, 'gender': 'femenino'}
+RECOMMENDATIONS = [{'symptom': 'estrés', 'message': 'Descanso y buena hidratación', 'products': []}]
+
+
+def _wait(queue, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while queue.status(job_id)['status'] in ('queued', 'running'):
+        assert time.time() < deadline
+        time.sleep(0.05)
+    return queue.status(job_id)
+
+
+@pytest.fixture
+def queues(tmp_path):
+    # Dos workers web distintos que comparten el directorio de trabajos
+    accepting = PDFJobQueue(max_workers=1, directory=str(tmp_path))
+    polled = PDFJobQueue(max_workers=1, directory=str(tmp_path))
+    yield accepting, polled
+    accepting.shutdown()
+    polled.shutdown()
+
+
+def test_any_worker_answers_status_and_result(queues):
+    accepting, polled = queues
+    job_id = accepting.submit(PROFILE, 'estrés', RECOMMENDATIONS, 'receta.pdf')
+
+    assert polled.status(job_id)['status'] in ('queued', 'running', 'done')
+    assert _wait(polled, job_id)['status'] == 'done'
+
+    pdf, download_name = polled.result(job_id)
+    assert pdf.startswith(b'%PDF') and download_name == 'receta.pdf'
+    assert polled.result(job_id) == accepting.result(job_id)
+
+
+def test_failed_jobs_and_unknown_ids(queues):
+    accepting, polled = queues
+    job_id = accepting.submit(PROFILE, 'estrés', [{'symptom': 'x', 'message': 'm', 'products': [{'nombre': 'n'}]}])
+
+    status = _wait(polled, job_id)
+    assert status['status'] == 'error' and status['error']
+    assert polled.result(job_id) is None
+    assert polled.status('0' * 32) is None
+    assert polled.status('../jobs') is None
+
+
+def test_evicted_result_is_reported_as_expired(queues, tmp_path):
+    accepting, polled = queues
+    job_id = accepting.submit(PROFILE, 'estrés', RECOMMENDATIONS)
+    assert _wait(polled, job_id)['status'] == 'done'
+
+    for name in os.listdir(tmp_path / 'results'):
+        os.remove(tmp_path / 'results' / name)
+    assert polled.status(job_id)['status'] == 'expired'
+    assert polled.result(job_id) is None
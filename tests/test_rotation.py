@@ -0,0 +1,49 @@
+import multiprocessing
+
+import pytest
+
+import rotation_state
+from rotation_state import InProcessRotationCounter, rotation_rng, select_rotated
+
+
+def _tied_products(count=12):
+    return [{'product_name': f'P{i}', 'match_score': 3} for i in range(count)]
+
+
+def test_select_rotated_is_reproducible_with_a_request_seed():
+    products = _tied_products()
+    shown = {product['product_name']: 0 for product in products}
+    first = select_rotated(products, shown, 3, rotation_rng(42))
+    second = select_rotated(products, shown, 3, rotation_rng(42))
+    assert first == second
+
+
+def test_seeded_recommendations_do_not_depend_on_global_state():
+    from canatura_ai import CanaturaAI
+
+    engine = CanaturaAI()
+    results = []
+    for _ in range(2):
+        engine.rotation_counter = InProcessRotationCounter()
+        rotation_state.rotation_random.random()  # Avanzar el generador del proceso
+        results.append(engine.find_products_for_symptoms('tengo estres y cansancio', seed=7))
+    assert results[0] and results[0] == results[1]
+
+
+def _child_draw(queue):
+    rotation_state.reseed_rotation_random()
+    queue.put(rotation_state.rotation_random.random())
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='requiere fork')
+def test_forked_workers_reseed_the_process_generator(monkeypatch):
+    monkeypatch.setattr(rotation_state, 'ROTATION_SEED', None)
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    workers = [context.Process(target=_child_draw, args=(queue,)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    draws = [queue.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert draws[0] != draws[1]
@@ -0,0 +1,30 @@
+import pytest
+
+from safety_index import ADULTS_ONLY, KIDS_ONLY, MEN_ONLY, WOMEN_ONLY, profile_mask
+
+
+@pytest.mark.parametrize('user_profile', [
+    {},
+    {'gender': None, 'age': None},
+    {'gender': '', 'age': ''},
+    {'gender': None, 'age': 'veinte'},
+])
+def test_profile_mask_tolerates_missing_or_empty_fields(user_profile):
+    # Sin sexo: excluye productos exclusivos de ambos; sin edad válida: adulto
+    assert profile_mask(user_profile) == profile_mask({'age': 18})
+    assert profile_mask(user_profile) & (WOMEN_ONLY | MEN_ONLY | KIDS_ONLY) == WOMEN_ONLY | MEN_ONLY | KIDS_ONLY
+
+
+def test_profile_mask_reads_gender_and_age():
+    mask = profile_mask({'gender': ' Femenino ', 'age': '12'})
+    assert not mask & WOMEN_ONLY
+    assert mask & MEN_ONLY
+    assert mask & ADULTS_ONLY
+    assert not mask & KIDS_ONLY
+
+
+def test_recommendations_with_incomplete_profile():
+    from canatura_ai import CanaturaAI
+
+    results = CanaturaAI().find_products_for_symptoms('tengo dolor de cabeza', {'gender': None, 'age': ''})
+    assert results
@@ -0,0 +1,66 @@
+"""
+Normalización de texto de SaludArte
+Una sola implementación (minúsculas y acentos fuera con str.translate) para
+todos los motores. Los textos del catálogo y de la base de conocimiento se
+repiten entre peticiones, así que los resultados se memorizan.
+"""
+from functools import lru_cache
+
+# Acentos del español (catálogo, búsqueda y restricciones)
+SPANISH_ACCENTS = str.maketrans('áéíóúüñ', 'aeiouun')
+
+# Variante amplia del sistema experto: también acentos graves, circunflejos y ç
+EXTENDED_ACCENTS = str.maketrans(
+    'áàäâéèëêíìïîóòöôúùüûñç',
+    'aaaaeeeeiiiioooouuuunc'
+)
+
+MAX_CACHED_TEXTS = 16384
+
+
+@lru_cache(maxsize=MAX_CACHED_TEXTS)
+def _spanish(text):
+    return text.lower().translate(SPANISH_ACCENTS)
+
+
+@lru_cache(maxsize=MAX_CACHED_TEXTS)
+def _extended(text):
+    return text.lower().translate(EXTENDED_ACCENTS)
+
+
+def normalize_text(text):
+    """Minúsculas y sin acentos españoles; cadena vacía si no es texto"""
+    if not isinstance(text, str):
+        return ""
+    return _spanish(text)
+
+
+def normalize_text_extended(text):
+    """Como normalize_text, quitando también acentos graves, circunflejos y ç"""
+    if not isinstance(text, str):
+        return ""
+    return _extended(text)
+
+
+class NormalizedInput:
+    """
+    Formas normalizadas de un texto del usuario, calculadas una sola vez.
+    Todos los motores que atienden la misma petición reciben el mismo objeto.
+    """
+
+    __slots__ = ('raw', 'lower', 'normalized', 'extended')
+
+    def __init__(self, text):
+        self.raw = text
+        self.lower = text.lower()
+        self.normalized = self.lower.translate(SPANISH_ACCENTS)
+        self.extended = self.lower.translate(EXTENDED_ACCENTS)
+
+    def __repr__(self):
+        return f'<NormalizedInput {self.raw!r}>'
+
+
+@lru_cache(maxsize=256)
+def normalized_input(text):
+    """NormalizedInput de un texto del usuario (el mismo objeto para el mismo texto)"""
+    return NormalizedInput(text)